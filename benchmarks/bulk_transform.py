@@ -0,0 +1,79 @@
+"""
+Wall time of bulk_transform vs. a naive ``save()`` loop on SQLite.
+
+Usage::
+
+    python -m benchmarks.bulk_transform [--rows 20000] [--chunk-size 1000]
+"""
+import argparse
+import time
+
+from tests.utils import setup_django, teardown_django
+
+
+def swap_case(first_name):
+    return first_name.swapcase()
+
+
+def naive_loop(apps, schema_editor):
+    model = apps.get_model('test_app_2', 'Customer')
+    for obj in model.objects.all():
+        obj.first_name = swap_case(obj.first_name)
+        obj.save()
+
+
+def vectorized_swap_case(first_names):
+    import numpy
+    return numpy.char.swapcase(first_names.astype(str))
+
+
+def measure(routine, atomic: bool) -> float:
+    from django.apps import apps
+    from django.db import connection
+
+    start = time.perf_counter()
+    with connection.schema_editor(atomic=atomic) as schema_editor:
+        routine(apps, schema_editor)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+    try:
+        from django.apps import apps
+        from data_migration.routines import bulk_transform
+
+        model = apps.get_model('test_app_2', 'Customer')
+        model.objects.bulk_create(
+            [model(first_name='abcde'[i % 5]) for i in range(args.rows)],
+            batch_size=1000
+        )
+
+        naive = measure(naive_loop, atomic=True)
+        print(f'save() loop:     {naive:.3f}s')
+
+        bulk = measure(bulk_transform(
+            'test_app_2.Customer', ['first_name'], swap_case,
+            chunk_size=args.chunk_size), atomic=False)
+        print(f'bulk_transform:  {bulk:.3f}s ({naive / bulk:.1f}x)')
+
+        try:
+            import numpy  # noqa F401
+        except ImportError:
+            return
+        vectorized = measure(bulk_transform(
+            'test_app_2.Customer', ['first_name'], vectorized_swap_case,
+            vectorized=True, chunk_size=args.chunk_size), atomic=False)
+        print(f'vectorized:      {vectorized:.3f}s '
+              f'({naive / vectorized:.1f}x)')
+    finally:
+        teardown_django()
+
+
+if __name__ == '__main__':
+    main()
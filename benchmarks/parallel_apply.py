@@ -0,0 +1,68 @@
+"""
+Wall time of serial vs. parallel data migrations.
+
+Every app gets a chain of nodes whose routines wait on I/O, e.g. external
+APIs, and write a row. Usage::
+
+    python -m benchmarks.parallel_apply [--apps 4] [--nodes 5] [--delay 0.05]
+"""
+import argparse
+import time
+
+from tests.utils import setup_django, teardown_django
+
+
+def build_plan(apps: int, nodes: int, delay: float):
+    from data_migration.services.graph import Graph, GraphNode
+    from data_migration.services.node import Node
+    from data_migration.services.plan import DataMigrationPlan
+
+    def routine(apps, schema_editor):
+        time.sleep(delay)
+        Node.get_qs().exists()
+
+    graphs = []
+    for app_index in range(apps):
+        app_name = f'bench_app_{app_index}'
+        graph = Graph(app_name)
+        for index in range(nodes):
+            name = f'{index + 1:04d}_node'
+            dependencies = [graph.get_nodes()[-1].node.name] if index else []
+            graph.push_back(GraphNode(
+                app_name, name, dependencies, [], [routine],
+                node=Node(app_name=app_name, name=name)))
+        graphs.append(graph)
+    return DataMigrationPlan(graphs)
+
+
+def run(apps: int, nodes: int, delay: float, workers: int) -> float:
+    from data_migration.services.node import Node
+
+    Node.flush()
+    plan = build_plan(apps, nodes, delay)
+    start = time.perf_counter()
+    plan.apply(workers=workers)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--apps', type=int, default=4)
+    parser.add_argument('--nodes', type=int, default=5)
+    parser.add_argument('--delay', type=float, default=0.05)
+    args = parser.parse_args()
+
+    setup_django()
+    try:
+        serial = run(args.apps, args.nodes, args.delay, 1)
+        print(f'serial:      {serial:.3f}s')
+        for workers in (2, args.apps):
+            parallel = run(args.apps, args.nodes, args.delay, workers)
+            print(f'{workers} workers:   {parallel:.3f}s '
+                  f'({serial / parallel:.2f}x)')
+    finally:
+        teardown_django()
+
+
+if __name__ == '__main__':
+    main()
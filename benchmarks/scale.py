@@ -0,0 +1,310 @@
+"""
+Wall time and query counts of graph loading, apply, revert, squash and file
+generation at scale, on SQLite.
+
+Generates a synthetic app per size, containing as many schema migrations as
+data migrations, and an app with a single data migration transforming every
+row of a table. Results are written as JSON, pass the results of a previous
+release to compare against them. Usage::
+
+    python -m benchmarks.scale [--sizes 10 100 1000] [--rows 10000 100000]
+                               [--output scale.json] [--compare old.json]
+
+Sizes of 10000 migrations and tables of 10M rows take a few hours.
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+from typing import Callable, Dict, List, Optional
+
+import django
+
+# squashing replaces sys.stdout
+out = sys.stdout
+
+ROWS_APP = 'scale_rows'
+
+MODELS = '''from django.db import models
+
+
+class Row(models.Model):
+    value = models.CharField(max_length=100, default='')
+    note = models.CharField(max_length=100, default='')
+'''
+
+INITIAL_MIGRATION = '''from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    initial = True
+    dependencies = []
+    operations = [
+        migrations.CreateModel(
+            name='Row',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True,
+                                        serialize=False)),
+                ('value', models.CharField(default='', max_length=100)),
+                ('note', models.CharField(default='', max_length=100)),
+            ],
+        ),
+    ]
+'''
+
+MIGRATION = '''from django.db import migrations, models
+
+
+def forwards(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+    dependencies = [('{app}', '{previous}')]
+    operations = [
+        migrations.AlterField(
+            model_name='row', name='note',
+            field=models.CharField(default='', max_length={max_length}),
+        ),
+{run_python}    ]
+'''
+
+RUN_PYTHON = (
+    '        migrations.RunPython(forwards, migrations.RunPython.noop),\n'
+)
+
+ROUTINES = '''from data_migration.routines import bulk_transform
+
+
+def touch(apps, schema_editor):
+    apps.get_model('{app}', 'Row').objects.exists()
+
+
+backfill = bulk_transform('{app}.Row', ['value'], str.upper,
+                          chunk_size=5000)
+'''
+
+
+def write(path: str, content: str = '') -> None:
+    with open(path, 'w') as file:
+        file.write(content)
+
+
+def migration_name(index: int) -> str:
+    return '0001_initial' if index == 1 else f'{index:04d}_step'
+
+
+def generate_app(directory: str, app: str, migrations: int) -> None:
+    """
+    Generate an app containing a chain of schema migrations, every tenth
+    migration contains a ``RunPython`` operation.
+    """
+    app_dir = os.path.join(directory, app)
+    os.makedirs(os.path.join(app_dir, 'migrations'))
+    write(os.path.join(app_dir, '__init__.py'))
+    write(os.path.join(app_dir, 'models.py'), MODELS)
+    write(os.path.join(app_dir, 'routines.py'), ROUTINES.format(app=app))
+    write(os.path.join(app_dir, 'migrations', '__init__.py'))
+    write(os.path.join(app_dir, 'migrations', '0001_initial.py'),
+          INITIAL_MIGRATION)
+    for index in range(2, migrations + 1):
+        write(
+            os.path.join(app_dir, 'migrations',
+                         f'{migration_name(index)}.py'),
+            MIGRATION.format(
+                app=app, previous=migration_name(index - 1),
+                max_length=100 + index % 2,
+                run_python=RUN_PYTHON if not index % 10 else '',
+            )
+        )
+
+
+def setup(directory: str, apps: List[str]) -> None:
+    from django.conf import settings
+
+    sys.path.insert(0, directory)
+    settings.configure(
+        SECRET_KEY='xxx',
+        DATABASES={'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(directory, 'db.sqlite3'),
+        }},
+        INSTALLED_APPS=[
+            'django.contrib.contenttypes',
+            'django.contrib.auth',
+            'data_migration',
+            *apps,
+        ],
+        DATA_MIGRATION={},
+        TEMPLATES=[{
+            'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        }],
+        DEFAULT_AUTO_FIELD='django.db.models.AutoField',
+    )
+    django.setup()
+
+
+class Benchmark:
+    def __init__(self) -> None:
+        self.results: List[Dict] = []
+
+    def measure(self, scenario: str, size: int, step: str,
+                function: Callable):
+        """Time a step and count its queries on the default database."""
+        from django.db import connection
+
+        from data_migration.services.metrics import collect_metrics
+
+        with collect_metrics(connection) as metrics:
+            value = function()
+        self.results.append({
+            'scenario': scenario, 'size': size, 'step': step,
+            'seconds': metrics.wall_time, 'db_seconds': metrics.db_time,
+            'queries': metrics.queries,
+        })
+        out.write(f'{scenario:>6} {size:>9} {step:<16} '
+                  f'{metrics.wall_time:>10.3f}s {metrics.queries:>9} '
+                  f'queries\n')
+        out.flush()
+        return value
+
+    def graph(self, size: int) -> None:
+        """Generate, load, apply, revert and squash ``size`` migrations."""
+        from django.core.management import call_command
+
+        from data_migration.services.file_generator import (
+            DataMigrationGenerator, Routine)
+        from data_migration.services.graph import Graph
+        from data_migration.services import squasher
+
+        # silence the output of django's squashmigrations
+        squasher.log.stdout = io.StringIO()
+        app = f'scale_{size}'
+        self.measure('graph', size, 'migrate_schema', lambda: call_command(
+            'django_migrate', app, verbosity=0))
+
+        def generate():
+            app_path = django.apps.apps.get_app_config(app).path
+            for _ in range(size):
+                DataMigrationGenerator(app, routines=[Routine(
+                    method='touch', module=f'{app}.routines',
+                    module_name='routines',
+                    file_path=os.path.join(app_path, 'routines.py'),
+                )])
+
+        self.measure('graph', size, 'generate', generate)
+        self.measure('graph', size, 'from_dir', lambda: Graph.from_dir(app))
+        graph = self.measure('graph', size, 'from_dir_cached',
+                             lambda: Graph.from_dir(app))
+        self.measure('graph', size, 'apply', graph.apply)
+        self.measure('graph', size, 'revert_graph',
+                     lambda: graph.revert_graph(graph.backwards_plan()))
+        self.measure('graph', size, 'squash',
+                     lambda: squasher.MigrationSquash([app]).squash())
+
+    def rows(self, counts: List[int]) -> None:
+        """Apply a data migration transforming every row of a table."""
+        from django.core.management import call_command
+        from django.db import connection, transaction
+
+        from data_migration.services.file_generator import (
+            DataMigrationGenerator, Routine)
+        from data_migration.services.graph import Graph
+
+        call_command('django_migrate', ROWS_APP, verbosity=0)
+        app_path = django.apps.apps.get_app_config(ROWS_APP).path
+        DataMigrationGenerator(ROWS_APP, 'backfill', routines=[Routine(
+            method='backfill', module=f'{ROWS_APP}.routines',
+            module_name='routines',
+            file_path=os.path.join(app_path, 'routines.py'),
+        )])
+
+        table = f'{ROWS_APP}_row'
+        for count in counts:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {table}')
+                for start in range(0, count, 100000):
+                    cursor.executemany(
+                        f'INSERT INTO {table} (value, note) VALUES (%s, %s)',
+                        [('value', '')] * min(100000, count - start)
+                    )
+            graph = Graph.from_dir(ROWS_APP)
+            self.measure('rows', count, 'apply', graph.apply)
+            self.measure('rows', count, 'revert_graph',
+                         lambda: graph.revert_graph(graph.backwards_plan()))
+
+    def save(self, file_name: str) -> None:
+        from data_migration.helper import get_package_version_string
+
+        with open(file_name, 'w') as file:
+            json.dump({
+                'meta': {
+                    'package': get_package_version_string(),
+                    'django': django.get_version(),
+                    'python': platform.python_version(),
+                    'sqlite': sqlite3.sqlite_version,
+                    'created_at': datetime.datetime.now().isoformat(),
+                },
+                'results': self.results,
+            }, file, indent=2)
+
+    def compare(self, file_name: str) -> None:
+        """Print the ratio of every step compared to previous results."""
+        with open(file_name) as file:
+            previous = json.load(file)
+        baseline = {
+            (result['scenario'], result['size'], result['step']): result
+            for result in previous['results']
+        }
+        out.write(f'compared to {previous["meta"]["package"]}:\n')
+        for result in self.results:
+            old: Optional[Dict] = baseline.get(
+                (result['scenario'], result['size'], result['step']))
+            if old is None or not old['seconds']:
+                continue
+            ratio = result['seconds'] / old['seconds']
+            out.write(
+                f'{result["scenario"]:>6} {result["size"]:>9} '
+                f'{result["step"]:<16} {ratio:>9.2f}x '
+                f'{result["queries"] - old["queries"]:>+9} queries\n'
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='*',
+                        default=[10, 100, 1000])
+    parser.add_argument('--rows', type=int, nargs='*',
+                        default=[10000, 100000])
+    parser.add_argument('--output', default='scale.json')
+    parser.add_argument('--compare', default=None)
+    args = parser.parse_args()
+
+    benchmark = Benchmark()
+    with tempfile.TemporaryDirectory() as directory:
+        apps = [f'scale_{size}' for size in args.sizes]
+        for size, app in zip(args.sizes, apps):
+            generate_app(directory, app, size)
+        if args.rows:
+            generate_app(directory, ROWS_APP, 1)
+            apps.append(ROWS_APP)
+        setup(directory, apps)
+
+        for size in args.sizes:
+            benchmark.graph(size)
+        if args.rows:
+            benchmark.rows(args.rows)
+
+    benchmark.save(args.output)
+    out.write(f'results written to {args.output}\n')
+    if args.compare:
+        benchmark.compare(args.compare)
+
+
+if __name__ == '__main__':
+    main()
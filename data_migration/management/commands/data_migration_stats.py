@@ -0,0 +1,63 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from data_migration.services.metrics import format_bytes
+from data_migration.services.node import NodeStats
+
+
+class Command(BaseCommand):
+    """
+    Lists the slowest data migrations.
+
+    Reports the metrics recorded during the latest application of the
+    data migrations, most expensive first.
+    """
+    help = 'Lists the slowest data migrations.'
+
+    def add_arguments(self, parser):  # noqa D102
+        parser.add_argument(
+            'app_label', nargs='?',
+            help='App label of an application to list the data migrations '
+                 'of.',
+        )
+        parser.add_argument(
+            '--limit', '-n', type=int, default=10, dest='limit',
+            help='Number of data migrations to list.',
+        )
+        parser.add_argument(
+            '--order-by', default='wall_time', dest='order_by',
+            choices=NodeStats.METRICS,
+            help='Metric to order by.',
+        )
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Nominates a database to read the metrics from. Defaults '
+                 'to the "default" database.',
+        )
+
+    def handle(self, *args, **options):  # noqa D102
+        if options['limit'] < 1:
+            raise CommandError('--limit has to be positive.')
+
+        stats = NodeStats.slowest(
+            limit=options['limit'],
+            order_by=options['order_by'],
+            app_name=options['app_label'],
+            using=options['database'],
+        )
+        if not stats:
+            self.stdout.write('No metrics recorded.')
+            return
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{"wall time":>10} {"db time":>10} {"queries":>8} '
+            f'{"rows":>10} {"peak memory":>12}  data migration'
+        ))
+        for record in stats:
+            peak_memory = '-' if record.peak_memory is None \
+                else format_bytes(record.peak_memory)
+            self.stdout.write(
+                f'{record.wall_time:>9.2f}s {record.db_time:>9.2f}s '
+                f'{record.queries:>8} {record.rows:>10} {peak_memory:>12}  '
+                f'{record.app_name}.{record.name}'
+            )
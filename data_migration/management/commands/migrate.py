@@ -1,8 +1,16 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
 from django.apps import apps
 from django.core.management import CommandError
 from django.core.management.commands.migrate import Command as Migrate
+from django.db import connections
 
+from data_migration.services.context import ExecutionContext
 from data_migration.services.graph import Graph
+from data_migration.services.plan import DataMigrationPlan
+from data_migration.services.profiler import Profiler
 
 
 class Command(Migrate):
@@ -11,27 +19,240 @@ class Command(Migrate):
 
     Allows forward and backward migration of data/regular migrations
     """
+    data_migration_plan = None
+    profiler = None
+    _open_data_migration = None
+    _output_lock = threading.Lock()
 
     def add_arguments(self, parser):  # noqa D102
         parser.add_argument(
             '--data-only', action='store_true', dest='data_migration',
             help='Applies data migrations',
         )
+        parser.add_argument(
+            '--parallel', type=int, default=1, dest='parallel',
+            help='Number of threads applying data migrations of different '
+                 'apps concurrently, requires --data-only.',
+        )
+        parser.add_argument(
+            '--all-databases', action='store_true', dest='all_databases',
+            help='Applies data migrations to every configured database, '
+                 'requires --data-only.',
+        )
+        parser.add_argument(
+            '--database-workers', type=int, default=1,
+            dest='database_workers',
+            help='Number of databases migrated concurrently, requires '
+                 '--all-databases.',
+        )
+        parser.add_argument(
+            '--profile', nargs='?', const='data_migration_profiles',
+            default=None, dest='profile', metavar='DIR',
+            help='Profiles the routines of data migrations, writes one '
+                 'pstats file per data migration to DIR, defaults to '
+                 '"data_migration_profiles". Requires --data-only.',
+        )
+        parser.add_argument(
+            '--profile-top', type=int, default=20, dest='profile_top',
+            help='Number of functions and SQL statements summarized per '
+                 'profiled data migration.',
+        )
+        parser.add_argument(
+            '--profile-sql', action='store_true', dest='profile_sql',
+            help='Summarizes the slowest SQL statements of profiled data '
+                 'migrations.',
+        )
         super().add_arguments(parser)
 
     def handle(self, *args, **options):  # noqa D102
         # extract parameters
+        self.verbosity = options.get('verbosity', 1)
+        workers = options.get('parallel') or 1
+        if workers > 1 and (not options['data_migration']
+                            or options.get('migration_name')):
+            raise CommandError(
+                '--parallel requires --data-only without migration name.')
+        if options.get('all_databases') and not options['data_migration']:
+            raise CommandError('--all-databases requires --data-only.')
+        if (options.get('database_workers') or 1) > 1 \
+                and not options.get('all_databases'):
+            raise CommandError(
+                '--database-workers requires --all-databases.')
+        self.profiler = None
+        if options.get('profile'):
+            if not options['data_migration']:
+                raise CommandError('--profile requires --data-only.')
+            if workers > 1 or (options.get('database_workers') or 1) > 1:
+                raise CommandError(
+                    '--profile profiles a single thread, it can\'t be '
+                    'combined with --parallel or --database-workers.')
+            self.profiler = Profiler(
+                options['profile'],
+                top=options.get('profile_top') or 20,
+                sql=options.get('profile_sql', False),
+                output=self._write_profile
+            )
 
         if options['app_label']:
             # Validate app_label.
-            app_label = options['app_label']
             try:
-                apps.get_app_config(app_label)
+                apps.get_app_config(options['app_label'])
             except LookupError as err:
                 raise CommandError(str(err))
 
-            data_migrations = Graph.from_dir(app_label)
-            data_migrations.apply(options.get('migration_name'))
+        if options.get('all_databases'):
+            self.migrate_all_databases(options, workers)
+            return
 
-        if not options['data_migration']:
+        database = options['database']
+        if options['data_migration']:
+            self.migrate_data(database, options, workers)
+            return
+
+        if options['app_label']:
+            Graph.from_dir(options['app_label'], database).apply(
+                options.get('migration_name'))
             return super().handle(*args, **options)
+
+        if (options.get('plan') or options.get('check_unapplied')
+                or options.get('fake') or options.get('fake_initial')):
+            # faked schema migrations don't run data migrations either
+            return super().handle(*args, **options)
+
+        # run data migrations interleaved with schema migrations
+        self.data_migration_plan = DataMigrationPlan.from_apps(
+            using=database,
+            context=ExecutionContext(
+                database, progress_reporter=self.progress_reporter),
+            progress_callback=self.data_migration_progress_callback
+        )
+        try:
+            result = super().handle(*args, **options)
+            self.data_migration_plan.apply()
+        finally:
+            self.data_migration_plan = None
+        return result
+
+    def migrate_data(self, database: str, options, workers: int = 1,
+                     prefix: bool = False) -> None:
+        """
+        Apply the data migrations of a single database.
+
+        :param database: connection alias to migrate
+        :param options: options of the command
+        :param workers: number of threads applying independent apps
+        :param prefix: prefix the progress output with the alias
+        """
+        app_label = options['app_label']
+        callback = partial(self.data_migration_progress_callback,
+                           database=database if prefix else None)
+        context = ExecutionContext(
+            database, profiler=self.profiler,
+            progress_reporter=self.progress_reporter)
+        if app_label and workers == 1:
+            Graph.from_dir(app_label, database).apply(
+                options.get('migration_name'), context=context)
+            return
+
+        DataMigrationPlan.from_apps(
+            [app_label] if app_label else None,
+            using=database,
+            context=context,
+            progress_callback=callback
+        ).apply(workers)
+
+    def migrate_all_databases(self, options, workers: int = 1) -> None:
+        """
+        Apply the data migrations of every configured database, databases
+        are migrated concurrently using ``--database-workers`` threads.
+
+        Failing databases don't stop the migration of the other databases.
+
+        :param options: options of the command
+        :param workers: number of threads applying independent apps
+            per database
+        """
+        databases = list(connections)
+        database_workers = max(options.get('database_workers') or 1, 1)
+        failures = {}
+
+        def migrate(database):
+            try:
+                self.migrate_data(database, options, workers, prefix=True)
+            except Exception as ex:
+                failures[database] = ex
+            finally:
+                connections[database].close()
+
+        with ThreadPoolExecutor(
+                max_workers=min(database_workers, len(databases)),
+                thread_name_prefix='data-migrate-db') as pool:
+            list(pool.map(migrate, databases))
+
+        if failures:
+            for database, ex in failures.items():
+                self.stderr.write(f'{database}: {ex!r}')
+            raise CommandError(
+                'Data migrations failed on databases: '
+                f'{", ".join(sorted(failures))}.')
+
+    def migration_progress_callback(self, action, migration=None,
+                                    fake=False):  # noqa D102
+        super().migration_progress_callback(action, migration, fake)
+        if (action == 'apply_success' and not fake
+                and self.data_migration_plan is not None):
+            self.data_migration_plan.migration_applied(migration)
+
+    def data_migration_progress_callback(self, action, node, database=None):
+        """Report progress of data migrations, similar to migrations."""
+        if self.verbosity < 1:
+            return
+
+        name = f'{node.node.app_name}.{node.node.name}'
+        if database is not None:
+            name = f'{database}:{name}'
+        with self._output_lock:
+            self._report_data_migration(action, node, name)
+
+    def _report_data_migration(self, action, node, name):
+        if action == 'apply_start':
+            self._end_data_migration_line()
+            self.stdout.write(
+                f'  Applying data migration {name}...', ending='')
+            self.stdout.flush()
+            self._open_data_migration = node
+        elif action == 'apply_success':
+            if self._open_data_migration is node:
+                self.stdout.write(self.style.SUCCESS(' OK'))
+                self._open_data_migration = None
+            else:
+                # concurrent execution, another node started meanwhile
+                self._end_data_migration_line()
+                self.stdout.write(
+                    f'  Applied data migration {name}...'
+                    + self.style.SUCCESS(' OK'))
+            summary = node.metrics and node.metrics.throttle_summary()
+            if summary:
+                self.stdout.write(f'    {name}: {summary}')
+
+    @property
+    def progress_reporter(self):
+        """:return: reporter of the progress of long running nodes"""
+        if self.verbosity < 1:
+            return None
+        return self._report_progress
+
+    def _report_progress(self, progress):
+        with self._output_lock:
+            self._end_data_migration_line()
+            self.stdout.write(f'    {progress}')
+
+    def _write_profile(self, summary):
+        with self._output_lock:
+            self._end_data_migration_line()
+            self.stdout.write(summary)
+
+    def _end_data_migration_line(self):
+        if self._open_data_migration is not None:
+            self.stdout.write('')
+            self._open_data_migration = None
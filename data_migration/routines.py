@@ -0,0 +1,720 @@
+"""public routine helpers of package."""
+import asyncio
+import copy
+import logging
+import multiprocessing
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+from typing import (Any, Callable, Dict, Iterable, Iterator, List, Optional,
+                    Sequence, Tuple, Union)
+
+from django.db import connections, transaction
+from django.db.models import Q, QuerySet
+from django.db.transaction import TransactionManagementError
+
+from data_migration.services.metrics import record_chunk, record_resume
+from data_migration.services.node import Checkpoint
+from data_migration.services.progress import progress
+from data_migration.services.throttle import Throttle
+
+log = logging.getLogger('data_migration')
+
+ChunkFunction = Callable[[QuerySet, Any, Any], None]
+QuerySetFunction = Callable[[QuerySet], QuerySet]
+#: exclusive lower and inclusive upper primary key, ``None`` is unbounded
+KeyRange = Tuple[Any, Any]
+#: key range or filter of the rows of a partition
+Partition = Union[KeyRange, Q]
+PartitionFunction = Callable[[QuerySet], Iterable[Q]]
+
+
+def is_async(routine: Callable) -> bool:
+    """:return: whether the routine is a coroutine function"""
+    return (asyncio.iscoroutinefunction(routine)
+            or asyncio.iscoroutinefunction(
+                getattr(routine, '__call__', None)))
+
+
+def run_routine(routine: Callable, *args, **kwargs) -> Any:
+    """
+    Call a routine, ``async`` routines are run on an event loop.
+
+    The event loop runs in another thread, ``sync_to_async`` calls, e.g.
+    of Django's async ORM, are executed by the calling thread and share its
+    connection and transaction.
+    """
+    if is_async(routine):
+        return load_asgiref().async_to_sync(routine)(*args, **kwargs)
+    return routine(*args, **kwargs)
+
+
+async def gather(*aws, limit: int = 10,
+                 return_exceptions: bool = False) -> list:
+    """
+    Like ``asyncio.gather``, running at most ``limit`` awaitables at a
+    time.
+
+    .. code:: python
+
+        async def fetch_addresses(apps, schema_editor):
+            customers = await sync_to_async(list)(Customer.objects.all())
+            await gather(*(fetch(customer) for customer in customers),
+                         limit=20)
+
+    :param aws: awaitables to run
+    :param limit: maximum number of concurrently running awaitables
+    :param return_exceptions: see ``asyncio.gather``
+    :return: results in the order of ``aws``
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def bounded(aw):
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(
+        *(bounded(aw) for aw in aws), return_exceptions=return_exceptions)
+
+
+class ChunkedRoutine:
+    """
+    Routine walking a table in chunks of primary key ranges.
+
+    Every chunk is processed within its own transaction, nodes containing
+    chunked routines commit after each chunk. Only the primary keys of a
+    single chunk are loaded at a time, memory usage doesn't depend on the
+    size of the table.
+
+    The progress is persisted together with every chunk, a failed node
+    resumes after the last committed chunk when applied again. While
+    progress is reported, see :data:`progress`, the rows are counted
+    upfront.
+
+    Usage within a data migration file:
+
+    .. code:: python
+
+        def split_name(chunk, apps, schema_editor):
+            for obj in chunk.iterator():
+                ...
+
+        class Node:
+            ...
+            routines = [
+                chunked('app_label.Model', split_name, chunk_size=5000),
+            ]
+    """
+
+    #: commits on its own, see :attr:`GraphNode.atomic`
+    atomic = False
+    #: continues from a :class:`Checkpoint` of a previous run
+    resumable = True
+
+    def __init__(self, model: str, function: ChunkFunction,
+                 chunk_size: int = 1000,
+                 queryset: Optional[QuerySetFunction] = None,
+                 throttle: Optional[Throttle] = None) -> None:
+        """
+        :param model: model label, ``app_label.ModelName``
+        :param function: called per chunk with the queryset of the chunk,
+            the historical apps and the schema editor, may be ``async``
+        :param chunk_size: maximum number of rows per chunk
+        :param queryset: optional function restricting the queryset of the
+            model, e.g. ``lambda qs: qs.filter(first_name__isnull=True)``
+        :param throttle: pauses between chunks, defaults to the ``THROTTLE``
+            setting
+        """
+        if chunk_size < 1:
+            raise ValueError('chunk_size has to be positive.')
+        self.model = model
+        self.function = function
+        self.chunk_size = chunk_size
+        self.queryset = queryset
+        self.throttle = throttle
+
+    def get_queryset(self, apps, schema_editor) -> QuerySet:
+        """:return: queryset of all rows to process"""
+        model = apps.get_model(self.model)
+        qs = model._default_manager.using(schema_editor.connection.alias)
+        if self.queryset is not None:
+            qs = self.queryset(qs)
+        return qs
+
+    def chunks(self, qs: QuerySet,
+               last_key: Any = None) -> Iterator[Tuple[QuerySet, Any, int]]:
+        """
+        Paginate the queryset using its primary key.
+
+        :param qs: queryset to paginate
+        :param last_key: primary key after which to start
+        :return: generator of the chunk's queryset, its last primary key
+            and its number of rows
+        """
+        while True:
+            keys = list(self.page(qs, last_key).values_list(
+                'pk', flat=True)[:self.chunk_size])
+            if not keys:
+                return
+            yield (qs.filter(pk__gte=keys[0], pk__lte=keys[-1]),
+                   keys[-1], len(keys))
+            last_key = keys[-1]
+
+    @staticmethod
+    def page(qs: QuerySet, last_key: Any = None) -> QuerySet:
+        """:return: rows following ``last_key``, ordered by primary key"""
+        qs = qs.order_by('pk')
+        if last_key is not None:
+            qs = qs.filter(pk__gt=last_key)
+        return qs
+
+    def process_chunk(self, chunk, apps, schema_editor) -> None:
+        """Process a single chunk, as yielded by :meth:`chunks`."""
+        run_routine(self.function, chunk, apps, schema_editor)
+
+    def __call__(self, apps, schema_editor,
+                 checkpoint: Optional[Checkpoint] = None) -> None:
+        """
+        Process all chunks.
+
+        :param apps: historical apps
+        :param schema_editor: schema editor of the node
+        :param checkpoint: progress of a previous run, gets updated within
+            the transaction of every chunk
+        """
+        alias = schema_editor.connection.alias
+        last_key = None
+        if checkpoint is not None:
+            checkpoint.load()
+            if checkpoint.done:
+                return
+            last_key = checkpoint.last_key
+            if last_key is not None:
+                record_resume()
+
+        throttle = self.throttle or Throttle.from_settings()
+        run = None
+        if throttle is not None:
+            run = throttle.start(
+                self.model if checkpoint is None else str(checkpoint))
+
+        qs = self.get_queryset(apps, schema_editor)
+        if progress.active:
+            progress.total(qs.count(), done=(
+                0 if checkpoint is None else checkpoint.rows_done))
+        for chunk, last_key, count in self.chunks(qs, last_key):
+            start = time.perf_counter()
+            with transaction.atomic(using=alias):
+                self.process_chunk(chunk, apps, schema_editor)
+                if checkpoint is not None:
+                    checkpoint.last_key = last_key
+                    checkpoint.rows_done += count
+                    checkpoint.save()
+            record_chunk(time.perf_counter() - start, count)
+            progress.advance(count)
+            if run is not None:
+                run.chunk_done(count)
+
+        if checkpoint is not None:
+            checkpoint.done = True
+            checkpoint.save()
+        if run is not None:
+            run.finish()
+
+
+def chunked(model: str, function: ChunkFunction, chunk_size: int = 1000,
+            queryset: Optional[QuerySetFunction] = None,
+            throttle: Optional[Throttle] = None) -> ChunkedRoutine:
+    """
+    Create a routine processing the rows of a model in chunks.
+
+    :param model: model label, ``app_label.ModelName``
+    :param function: called per chunk with the queryset of the chunk,
+        the historical apps and the schema editor
+    :param chunk_size: maximum number of rows per chunk
+    :param queryset: optional function restricting the queryset
+    :param throttle: pauses between chunks, defaults to the ``THROTTLE``
+        setting
+    :return: routine for ``Node.routines``
+    """
+    return ChunkedRoutine(model, function, chunk_size, queryset, throttle)
+
+
+class BulkTransformRoutine(ChunkedRoutine):
+    """
+    Routine transforming column values without loading model instances.
+
+    Per chunk, only the primary keys and the given fields are read using a
+    single query. The transformed values are written back using a single
+    ``UPDATE ... CASE`` statement per chunk (split into batches when
+    exceeding the backend's parameter limit), rows whose values don't
+    change are skipped. Values are written as given, e.g. ``auto_now``
+    fields aren't updated.
+
+    .. code:: python
+
+        def full_name(first_name, last_name):
+            return f'{first_name} {last_name}'
+
+        bulk_transform('app_label.Customer', ['first_name', 'last_name'],
+                       full_name, targets=['name'])
+    """
+
+    def __init__(self, model: str, fields: Sequence[str],
+                 function: Callable, targets: Optional[Sequence[str]] = None,
+                 vectorized: bool = False, **kwargs) -> None:
+        """
+        :param model: model label, ``app_label.ModelName``
+        :param fields: names of the fields to read
+        :param function: called per row with the values of ``fields``,
+            returns the values of ``targets``, a single value for a single
+            target. Vectorized functions are called per chunk with NumPy
+            arrays of the fields' values and return arrays
+        :param targets: names of the fields to write, defaults to ``fields``
+        :param vectorized: whether ``function`` operates on NumPy arrays
+        :param kwargs: see :class:`ChunkedRoutine`
+        """
+        super().__init__(model, function, **kwargs)
+        self.fields = list(fields)
+        self.targets = list(targets or fields)
+        self.vectorized = vectorized
+        if vectorized:
+            load_numpy()
+
+    def chunks(self, qs: QuerySet,
+               last_key: Any = None) -> Iterator[Tuple[List[tuple], Any, int]]:
+        """
+        Paginate the queryset using its primary key.
+
+        :param qs: queryset to paginate
+        :param last_key: primary key after which to start
+        :return: generator of the chunk's rows, ``(pk, *fields)``, its last
+            primary key and its number of rows
+        """
+        while True:
+            rows = list(self.page(qs, last_key).values_list(
+                'pk', *self.fields)[:self.chunk_size])
+            if not rows:
+                return
+            last_key = rows[-1][0]
+            yield rows, last_key, len(rows)
+
+    def transform(self, rows: List[tuple]) -> List[tuple]:
+        """
+        :param rows: rows of a chunk, ``(pk, *fields)``
+        :return: transformed values, ``(*targets)`` per row
+        """
+        single_target = len(self.targets) == 1
+        if not self.vectorized:
+            values = [self.function(*row[1:]) for row in rows]
+            if single_target:
+                return [(value, ) for value in values]
+            return [tuple(value) for value in values]
+
+        np = load_numpy()
+        columns = [np.asarray(column) for column in list(zip(*rows))[1:]]
+        results = self.function(*columns)
+        if single_target:
+            results = (results, )
+        # convert numpy scalars to python types
+        return list(zip(*(np.asarray(result).tolist()
+                          for result in results)))
+
+    def process_chunk(self, rows: List[tuple], apps, schema_editor) -> None:
+        positions = [
+            self.fields.index(target) + 1 if target in self.fields else None
+            for target in self.targets
+        ]
+        changes = [
+            (row[0], values)
+            for row, values in zip(rows, self.transform(rows))
+            if not all(position is not None and row[position] == value
+                       for position, value in zip(positions, values))
+        ]
+        if changes:
+            self.update(apps.get_model(self.model),
+                        schema_editor.connection, changes)
+
+    def update(self, model, connection, changes: List[Tuple[Any, tuple]]
+               ) -> None:
+        """
+        Write the transformed values using ``UPDATE ... CASE`` statements.
+
+        The statement is built directly, compiling ``Case``/``When``
+        expressions for every row, as ``bulk_update`` does, takes longer
+        than executing the statement.
+
+        :param model: model to update
+        :param connection: connection of the schema editor
+        :param changes: primary key and values of ``targets`` per row
+        """
+        quote_name = connection.ops.quote_name
+        pk_field = model._meta.pk
+        pk_column = quote_name(pk_field.column)
+        fields = [model._meta.get_field(target) for target in self.targets]
+        # every row requires two parameters per field and its primary key
+        batch_size = connection.ops.bulk_batch_size(
+            ['pk'] * (2 * len(fields) + 1), changes) or len(changes)
+
+        with connection.cursor() as cursor:
+            for index in range(0, len(changes), batch_size):
+                batch = changes[index:index + batch_size]
+                keys = [pk_field.get_db_prep_value(pk, connection)
+                        for pk, _ in batch]
+                assignments = []
+                params = []
+                for position, field in enumerate(fields):
+                    placeholder = '%s'
+                    if connection.vendor == 'postgresql':
+                        # parameters are untyped within CASE
+                        db_type = field.db_type(connection)
+                        placeholder = f'CAST(%s AS {db_type})'
+                    whens = ' '.join(
+                        [f'WHEN %s THEN {placeholder}'] * len(batch))
+                    assignments.append(
+                        f'{quote_name(field.column)} = '
+                        f'CASE {pk_column} {whens} END')
+                    for key, (_, values) in zip(keys, batch):
+                        params.append(key)
+                        params.append(field.get_db_prep_save(
+                            values[position], connection))
+                params.extend(keys)
+                cursor.execute(
+                    f'UPDATE {quote_name(model._meta.db_table)} '
+                    f'SET {", ".join(assignments)} '
+                    f'WHERE {pk_column} IN ({", ".join(["%s"] * len(keys))})',
+                    params
+                )
+
+
+def load_asgiref():
+    try:
+        from asgiref import sync
+    except ImportError:
+        raise ImportError(
+            'async routines require asgiref, install it using '
+            '"pip install django-data-migrations[async]".')
+    return sync
+
+
+def load_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError(
+            'Vectorized transformations require NumPy, install it using '
+            '"pip install django-data-migrations[numpy]".')
+    return numpy
+
+
+def bulk_transform(model: str, fields: Sequence[str], function: Callable,
+                   targets: Optional[Sequence[str]] = None,
+                   vectorized: bool = False, chunk_size: int = 1000,
+                   queryset: Optional[QuerySetFunction] = None,
+                   throttle: Optional[Throttle] = None
+                   ) -> BulkTransformRoutine:
+    """
+    Create a routine transforming column values of a model in chunks.
+
+    :param model: model label, ``app_label.ModelName``
+    :param fields: names of the fields to read
+    :param function: called per row with the values of ``fields``,
+        returns the values of ``targets``
+    :param targets: names of the fields to write, defaults to ``fields``
+    :param vectorized: whether ``function`` operates on NumPy arrays of a
+        whole chunk
+    :param chunk_size: maximum number of rows per chunk
+    :param queryset: optional function restricting the queryset
+    :param throttle: pauses between chunks, defaults to the ``THROTTLE``
+        setting
+    :return: routine for ``Node.routines``
+    """
+    return BulkTransformRoutine(
+        model, fields, function, targets, vectorized,
+        chunk_size=chunk_size, queryset=queryset, throttle=throttle)
+
+
+class PartitionError(Exception):
+    """Raised once all partitions finished, if any of them failed."""
+
+    def __init__(self, failures: List[Tuple[Partition, str]]) -> None:
+        """
+        :param failures: partition and formatted traceback per failure
+        """
+        self.failures = failures
+        details = '\n'.join(
+            f'partition {partition}:\n{error}'
+            for partition, error in failures
+        )
+        super().__init__(
+            f'{len(failures)} partition(s) failed.\n{details}')
+
+
+# jobs of running partitioned routines, inherited by forked workers
+_partition_jobs: Dict[int, tuple] = {}
+# connections inherited by a worker, kept referenced to never close them
+_inherited_connections: list = []
+
+
+class PartitionedRoutine(ChunkedRoutine):
+    """
+    Routine processing partitions of a table in parallel processes.
+
+    The rows are split into ``partitions`` primary key ranges holding the
+    same number of rows, or by ``partition_by``. Each partition is
+    processed in chunks by a pool of ``processes`` forked worker
+    processes. Workers inherit the rendered historical
+    apps and open their own database connections, chunks are committed on
+    their own. A failing partition doesn't stop the others, failures are
+    raised together as :class:`PartitionError`. The throttle applies per
+    chunk of every partition, a target throughput is shared by the
+    workers.
+
+    Partitioned routines can't run within a transaction and aren't
+    resumable. The partitions are processed sequentially within the
+    current process on platforms not supporting ``fork``. SQLite allows
+    a single writer only, on SQLite the chunks are committed one at a time.
+    """
+
+    resumable = False
+
+    def __init__(self, model: str, function: ChunkFunction,
+                 partitions: int = 4, processes: Optional[int] = None,
+                 partition_by: Union[str, PartitionFunction, None] = None,
+                 **kwargs) -> None:
+        """
+        :param model: model label, ``app_label.ModelName``
+        :param function: called per chunk with the queryset of the chunk,
+            the historical apps and the schema editor
+        :param partitions: number of key ranges
+        :param processes: number of worker processes, defaults to the
+            number of partitions
+        :param partition_by: partitions the rows instead of key ranges,
+            either a field path partitioning by its distinct values, or
+            a function returning a ``Q`` filter per partition of the
+            queryset. Partitions should be disjoint.
+        :param kwargs: see :class:`ChunkedRoutine`
+        """
+        super().__init__(model, function, **kwargs)
+        if partitions < 1:
+            raise ValueError('partitions has to be positive.')
+        self.partitions = partitions
+        self.processes = processes or partitions
+        self.partition_by = partition_by
+
+    def get_partitions(self, qs: QuerySet) -> List[Partition]:
+        """
+        :param qs: queryset to split
+        :return: partitions covering the rows of the queryset
+        """
+        if self.partition_by is None:
+            return self.key_ranges(qs)
+        if callable(self.partition_by):
+            return list(self.partition_by(qs))
+        values = qs.order_by(self.partition_by).values_list(
+            self.partition_by, flat=True).distinct()
+        return [Q(**{self.partition_by: value}) for value in values]
+
+    def key_ranges(self, qs: QuerySet) -> List[KeyRange]:
+        """
+        Split the rows into ranges of similar size.
+
+        :param qs: queryset to split
+        :return: key ranges covering all rows of the queryset
+        """
+        count = qs.count()
+        if not count:
+            return []
+
+        size = -(-count // self.partitions)
+        ordered = qs.order_by('pk').values_list('pk', flat=True)
+        upper_keys = [
+            ordered[offset] for offset in range(size - 1, count - 1, size)
+        ]
+        lower_keys = [None] + upper_keys
+        return list(zip(lower_keys, upper_keys + [None]))
+
+    def __call__(self, apps, schema_editor) -> None:
+        connection = schema_editor.connection
+        if connection.in_atomic_block:
+            raise TransactionManagementError(
+                'Partitioned routines commit from other processes, use '
+                'the atomic strategy "per_chunk" or False.')
+
+        qs = self.get_queryset(apps, schema_editor)
+        partitions = self.get_partitions(qs)
+        if progress.active:
+            progress.total(qs.count())
+        if len(partitions) < 2 or self.processes < 2 or \
+                'fork' not in multiprocessing.get_all_start_methods():
+            throttle = self.partition_throttle(1)
+            results = []
+            for partition in partitions:
+                results.append(run_partition(
+                    self, apps, schema_editor, partition, throttle=throttle))
+                progress.advance(results[-1][0])
+        else:
+            results = self.run_in_processes(apps, connection, partitions)
+
+        failures = [
+            (partition, error)
+            for partition, (_, error) in zip(partitions, results) if error
+        ]
+        log.info('%s: %d rows in %d partitions, %d failed', self.model,
+                 sum(rows for rows, _ in results), len(partitions),
+                 len(failures))
+        if failures:
+            raise PartitionError(failures)
+
+    def run_in_processes(self, apps, connection,
+                         partitions: List[Partition]
+                         ) -> List[Tuple[int, Optional[str]]]:
+        """
+        :return: number of processed rows and formatted traceback of
+            failures per partition
+        """
+        context = multiprocessing.get_context('fork')
+        lock = context.Lock() if connection.vendor == 'sqlite' else None
+        workers = min(self.processes, len(partitions))
+        key = id(self)
+        # inherited by the workers, partitions are passed by index
+        _partition_jobs[key] = (self, apps, connection.alias, lock,
+                                partitions, self.partition_throttle(workers))
+        try:
+            with ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=context,
+                    initializer=_reset_connections) as pool:
+                futures = [
+                    pool.submit(_run_partition_job, key, index)
+                    for index in range(len(partitions))
+                ]
+                for future in as_completed(futures):
+                    progress.advance(future.result()[0])
+                return [future.result() for future in futures]
+        finally:
+            del _partition_jobs[key]
+
+    def partition_throttle(self, workers: int) -> Optional[Throttle]:
+        """
+        :param workers: number of partitions processed concurrently
+        :return: throttle of a single partition, defaults to the
+            ``THROTTLE`` setting
+        """
+        throttle = self.throttle or Throttle.from_settings()
+        if throttle is None or workers < 2 or not throttle.rows_per_second:
+            return throttle
+        throttle = copy.copy(throttle)
+        throttle.rows_per_second /= workers
+        return throttle
+
+    def process_partition(self, apps, schema_editor, partition: Partition,
+                          lock=None, throttle: Optional[Throttle] = None
+                          ) -> int:
+        """
+        Process the chunks of a partition, committing every chunk.
+
+        :param apps: historical apps
+        :param schema_editor: schema editor of the current process
+        :param partition: key range or filter to process
+        :param lock: lock held per chunk
+        :param throttle: pauses between chunks
+        :return: number of processed rows
+        """
+        qs = self.get_queryset(apps, schema_editor)
+        if isinstance(partition, Q):
+            qs = qs.filter(partition)
+        else:
+            lower, upper = partition
+            if lower is not None:
+                qs = qs.filter(pk__gt=lower)
+            if upper is not None:
+                qs = qs.filter(pk__lte=upper)
+
+        run = None
+        if throttle is not None:
+            run = throttle.start(f'{self.model} partition {partition}')
+        rows = 0
+        alias = schema_editor.connection.alias
+        for chunk, _, count in self.chunks(qs):
+            start = time.perf_counter()
+            with lock or nullcontext(), transaction.atomic(using=alias):
+                self.process_chunk(chunk, apps, schema_editor)
+            record_chunk(time.perf_counter() - start, count)
+            rows += count
+            if run is not None:
+                run.chunk_done(count)
+        if run is not None:
+            run.finish()
+        return rows
+
+
+def run_partition(routine: PartitionedRoutine, apps, schema_editor,
+                  partition: Partition, lock=None,
+                  throttle: Optional[Throttle] = None
+                  ) -> Tuple[int, Optional[str]]:
+    """:return: processed rows and the formatted traceback of a failure"""
+    try:
+        rows = routine.process_partition(
+            apps, schema_editor, partition, lock, throttle)
+    except Exception:
+        return 0, traceback.format_exc()
+    return rows, None
+
+
+def _reset_connections() -> None:
+    """
+    Replace the connections inherited by a forked worker.
+
+    The inherited connections belong to the parent process, closing them
+    would terminate the parent's sessions.
+    """
+    for alias in connections:
+        inherited = connections[alias]
+        _inherited_connections.append(inherited)
+        connections[alias] = type(inherited)(inherited.settings_dict, alias)
+
+
+def _run_partition_job(key: int, index: int) -> Tuple[int, Optional[str]]:
+    routine, apps, alias, lock, partitions, throttle = _partition_jobs[key]
+    connection = connections[alias]
+    try:
+        with connection.schema_editor(atomic=False) as schema_editor:
+            return run_partition(
+                routine, apps, schema_editor, partitions[index], lock,
+                throttle)
+    finally:
+        connection.close()
+
+
+def partitioned(model: str, function: ChunkFunction, partitions: int = 4,
+                processes: Optional[int] = None, chunk_size: int = 1000,
+                queryset: Optional[QuerySetFunction] = None,
+                partition_by: Union[str, PartitionFunction, None] = None,
+                throttle: Optional[Throttle] = None
+                ) -> PartitionedRoutine:
+    """
+    Create a routine processing partitions of a model in parallel
+    processes.
+
+    :param model: model label, ``app_label.ModelName``
+    :param function: called per chunk with the queryset of the chunk,
+        the historical apps and the schema editor
+    :param partitions: number of key ranges
+    :param processes: number of worker processes, defaults to the number
+        of partitions
+    :param chunk_size: maximum number of rows per chunk
+    :param queryset: optional function restricting the queryset
+    :param partition_by: field path partitioning the rows by its distinct
+        values, or function returning a ``Q`` filter per partition of the
+        queryset, defaults to ``partitions`` key ranges
+    :param throttle: pauses between the chunks of every partition, the
+        target throughput is shared by the workers, defaults to the
+        ``THROTTLE`` setting
+    :return: routine for ``Node.routines``
+    """
+    return PartitionedRoutine(
+        model, function, partitions, processes,
+        partition_by=partition_by, chunk_size=chunk_size, queryset=queryset,
+        throttle=throttle)
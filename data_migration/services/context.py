@@ -0,0 +1,196 @@
+from typing import List, Optional, Set, Tuple
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.migrations.state import ProjectState
+
+from data_migration.services.node import Node
+from data_migration.services.progress import Reporter
+from data_migration.services.sinks import MetricsSink
+from data_migration.services.state import LazyApps
+
+MigrationKey = Tuple[str, str]
+
+
+def parse_migration_dependency(dependency: str) -> MigrationKey:
+    """
+    Parse a ``migration_dependencies`` entry of a data migration.
+
+    :param dependency: dotted path, e.g. ``app.0001_initial``
+    :return: key of the migration, ``(app_label, name)``
+    """
+    parts = dependency.split('.')
+    return parts[-2], parts[-1]
+
+
+class ExecutionContext:
+    """
+    State shared between all nodes of a single run.
+
+    Holds one migration executor, hence one migration loader, and the
+    historical project state. The state is created on first use and
+    advanced incrementally when schema migrations get applied, nodes
+    sharing the same state reuse the rendered ``apps``. Routines get
+    :attr:`lazy_apps`, rendering only the models they request.
+
+    Applied nodes are recorded in batches, pending records get written
+    on :meth:`flush_records` and before schema migrations are applied.
+
+    The routines of the nodes are profiled when a ``profiler`` is given,
+    see :class:`data_migration.services.profiler.Profiler`, their progress
+    is passed to the ``progress_reporter``, see
+    :class:`data_migration.services.progress.Progress`. Their metrics are
+    exported to the ``metrics_sink``, which defaults to the sink configured
+    by the ``METRICS_SINK`` setting, see
+    :class:`data_migration.services.sinks.MetricsSink`.
+    """
+
+    def __init__(self, using: str = DEFAULT_DB_ALIAS,
+                 state: Optional[ProjectState] = None,
+                 profiler=None,
+                 progress_reporter: Optional[Reporter] = None,
+                 metrics_sink: Optional[MetricsSink] = None) -> None:
+        self.using = using
+        self.profiler = profiler
+        self.progress_reporter = progress_reporter
+        if metrics_sink is None:
+            metrics_sink = MetricsSink.from_settings()
+        self.metrics_sink = metrics_sink
+        self._executor: Optional[MigrationExecutor] = None
+        self._state: Optional[ProjectState] = state
+        self._lazy_apps: Optional[LazyApps] = None
+        self.pending_records: List[Node] = []
+        # ids of the pending nodes, referenced by pending_records
+        self._pending_ids: Set[int] = set()
+
+    def fork(self) -> 'ExecutionContext':
+        """
+        Context for another thread, sharing the rendered project state.
+
+        Connections are thread local, the forked context uses the
+        connection of the thread using it. Forked contexts only execute
+        nodes whose dependencies are applied, schema migrations are
+        applied by the parent context.
+
+        :return: context sharing the state of this context
+        """
+        # render in the calling thread
+        self.apps
+        return ExecutionContext(self.using, state=self.state,
+                                profiler=self.profiler,
+                                progress_reporter=self.progress_reporter,
+                                metrics_sink=self.metrics_sink)
+
+    @property
+    def connection(self):
+        return connections[self.using]
+
+    @property
+    def executor(self) -> MigrationExecutor:
+        if self._executor is None:
+            self._executor = MigrationExecutor(self.connection)
+        return self._executor
+
+    @property
+    def recorder(self) -> MigrationRecorder:
+        return self.executor.recorder
+
+    @property
+    def state(self) -> ProjectState:
+        """Project state including all applied migrations."""
+        if self._state is None:
+            self._state = self.executor._create_project_state(
+                with_applied_migrations=True)
+        return self._state
+
+    @property
+    def apps(self):
+        """Historical apps of the current project state."""
+        return self.state.apps
+
+    @property
+    def lazy_apps(self) -> LazyApps:
+        """
+        Historical apps of the current project state, rendering models on
+        demand, see :class:`data_migration.services.state.LazyApps`.
+        """
+        if self._lazy_apps is None:
+            self._lazy_apps = LazyApps(lambda: self.state)
+        return self._lazy_apps
+
+    @property
+    def applied_migrations(self):
+        """Keys of the applied migrations known to the loader."""
+        return self.executor.loader.applied_migrations
+
+    def migrate(self, targets: List[MigrationKey]) -> None:
+        """
+        Apply schema migrations until the given targets are applied and
+        advance the project state accordingly.
+
+        :param targets: migration keys to migrate to
+        """
+        plan = self.executor.migration_plan(targets)
+        if not plan:
+            return
+
+        self.flush_records()
+        self._lazy_apps = None
+        try:
+            self._state = self.executor.migrate(
+                targets, plan=plan, state=self.state)
+        except Exception:
+            # the state might be partially mutated
+            self._state = None
+            raise
+        finally:
+            self.refresh_applied_migrations()
+
+    def mark_applied(self, migration) -> None:
+        """
+        Advance applied migrations and project state after a schema
+        migration got applied outside of this context, e.g. by django's
+        ``migrate`` command.
+
+        :param migration: applied django migration
+        """
+        key = (migration.app_label, migration.name)
+        if key in self.applied_migrations:
+            return
+
+        applied = self.executor.loader.applied_migrations
+        # dict since django 3.0, set before
+        if isinstance(applied, dict):
+            applied[key] = migration
+        else:
+            applied.add(key)
+        if self._state is not None:
+            self._lazy_apps = None
+            migration = self.executor.loader.graph.nodes[key]
+            self._state = migration.mutate_state(self._state, preserve=False)
+
+    def refresh_applied_migrations(self) -> None:
+        """Merge the recorded migrations into the loader's applied state."""
+        # dict since django 3.0, set before
+        self.executor.loader.applied_migrations.update(
+            self.recorder.applied_migrations())
+
+    def record(self, node: Node) -> None:
+        """
+        Schedule recording a node as applied.
+
+        :param node: node to record
+        """
+        self.pending_records.append(node)
+        self._pending_ids.add(id(node))
+
+    def is_pending(self, node: Node) -> bool:
+        """:return: whether the node is scheduled for recording"""
+        return id(node) in self._pending_ids
+
+    def flush_records(self) -> None:
+        """Record all pending nodes using a single insert."""
+        pending, self.pending_records = self.pending_records, []
+        self._pending_ids = set()
+        Node.bulk_apply(pending)
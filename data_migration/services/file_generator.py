@@ -1,17 +1,18 @@
 import logging
 import os
 from dataclasses import dataclass
-from importlib import import_module
 from typing import Optional, List
 
 from django.apps import apps
-from django.db import connections
+from django.db import DEFAULT_DB_ALIAS, connections
 from django.db.migrations.recorder import MigrationRecorder
 from django.template import engines
 from django.utils import timezone
 
 from data_migration.helper import get_package_version_string
-from data_migration.services.graph import GraphNode
+from data_migration.services.graph import Graph, GraphNode
+from data_migration.services.loader import list_migration_files
+from data_migration.services.node import Node
 
 current_dir = os.path.dirname(__file__)
 
@@ -35,8 +36,11 @@ class DataMigrationGenerator:
     def __init__(self, app_name, readable_name: Optional[str] = None,
                  set_header: bool = True, empty: bool = False,
                  dry_run: bool = False, routines: List[Routine] = None,
-                 migration_dependencies: List[str] = None) -> None:
+                 migration_dependencies: List[str] = None,
+                 using: str = DEFAULT_DB_ALIAS,
+                 reverse_routines: List[Routine] = None) -> None:
         self.app_name = app_name
+        self.using = using
         if isinstance(self.app_name, list):
             self.app_name = self.app_name[0]
             log.warning(
@@ -51,6 +55,7 @@ class DataMigrationGenerator:
         self.empty = empty
         self.dry_run = dry_run
         self.routines: List[Routine] = routines
+        self.reverse_routines: List[Routine] = reverse_routines or []
         if migration_dependencies is None:
             migration_dependencies = []
         self.migration_dependencies: List[str] = migration_dependencies
@@ -63,11 +68,7 @@ class DataMigrationGenerator:
         empty_dir = True
         files = []
         if os.path.isdir(self.file_dir):
-            files = [
-                f for f in os.listdir(self.file_dir)
-                if (f != '__init__.py'
-                    and os.path.isfile(os.path.join(self.file_dir, f)))
-            ]
+            files = list_migration_files(self.file_dir)
             empty_dir = len(files) == 0
         elif not self.dry_run:
             # create directory
@@ -107,6 +108,8 @@ class DataMigrationGenerator:
             'date': timezone.now().strftime('%Y-%m-%d %H:%M'),
             'package': get_package_version_string(),
             'routines': self.routines,
+            'reverse_routines': self.reverse_routines,
+            'modules': self.modules,
             'migration_dependencies': self.migration_dependencies
         }
 
@@ -115,7 +118,7 @@ class DataMigrationGenerator:
                 'dependencies': [latest_filename.replace('.py', '')]
             })
 
-        recorder = MigrationRecorder(connections['default'])
+        recorder = MigrationRecorder(connections[self.using])
         latest_migration = recorder.migration_qs.filter(
             app=self.app_name
         ).order_by('-applied').first()
@@ -131,6 +134,14 @@ class DataMigrationGenerator:
             )
         file.close()
 
+    @property
+    def modules(self) -> List[Routine]:
+        """Routines of distinct modules, the modules to import."""
+        modules = {}
+        for routine in (self.routines or []) + self.reverse_routines:
+            modules.setdefault(routine.module_name, routine)
+        return list(modules.values())
+
     @staticmethod
     def _get_id(index: int) -> str:
         out = str(index)
@@ -145,14 +156,32 @@ class DataMigrationGenerator:
 
         return template.render(context=context)
 
-    def set_applied(self):
-        file = self.file_name.split('.')[0].split('/')[-1]
-        app_conf = apps.get_app_config(self.app_name)
-        module_name = f'{app_conf.module.__name__}.data_migrations.{file}'
+    @property
+    def node_name(self) -> str:
+        return self.file_name.split('.')[0].split('/')[-1]
+
+    def get_graph_node(self) -> GraphNode:
+        """
+        Graph node of the generated file, built from the generator's
+        metadata without importing the file.
+
+        :return: unapplied node of the generated file
+        """
+        return GraphNode(
+            self.app_name,
+            self.node_name,
+            [],
+            list(self.migration_dependencies),
+            [],
+            node=Node(app_name=self.app_name, name=self.node_name,
+                      using=self.using)
+        )
 
-        try:
-            node = import_module(module_name).Node
-        except ModuleNotFoundError:
+    def set_applied(self):
+        if self.dry_run or self.empty:
             return
-        node = GraphNode.from_struct(self.app_name, node)
-        node.set_applied()
+
+        graph = Graph(self.app_name, self.using)
+        graph.push_back(self.get_graph_node())
+        graph.load_state()
+        graph.set_applied()
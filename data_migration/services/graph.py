@@ -1,17 +1,28 @@
+import heapq
 import os
 from importlib import import_module
+from contextlib import nullcontext
 from types import FunctionType
-from typing import Optional, List
+from typing import Callable, Dict, Optional, List, Union
 
 from django.apps import apps
-from django.db import connections
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
 from django.db.migrations.exceptions import NodeNotFoundError
-from django.db.migrations.executor import MigrationExecutor
 from django.db.migrations.recorder import MigrationRecorder
 
-from data_migration.services.node import Node
+from data_migration.routines import is_async, run_routine
+from data_migration.services.context import (ExecutionContext,
+                                             parse_migration_dependency)
+from data_migration.services.loader import NodeSpec, load_node_specs
+from data_migration.services.metrics import NodeMetrics, collect_metrics
+from data_migration.services.node import Checkpoint, Node, NodeStats
+from data_migration.services.progress import Progress, track
+from data_migration.settings import internal_settings
 
 FunList = List[FunctionType]
+Atomic = Union[bool, str]
+#: transaction strategies of nodes, see :attr:`GraphNode.atomic`
+ATOMIC_STRATEGIES = (True, False, 'per_routine', 'per_chunk')
 
 
 class GraphNode:
@@ -20,24 +31,77 @@ class GraphNode:
     def __init__(self, app_name: str, name: str,
                  dependencies: List[str],
                  migration_dependencies: List[str],
-                 routines: FunList) -> None:
-        self.routines = routines
+                 routines: Optional[FunList], node: Optional[Node] = None,
+                 module_name: Optional[str] = None,
+                 atomic: Optional[Atomic] = None,
+                 using: str = DEFAULT_DB_ALIAS,
+                 reverse_routines: Optional[FunList] = None) -> None:
+        self._routines = routines
+        self._reverse_routines = reverse_routines
+        self._atomic = atomic
+        self.module_name = module_name
         self.dependencies = dependencies
         self.migration_dependencies = migration_dependencies
-        self.node = self.get_or_prepare_node(app_name, name)
-        self.next: Optional[GraphNode] = None
-        self.previous: Optional[GraphNode] = None
+        #: metrics of the latest execution of the routines
+        self.metrics: Optional[NodeMetrics] = None
+        if node is None:
+            node = self.get_or_prepare_node(app_name, name, using)
+        self.node = node
+
+    @property
+    def using(self) -> str:
+        """Connection alias the node is applied to."""
+        return self.node.using
+
+    def _load_module(self) -> None:
+        node = import_module(self.module_name).Node
+        if self._routines is None:
+            self._routines = list(node.routines)
+        if self._reverse_routines is None:
+            self._reverse_routines = list(
+                getattr(node, 'reverse_routines', []))
+        if self._atomic is None:
+            self._atomic = getattr(node, 'atomic', None)
+
+    @property
+    def routines(self) -> FunList:
+        """Routines of the node, imports the node's module on first access."""
+        if self._routines is None:
+            self._load_module()
+        return self._routines
+
+    @routines.setter
+    def routines(self, value: FunList) -> None:
+        self._routines = value
+
+    @property
+    def reverse_routines(self) -> FunList:
+        """
+        Routines undoing the node on revert, declared as
+        ``Node.reverse_routines``, imports the node's module on first access.
+        """
+        if self._reverse_routines is None:
+            if self.module_name is None:
+                return []
+            self._load_module()
+        return self._reverse_routines
+
+    @reverse_routines.setter
+    def reverse_routines(self, value: FunList) -> None:
+        self._reverse_routines = value
 
     @staticmethod
-    def get_or_prepare_node(app_name, name) -> Node:
+    def get_or_prepare_node(app_name, name,
+                            using: str = DEFAULT_DB_ALIAS) -> Node:
         """
         Return existing Node or object which is not created yet.
 
         :param app_name: target app
         :param name: name of migration
+        :param using: connection alias holding the record of the node
         :return: node with app_name=app_name, name=name
         """
-        node_obj = Node(app_name=app_name, name=name)
+        node_obj = Node(app_name=app_name, name=name, using=using)
         if node_obj.exists():
             node = node_obj.qs.filter(
                 app_name=app_name, name=name).first()
@@ -45,124 +109,310 @@ class GraphNode:
             node_obj.created_at = node.created_at
         return node_obj
 
+    @property
+    def atomic(self) -> Atomic:
+        """
+        Transaction strategy of the node, declared as ``Node.atomic``.
+
+        - ``True``: all routines and the record of the node share a single
+          transaction
+        - ``'per_routine'``: every routine runs within its own transaction
+        - ``'per_chunk'``: like ``'per_routine'``, chunked routines commit
+          after every chunk
+        - ``False``: routines run in autocommit mode, chunked routines
+          commit after every chunk
+
+        Defaults to ``'per_chunk'`` for nodes containing chunked routines,
+        ``True`` otherwise. Except for ``True`` the node is recorded once
+        all routines succeeded.
+        """
+        return self.atomic_strategy(self.routines)
+
+    @property
+    def reverse_atomic(self) -> Atomic:
+        """
+        Transaction strategy of the reverse routines, like :attr:`atomic`.
+        Except for ``True`` the record of the node is removed once all
+        reverse routines succeeded.
+        """
+        return self.atomic_strategy(self.reverse_routines)
+
+    def atomic_strategy(self, routines: FunList) -> Atomic:
+        """:return: declared strategy or the default for the routines"""
+        if self._atomic is not None:
+            return self._atomic
+        if all(getattr(routine, 'atomic', True) for routine in routines):
+            return True
+        return 'per_chunk'
+
+    def migration_dependencies_applied(self, applied_migrations) -> bool:
+        """
+        Check the migration dependencies against applied migrations.
+
+        :param applied_migrations: keys of applied django migrations
+        :return: whether all migration dependencies of the node are applied
+        """
+        return all(
+            parse_migration_dependency(dependency) in applied_migrations
+            for dependency in self.migration_dependencies
+        )
+
     def set_applied(self):
         """Queries django's migration table to determine whether node was applied before or not"""
 
         if self.node.is_applied:
             return
 
-        recorder = MigrationRecorder(connections['default'])
-        dependency_names = [d.split('.')[-1] for d in self.migration_dependencies]
-        django_migrations = recorder.migration_qs.filter(
-            app=self.node.app_name, name__in=dependency_names)
-        if django_migrations.count() == len(dependency_names):
+        recorder = MigrationRecorder(connections[self.using])
+        if self.migration_dependencies_applied(
+                recorder.applied_migrations()):
             self.node.apply()
 
-    def apply(self) -> None:
+    def apply(self, context: Optional[ExecutionContext] = None) -> None:
         """
         Apply node.
 
         Calling this method will execute the routines within the node.
         If the migration is already applied do nothing.
+
+        Within a shared context the node is recorded in batch with
+        other nodes. The records are written within the same transaction
+        as the routines of the node, nodes without routines are recorded
+        together with the next batch.
+
+        :param context: execution context shared between nodes of a run
         """
         if self.node.is_applied:
             return
 
-        if self.prepare_migration_state():
-            connection = connections['default']
-
-            # Work out which apps have migrations and which do not
-            executor = MigrationExecutor(connection)
-            pre_migrate_state = executor._create_project_state(
-                with_applied_migrations=True)
-            current_state_apps = pre_migrate_state.apps
-            with connection.schema_editor(atomic=True) as schema_editor:
-                for routine in self.routines:
-                    routine(
-                        apps=current_state_apps,
-                        schema_editor=schema_editor
-                    )
-        self.node.apply()
-
-    def revert(self) -> None:
-        """Reverts an applied migration node."""
+        if context is None:
+            context = ExecutionContext(self.using)
+            flush = True
+        else:
+            if context.is_pending(self.node):
+                return
+            flush = False
+
+        self.prepare_migration_state(context)
+        self.execute(context)
+
+        if flush:
+            context.flush_records()
+
+    def execute(self, context: ExecutionContext) -> None:
+        """
+        Run the routines of the node and record it, expects the migration
+        dependencies to be applied.
+
+        ``async`` routines are run on an event loop, see
+        :func:`data_migration.routines.run_routine`.
+
+        Like django's ``RunPython`` the routines are skipped, but the node
+        is recorded, when the database routers don't allow migrating the
+        app on the connection of the context.
+
+        The metrics of the routines are stored together with the record,
+        see :class:`data_migration.services.node.NodeStats`, and exported
+        to the metrics sink of the context.
+
+        :param context: execution context shared between nodes of a run
+        """
+        if not self.routines or not router.allow_migrate(
+                context.using, self.node.app_name):
+            context.record(self.node)
+            return
+
+        def finish(metrics: NodeMetrics) -> None:
+            NodeStats.save(self.node, metrics)
+            context.record(self.node)
+            context.flush_records()
+
+        try:
+            metrics = self.run_routines(
+                self.routines, self.atomic, context, finish)
+        except Exception:
+            if context.metrics_sink is not None and self.metrics is not None:
+                context.metrics_sink.node_failed(self.node, self.metrics)
+            raise
+        if context.metrics_sink is not None:
+            context.metrics_sink.node_applied(self.node, metrics)
+
+    def run_routines(self, routines: FunList, atomic: Atomic,
+                     context: ExecutionContext,
+                     finish: Callable[[NodeMetrics], None]) -> NodeMetrics:
+        """
+        Run routines using a transaction strategy, see :attr:`atomic`.
+
+        Routines get the historical apps of the current project state,
+        rendering only the models they request, see
+        :attr:`ExecutionContext.lazy_apps`. Resumable routines get a
+        :class:`Checkpoint` of the node. Unless ``atomic=True``, committed
+        routines are marked done by a checkpoint as well and skipped when
+        running again after a failure. Checkpoints are cleared once all
+        routines succeeded.
+
+        :param routines: routines to run
+        :param atomic: transaction strategy
+        :param context: execution context shared between nodes of a run
+        :param finish: called with the metrics of the routines once all
+            routines succeeded, within the transaction removing the
+            checkpoints (and of all routines for ``atomic=True``)
+        :return: metrics of the routines, also set on failure as
+            :attr:`metrics`
+        """
+        self.metrics = None
+        if atomic not in ATOMIC_STRATEGIES:
+            raise ValueError(
+                f'Invalid atomic value {atomic!r} of node {self.node.name}, '
+                f'use one of {ATOMIC_STRATEGIES}.')
+
+        current_state_apps = context.lazy_apps
+        if any(is_async(routine) for routine in routines):
+            # creating the state queries the database, which isn't allowed
+            # within the event loop of async routines
+            current_state_apps.state
+        self.node.ensure_table()
+        NodeStats.ensure_table(context.using)
+        checkpointed = False
+        with context.connection.schema_editor(
+                atomic=atomic is True) as schema_editor:
+            if context.profiler is None:
+                profiling = nullcontext()
+            else:
+                profiling = context.profiler.profile(
+                    self.node, context.connection)
+            if context.progress_reporter is None:
+                tracking = nullcontext()
+            else:
+                tracking = track(Progress(
+                    self.progress_name, context.progress_reporter))
+            with collect_metrics(context.connection,
+                                 internal_settings.TRACE_MEMORY
+                                 ) as metrics, profiling, tracking:
+                self.metrics = metrics
+                for index, routine in enumerate(routines):
+                    kwargs = {}
+                    resumable = getattr(routine, 'resumable', False)
+                    checkpoint = None
+                    if resumable or atomic is not True:
+                        checkpointed = True
+                        checkpoint = Checkpoint(
+                            self.node.app_name, self.node.name, index,
+                            using=context.using)
+                    if resumable:
+                        kwargs['checkpoint'] = checkpoint
+                    elif checkpoint is not None and checkpoint.load().done:
+                        # committed by a previous, failed run
+                        continue
+                    if atomic == 'per_routine' or (
+                            atomic == 'per_chunk'
+                            and getattr(routine, 'atomic', True)):
+                        transactional = transaction.atomic(using=context.using)
+                    else:
+                        transactional = nullcontext()
+                    with transactional:
+                        run_routine(
+                            routine,
+                            apps=current_state_apps,
+                            schema_editor=schema_editor,
+                            **kwargs
+                        )
+                        if checkpoint is not None and not resumable:
+                            checkpoint.done = True
+                            checkpoint.save()
+            with transaction.atomic(using=context.using):
+                if checkpointed:
+                    Checkpoint.clear(self.node.app_name, self.node.name,
+                                     using=context.using)
+                finish(metrics)
+        return metrics
+
+    @property
+    def progress_name(self) -> str:
+        """Name of the node in progress reports."""
+        name = f'{self.node.app_name}.{self.node.name}'
+        if self.using != DEFAULT_DB_ALIAS:
+            name = f'{self.using}:{name}'
+        return name
+
+    def revert(self, context: Optional[ExecutionContext] = None) -> None:
+        """
+        Reverts an applied migration node.
+
+        The reverse routines of the node run like the routines of
+        :meth:`execute`, using the transaction strategy
+        :attr:`reverse_atomic` and the current project state. The record
+        of the node is removed once they succeeded, a failed revert
+        resumes chunked reverse routines when reverted again.
+
+        :param context: execution context shared between nodes of a run
+        """
         if not self.node.is_applied:
             return
 
-        backup_node = Node(
-            name=self.node.name,
-            app_name=self.node.app_name
-        )
-        self.node.qs.get(pk=self.node.pk).delete()
-        self.node = backup_node
-
-    def prepare_migration_state(self):
-        """Migrates the django migration graph until dependencies are applied"""
-        # Get the database we're operating from
-        connection = connections['default']
-
-        # Work out which apps have migrations and which do not
-        executor = MigrationExecutor(connection)
-        pre_migrate_state = executor._create_project_state(
-            with_applied_migrations=True)
-        migration_graph_in_place = True
-
-        if self.migration_dependencies:
-            recorder = MigrationRecorder(connections['default'])
-            applied_migrations = recorder.applied_migrations()
-            unapplied_dependencies = list()
-            for dependency in self.migration_dependencies:
-                plan = dependency.split('.')
-                plan = tuple([plan[-2], plan[-1]])
-                if plan not in applied_migrations:
-                    unapplied_dependencies.append(plan)
-
-            if unapplied_dependencies:
-                try:
-                    plan = executor.migration_plan(unapplied_dependencies)
-                    executor.migrate(
-                        unapplied_dependencies,
-                        plan=plan,
-                        state=pre_migrate_state.clone()
-                    )
-                    migration_graph_in_place = True
-                except NodeNotFoundError as ex:
-                    for dep in unapplied_dependencies:
-                        if not recorder.migration_qs.filter(
-                                app=dep[0],
-                                name__icontains=dep[1]
-                        ).exists():
-                            raise ex
-
-            if not migration_graph_in_place:
-                migration_graph_in_place = (
-                    recorder
-                    .migration_qs
-                    .filter(app=self.node.app_name)
-                    .order_by('-pk').first() in self.migration_dependencies
-                )
-
-        return migration_graph_in_place
-
-    def append(self, node) -> None:
-        """
-        Append a node to the graph by attaching it to the last element.
-
-        :param node: child to append
-        """
-        if not self.next:
-            self.next = node
-            node.previous = self
-        else:
-            self.next.append(node)
+        if not self.has_reverse_routines(self.using):
+            Node.bulk_revert([self.node])
+            return
+
+        if context is None:
+            context = ExecutionContext(self.using)
+        self.run_routines(
+            self.reverse_routines, self.reverse_atomic, context,
+            lambda metrics: Node.bulk_revert([self.node]))
+
+    def has_reverse_routines(self, using: str) -> bool:
+        """
+        :param using: connection alias the node is reverted on
+        :return: whether reverting runs reverse routines, considering the
+            database routers
+        """
+        return bool(self.reverse_routines) and router.allow_migrate(
+            using, self.node.app_name)
+
+    def prepare_migration_state(
+            self, context: Optional[ExecutionContext] = None) -> bool:
+        """
+        Migrates the django migration graph until dependencies are applied
+
+        :param context: execution context shared between nodes of a run
+        :return: whether the migration graph is in place
+        """
+        if not self.migration_dependencies:
+            return True
+
+        if context is None:
+            context = ExecutionContext(self.using)
+
+        applied_migrations = context.applied_migrations
+        unapplied_dependencies = [
+            dependency for dependency in map(
+                parse_migration_dependency, self.migration_dependencies)
+            if dependency not in applied_migrations
+        ]
+        if unapplied_dependencies:
+            try:
+                context.migrate(unapplied_dependencies)
+            except NodeNotFoundError as ex:
+                for dep in unapplied_dependencies:
+                    if not context.recorder.migration_qs.filter(
+                            app=dep[0],
+                            name__icontains=dep[1]
+                    ).exists():
+                        raise ex
+
+        return True
 
     @classmethod
-    def from_struct(cls, app_name, obj) -> 'GraphNode':
+    def from_struct(cls, app_name, obj,
+                    node: Optional[Node] = None,
+                    using: str = DEFAULT_DB_ALIAS) -> 'GraphNode':
         """
         Construct node from structured object.
 
         :param app_name: target application name
         :param obj: structured object to create from
+        :param node: prepared node, skips querying the state of the node
+        :param using: connection alias the node is applied to
         :return: representation as graph node
         """
         return cls(
@@ -170,7 +420,33 @@ class GraphNode:
             obj.name,
             obj.dependencies,
             obj.migration_dependencies,
-            obj.routines
+            obj.routines,
+            node=node,
+            atomic=getattr(obj, 'atomic', None),
+            using=using,
+            reverse_routines=list(getattr(obj, 'reverse_routines', []))
+        )
+
+    @classmethod
+    def from_spec(cls, app_name, spec: NodeSpec,
+                  using: str = DEFAULT_DB_ALIAS) -> 'GraphNode':
+        """
+        Construct node from statically read metadata, without importing its
+        routines.
+
+        :param app_name: target application name
+        :param spec: metadata of the node
+        :param using: connection alias the node is applied to
+        :return: representation as graph node
+        """
+        return cls(
+            app_name,
+            spec.name,
+            list(spec.dependencies),
+            list(spec.migration_dependencies),
+            None,
+            node=Node(app_name=app_name, name=spec.name, using=using),
+            module_name=spec.module_name
         )
 
     def __repr__(self) -> str:
@@ -181,7 +457,16 @@ class GraphNode:
 
 
 class Graph:
-    """Directed graph, imitates django's migration graph."""
+    """
+    Directed acyclic graph, imitates django's migration graph.
+
+    Nodes are indexed by their name, edges are given by the
+    ``dependencies`` of the nodes. The topological order of the graph is
+    computed once and reused until a new node gets added.
+
+    The state of the nodes is tracked per database, in the
+    ``data_migrations`` table of the graph's connection alias.
+    """
 
     class MigrationNotFoundError(Exception):
         """Raised when non existing migration requested."""
@@ -195,29 +480,127 @@ class Graph:
         def __init__(self):
             super().__init__('Empty graph can\'t be applied.')
 
-    def __init__(self, app_name: str) -> None:
+    class CircularDependencyError(Exception):
+        """Raised when the dependencies of nodes form a cycle."""
+
+        def __init__(self, names):
+            super().__init__(
+                f'Circular dependency between data migrations: '
+                f'{", ".join(names)}.'
+            )
+
+    def __init__(self, app_name: str, using: str = DEFAULT_DB_ALIAS) -> None:
         self.app_name = app_name
-        self.base_node: Optional[GraphNode] = None
+        self.using = using
+        self.nodes: Dict[str, GraphNode] = {}
+        self._order: Optional[List[GraphNode]] = None
+        self._children: Dict[str, List[str]] = {}
 
     def __repr__(self) -> str:
         """Representation of graph."""
-        node = self.base_node
-        out = str(self.base_node)
-        while node.next:
-            out += f'->{node.next}'
-            node = node.next
-        return out
+        return '->'.join(str(node) for node in self.get_nodes())
+
+    @property
+    def base_node(self) -> Optional[GraphNode]:
+        """:return: first node in topological order"""
+        nodes = self.get_nodes()
+        return nodes[0] if nodes else None
 
     def push_back(self, child: GraphNode) -> None:
         """
-        Append the graph with a new node, or set the first node as base node.
+        Add a new node to the graph.
 
-        :param child: node to append
+        :param child: node to add
         """
-        if not self.base_node:
-            self.base_node = child
-        else:
-            self.base_node.append(child)
+        self.nodes[child.node.name] = child
+        self._order = None
+
+    def parents(self, node: GraphNode) -> List[str]:
+        """
+        Names of the nodes the given node depends on.
+
+        :raises Graph.MigrationNotFoundError: on unknown dependency
+        :param node: node to get dependencies of
+        :return: list of node names
+        """
+        parents = []
+        for dependency in node.dependencies:
+            app_name, _, name = dependency.rpartition('.')
+            if app_name and app_name != self.app_name:
+                name = dependency
+            if name not in self.nodes:
+                raise Graph.MigrationNotFoundError(dependency)
+            parents.append(name)
+        return parents
+
+    def get_nodes(self) -> List[GraphNode]:
+        """
+        Nodes of the graph in topological order, ties are resolved by
+        insertion order.
+
+        :raises Graph.CircularDependencyError: when graph contains cycles
+        :return: all nodes of the graph
+        """
+        if self._order is not None:
+            return self._order
+
+        position = {name: index for index, name in enumerate(self.nodes)}
+        children: Dict[str, List[str]] = {name: [] for name in self.nodes}
+        in_degree: Dict[str, int] = {}
+        for name, node in self.nodes.items():
+            parents = set(self.parents(node))
+            in_degree[name] = len(parents)
+            for parent in parents:
+                children[parent].append(name)
+
+        ready = [(position[name], name)
+                 for name, degree in in_degree.items() if not degree]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            _, name = heapq.heappop(ready)
+            order.append(self.nodes[name])
+            for child in children[name]:
+                in_degree[child] -= 1
+                if not in_degree[child]:
+                    heapq.heappush(ready, (position[child], child))
+
+        if len(order) != len(self.nodes):
+            raise Graph.CircularDependencyError(
+                sorted(name for name, degree in in_degree.items() if degree))
+
+        self._children = children
+        self._order = order
+        return order
+
+    def load_state(self) -> None:
+        """Load the applied state of all nodes using a single query."""
+        Node.bulk_load(graph_node.node for graph_node in self.nodes.values())
+
+    def set_applied(self, nodes: Optional[List[GraphNode]] = None
+                    ) -> List[GraphNode]:
+        """
+        Record unapplied nodes, whose migration dependencies are applied,
+        as applied without executing them.
+
+        Reads the applied django migrations once and records all nodes
+        using a single insert.
+
+        :param nodes: nodes to check, defaults to all nodes of the graph
+        :return: newly recorded nodes
+        """
+        if nodes is None:
+            nodes = list(self.nodes.values())
+        nodes = [node for node in nodes if not node.node.is_applied]
+        if not nodes:
+            return []
+
+        recorder = MigrationRecorder(connections[self.using])
+        applied_migrations = recorder.applied_migrations()
+        nodes = [node for node in nodes
+                 if node.migration_dependencies_applied(applied_migrations)]
+        Node.bulk_apply(graph_node.node for graph_node in nodes)
+        return nodes
 
     def get_node(self, name: str) -> GraphNode:
         """
@@ -232,106 +615,166 @@ class Graph:
 
         # no name = latest applied
         if not name:
-            try:
-                latest_node = Node.Node.objects.filter(
-                    app_name=self.app_name).latest()
-                name = latest_node.name
-            except Node.Node.DoesNotExist:
+            applied = [node for node in self.get_nodes()
+                       if node.node.is_applied]
+            if not applied:
                 return self.base_node
+            return max(applied, key=lambda node: node.node.created_at)
 
-        # search for node in tree with matching name
-        node = self.base_node
-        if node:
-            if node.node.name == name:
-                return node
-            while node.next:
-                if node.node.name == name:
-                    return node
+        try:
+            return self.nodes[name]
+        except KeyError:
+            raise Graph.MigrationNotFoundError(name)
 
-                node = node.next
+    def ancestors(self, node: GraphNode) -> List[GraphNode]:
+        """
+        Ancestors of a node.
 
-        raise Graph.MigrationNotFoundError(name)
+        :param node: node to collect ancestors of
+        :return: the node and all its ancestors in topological order
+        """
+        return self._closure(node, self.parents)
+
+    def descendants(self, node: GraphNode) -> List[GraphNode]:
+        """
+        Descendants of a node.
+
+        :param node: node to collect descendants of
+        :return: the node and all its descendants in topological order
+        """
+        self.get_nodes()
+        return self._closure(
+            node, lambda current: self._children[current.node.name])
+
+    def _closure(self, node: GraphNode, edges) -> List[GraphNode]:
+        visited = {node.node.name}
+        stack = [node]
+        while stack:
+            for name in edges(stack.pop()):
+                if name not in visited:
+                    visited.add(name)
+                    stack.append(self.nodes[name])
+        return [current for current in self.get_nodes()
+                if current.node.name in visited]
+
+    def forward_plan(self, node: Optional[GraphNode] = None
+                     ) -> List[GraphNode]:
+        """
+        Forward plan to reach a target node.
+
+        :param node: target node, defaults to all leaf nodes
+        :return: unapplied nodes required to apply the target, in order
+        """
+        nodes = self.ancestors(node) if node else self.get_nodes()
+        return [current for current in nodes if not current.node.is_applied]
+
+    def backwards_plan(self, node: Optional[GraphNode] = None
+                       ) -> List[GraphNode]:
+        """
+        Backwards plan to revert the graph until a target node.
+
+        :param node: target node, not included, defaults to revert all
+        :return: applied nodes to revert, in order of reversion
+        """
+        if node:
+            nodes = self.descendants(node)[1:]
+        else:
+            nodes = self.get_nodes()
+        return [current for current in reversed(nodes)
+                if current.node.is_applied]
 
     def apply(self, name: Optional[str] = None,
-              fail_silently: bool = False) -> None:
+              fail_silently: bool = False,
+              context: Optional[ExecutionContext] = None) -> None:
         """
         Apply the migration graph until (and including) given name.
 
+        A given, already applied, node with applied descendants is
+        reverted together with its descendants.
+
         :raises Graph.EmptyGraphError(): on attempt on empty graph
         :param name: target migration name
         :param fail_silently: raise exception when applying empty graph
+        :param context: execution context shared between nodes of a run
         """
-        node: GraphNode = self.get_node(name)
-        if not node:
+        if not self.nodes:
+            if name and name != 'zero':
+                raise Graph.MigrationNotFoundError(name)
             if not fail_silently:
                 raise Graph.EmptyGraphError()
             return
 
-        # revert or apply migrations depending on current state
-        if (node.next and node.next.node.is_applied) or name == 'zero':
-            self.revert_graph(node, name == 'zero')
-        else:
-            self.forward_graph(node, not bool(name))
+        if name == 'zero':
+            self.revert_graph(self.backwards_plan(), context)
+            return
 
-    def forward_graph(self, node, complete: bool = True) -> None:
-        """
-        Apply graph based on nodes recursive.
+        node = self.get_node(name) if name else None
+        if node and node.node.is_applied:
+            nodes = self.backwards_plan(node)
+            if nodes:
+                self.revert_graph(nodes + [node], context)
+                return
+        self.forward_graph(self.forward_plan(node), context)
 
-        :param node: current node to apply
-        :param complete: indicator to apply until last node
+    def forward_graph(self, nodes: List[GraphNode],
+                      context: Optional[ExecutionContext] = None) -> None:
         """
-        latest_node = node
-        while (latest_node.previous
-               and not latest_node.previous.node.is_applied):
-            latest_node = latest_node.previous
+        Apply given nodes in order.
 
-        while latest_node:
-            latest_node.apply()
-            if not complete and latest_node == node:
-                break
-            latest_node = latest_node.next
-
-    def revert_graph(self, node, complete: bool = False) -> None:
+        :param nodes: nodes to apply
+        :param context: execution context shared between nodes of a run
         """
-        Reverts graph based on nodes recursive.
-
-        :param node: current node to revert
-        :param complete: indicator to revert whole graph
+        if context is None:
+            context = ExecutionContext(self.using)
+        try:
+            for node in nodes:
+                node.apply(context)
+        finally:
+            context.flush_records()
+
+    def revert_graph(self, nodes: List[GraphNode],
+                     context: Optional[ExecutionContext] = None) -> None:
         """
-        # walk down the tree
-        latest_node = node
-        while latest_node.next and latest_node.next.node.is_applied:
-            latest_node = latest_node.next
+        Reverts given nodes in order.
 
-        # revert until given point
-        while latest_node:
-            latest_node.revert()
-            if not complete and latest_node == node:
-                break
-            latest_node = latest_node.previous
+        Nodes having reverse routines are reverted one by one, see
+        :meth:`GraphNode.revert`, the records of consecutive nodes without
+        reverse routines are removed using a single ``DELETE`` query.
+
+        :param nodes: nodes to revert, in order of reversion
+        :param context: execution context shared between nodes of a run
+        """
+        pending: List[GraphNode] = []
+        for node in nodes:
+            if not node.has_reverse_routines(self.using):
+                pending.append(node)
+                continue
+            Node.bulk_revert(current.node for current in pending)
+            pending = []
+            if context is None:
+                context = ExecutionContext(self.using)
+            node.revert(context)
+        Node.bulk_revert(current.node for current in pending)
 
     @staticmethod
-    def from_dir(app_name: str) -> 'Graph':
+    def from_dir(app_name: str, using: str = DEFAULT_DB_ALIAS) -> 'Graph':
         """
         Generate graph from given app directory.
 
         :param app_name: name of app to generate graph of
+        :param using: connection alias to load the state of the nodes from
         :return: Fully generated graph for requested app
         """
         app_conf = apps.get_app_config(app_name)
         dir_path = app_conf.path
         dir_path = os.path.join(dir_path, 'data_migrations')
-        obj = Graph(app_name)
-        files = [f for f in os.listdir(dir_path)
-                 if os.path.isfile(os.path.join(dir_path, f))]
-        for file in files:
-            if file == '__init__.py':
-                continue
-            file = file.split('.')[0]
-            module_name = f'{app_conf.module.__name__}.data_migrations.{file}'
-            try:
-                node = import_module(module_name).Node
-            except AttributeError:
-                continue
-            obj.push_back(GraphNode.from_struct(app_name, node))
+        obj = Graph(app_name, using)
+        specs = load_node_specs(
+            dir_path,
+            f'{app_conf.module.__name__}.data_migrations',
+            use_manifest=internal_settings.MANIFEST_CACHE
+        )
+        for spec in specs:
+            obj.push_back(GraphNode.from_spec(app_name, spec, using))
+        obj.load_state()
         return obj
@@ -0,0 +1,245 @@
+import ast
+import hashlib
+import json
+import os
+import tempfile
+from dataclasses import asdict, dataclass
+from importlib import import_module
+from typing import Dict, List, Optional, Tuple
+
+
+STATIC_ATTRIBUTES = ('name', 'dependencies', 'migration_dependencies')
+MANIFEST_NAME = '.manifest'
+MANIFEST_VERSION = 1
+
+
+class NotStaticError(Exception):
+    """Raised when a data migration can't be read without importing it."""
+
+    def __init__(self, file_path):
+        super().__init__(
+            f'Data migration "{file_path}" can\'t be parsed statically.'
+        )
+
+
+@dataclass
+class NodeSpec:
+    """Metadata of a data migration ``Node``, read without importing it."""
+    name: str
+    dependencies: Tuple[str, ...]
+    migration_dependencies: Tuple[str, ...]
+    module_name: str
+
+
+def parse_node_file(file_path: str, module_name: str) -> Optional[NodeSpec]:
+    """
+    Read the metadata of the ``Node`` class of a data migration file.
+
+    :raises NotStaticError: when the attributes are not plain literals
+    :param file_path: path of the data migration file
+    :param module_name: importable name of the module
+    :return: metadata of the node or None if the file defines no node
+    """
+    with open(file_path, 'r') as file:
+        try:
+            tree = ast.parse(file.read(), file_path)
+        except SyntaxError:
+            raise NotStaticError(file_path)
+
+    node_class = None
+    for statement in tree.body:
+        if isinstance(statement, ast.ClassDef) and statement.name == 'Node':
+            node_class = statement
+        elif 'Node' in _assigned_names(statement):
+            # Node is created dynamically or imported
+            raise NotStaticError(file_path)
+
+    if node_class is None:
+        return None
+
+    values = {}
+    for statement in node_class.body:
+        if not isinstance(statement, ast.Assign):
+            continue
+        for target in statement.targets:
+            if (isinstance(target, ast.Name)
+                    and target.id in STATIC_ATTRIBUTES):
+                try:
+                    values[target.id] = ast.literal_eval(statement.value)
+                except ValueError:
+                    raise NotStaticError(file_path)
+
+    if 'name' not in values:
+        raise NotStaticError(file_path)
+
+    return NodeSpec(
+        name=values['name'],
+        dependencies=tuple(values.get('dependencies', ())),
+        migration_dependencies=tuple(
+            values.get('migration_dependencies', ())),
+        module_name=module_name,
+    )
+
+
+def _assigned_names(statement) -> List[str]:
+    if isinstance(statement, ast.Assign):
+        return [target.id for target in statement.targets
+                if isinstance(target, ast.Name)]
+    if isinstance(statement, (ast.Import, ast.ImportFrom)):
+        return [alias.asname or alias.name for alias in statement.names]
+    return []
+
+
+def list_migration_files(dir_path: str) -> List[str]:
+    """
+    List data migration files of a directory.
+
+    :param dir_path: data_migrations directory of an app
+    :return: sorted names of the python files within the directory
+    """
+    return sorted(
+        f for f in os.listdir(dir_path)
+        if f.endswith('.py') and f != '__init__.py'
+        and os.path.isfile(os.path.join(dir_path, f))
+    )
+
+
+class Manifest:
+    """
+    On-disk cache of the node metadata of a data_migrations directory.
+
+    Entries are keyed by file name and validated using modification time
+    and size of the file, or its content hash when the modification time
+    changed, e.g. after a fresh checkout.
+    """
+
+    def __init__(self, dir_path: str) -> None:
+        self.file_path = os.path.join(dir_path, MANIFEST_NAME)
+        self.entries: Dict[str, Dict] = {}
+        self.seen: Dict[str, Dict] = {}
+        self.changed = False
+        self.load()
+
+    def load(self) -> None:
+        """Read the manifest, a missing or invalid file leads to no entries."""
+        try:
+            with open(self.file_path, 'r') as file:
+                content = json.load(file)
+        except (OSError, ValueError):
+            return
+
+        if (isinstance(content, dict)
+                and content.get('version') == MANIFEST_VERSION):
+            self.entries = content.get('files', {})
+
+    def get(self, file_path: str, module_name: str):
+        """
+        Read metadata of a file from the manifest, parses changed files.
+
+        :raises NotStaticError: when the file can't be parsed statically
+        :param file_path: path of the data migration file
+        :param module_name: importable name of the module
+        :return: metadata of the node or None if the file defines no node
+        """
+        file_name = os.path.basename(file_path)
+        stat = os.stat(file_path)
+        entry = self.entries.get(file_name)
+        if entry and (entry['mtime'], entry['size']) == (
+                stat.st_mtime_ns, stat.st_size):
+            self.seen[file_name] = entry
+            return self._to_spec(entry, module_name)
+
+        digest = _file_hash(file_path)
+        if not (entry and entry['size'] == stat.st_size
+                and entry['hash'] == digest):
+            spec = parse_node_file(file_path, module_name)
+            entry = {
+                'hash': digest,
+                'node': asdict(spec) if spec else None,
+            }
+        entry.update(mtime=stat.st_mtime_ns, size=stat.st_size)
+        self.seen[file_name] = entry
+        self.changed = True
+        return self._to_spec(entry, module_name)
+
+    @staticmethod
+    def _to_spec(entry: Dict, module_name: str) -> Optional[NodeSpec]:
+        if entry['node'] is None:
+            return None
+        return NodeSpec(
+            name=entry['node']['name'],
+            dependencies=tuple(entry['node']['dependencies']),
+            migration_dependencies=tuple(
+                entry['node']['migration_dependencies']),
+            module_name=module_name,
+        )
+
+    def save(self) -> None:
+        """
+        Write the entries of all requested files, drops entries of deleted
+        files. Failing writes, e.g. on read-only file systems, are ignored.
+        """
+        if not self.changed and self.seen.keys() == self.entries.keys():
+            return
+
+        dir_path = os.path.dirname(self.file_path)
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=dir_path, prefix='.manifest')
+            with os.fdopen(fd, 'w') as file:
+                json.dump({'version': MANIFEST_VERSION, 'files': self.seen},
+                          file, sort_keys=True)
+            os.replace(temp_path, self.file_path)
+        except OSError:
+            return
+        self.entries = dict(self.seen)
+        self.changed = False
+
+
+def _file_hash(file_path: str) -> str:
+    with open(file_path, 'rb') as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+
+def load_node_specs(dir_path: str, package_name: str,
+                    use_manifest: bool = True) -> List[NodeSpec]:
+    """
+    Collect the metadata of all data migrations within a directory.
+
+    Files that can't be parsed statically are imported.
+
+    :param dir_path: data_migrations directory of an app
+    :param package_name: importable name of the directory
+    :param use_manifest: read and update the on-disk manifest cache
+    :return: metadata of all nodes, sorted by file name
+    """
+    manifest = Manifest(dir_path) if use_manifest else None
+    specs = []
+    for file in list_migration_files(dir_path):
+        file_path = os.path.join(dir_path, file)
+        module_name = f'{package_name}.{file[:-len(".py")]}'
+        try:
+            if manifest:
+                spec = manifest.get(file_path, module_name)
+            else:
+                spec = parse_node_file(file_path, module_name)
+        except NotStaticError:
+            spec = _import_node_spec(module_name)
+        if spec is not None:
+            specs.append(spec)
+
+    if manifest:
+        manifest.save()
+    return specs
+
+
+def _import_node_spec(module_name: str) -> Optional[NodeSpec]:
+    try:
+        node = import_module(module_name).Node
+    except AttributeError:
+        return None
+    return NodeSpec(
+        name=node.name,
+        dependencies=tuple(node.dependencies),
+        migration_dependencies=tuple(node.migration_dependencies),
+        module_name=module_name,
+    )
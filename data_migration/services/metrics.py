@@ -0,0 +1,179 @@
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional
+
+# nodes tracing memory concurrently, see collect_metrics
+_tracing_lock = threading.Lock()
+_tracing_nodes = 0
+_started_tracing = False
+# metrics of the node executed within the current context
+_current = ContextVar('data_migration_metrics', default=None)
+
+
+@dataclass
+class NodeMetrics:
+    """Execution metrics of the routines of a node."""
+    #: seconds spent running the routines
+    wall_time: float = 0.0
+    #: seconds spent executing queries
+    db_time: float = 0.0
+    #: number of executed queries
+    queries: int = 0
+    #: rows affected by writing queries
+    rows: int = 0
+    #: peak of traced memory in bytes, ``None`` unless traced
+    peak_memory: Optional[int] = None
+    #: seconds per committed chunk of chunked routines
+    chunk_times: List[float] = field(default_factory=list)
+    #: rows processed by chunked routines
+    processed_rows: int = 0
+    #: chunked routines resumed after a failed run
+    resumed: int = 0
+    #: pauses of throttled routines per reason, see
+    #: :class:`data_migration.services.throttle.Throttle`
+    throttle_pauses: Dict[str, int] = field(default_factory=dict)
+    #: seconds paused by throttles
+    throttled: float = 0.0
+
+    def __str__(self) -> str:
+        summary = (
+            f'{self.wall_time:.2f}s, db {self.db_time:.2f}s, '
+            f'{self.queries} queries, {self.rows} rows'
+        )
+        if self.peak_memory is None:
+            return summary
+        return f'{summary}, peak {format_bytes(self.peak_memory)}'
+
+    @property
+    def throughput(self) -> float:
+        """:return: rows processed by chunked routines per second"""
+        if self.wall_time <= 0:
+            return 0.0
+        return self.processed_rows / self.wall_time
+
+    def throttle_summary(self) -> Optional[str]:
+        """:return: human readable throttle decisions, if throttled"""
+        if not self.throttle_pauses:
+            return None
+        pauses = ', '.join(
+            f'{reason} {count}x'
+            for reason, count in sorted(self.throttle_pauses.items())
+        )
+        return (f'throttled {self.throttled:.2f}s ({pauses}), '
+                f'{self.throughput:.1f} rows/s')
+
+    def __call__(self, execute, sql, params, many, context):
+        """``execute_wrapper`` counting queries, DB time and affected rows."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            rowcount = getattr(context['cursor'], 'rowcount', -1)
+            if rowcount and rowcount > 0 \
+                    and not sql.lstrip()[:6].upper() == 'SELECT':
+                self.rows += rowcount
+
+
+def format_bytes(size: float) -> str:
+    """:return: human readable size, e.g. ``1.5 MiB``"""
+    for unit in ('B', 'KiB', 'MiB'):
+        if abs(size) < 1024:
+            return f'{size:.1f} {unit}'
+        size /= 1024
+    return f'{size:.1f} GiB'
+
+
+@contextmanager
+def collect_metrics(connection, trace_memory: bool = False
+                    ) -> Iterator[NodeMetrics]:
+    """
+    Collect the metrics of the queries executed on a connection.
+
+    Memory is traced using :mod:`tracemalloc`, which slows down
+    allocations noticeably. The traced memory is process wide, nodes
+    applied concurrently share the measurement.
+
+    :param connection: connection the routines are executed on
+    :param trace_memory: whether to trace the peak memory
+    :return: metrics, complete once the block is left
+    """
+    metrics = NodeMetrics()
+    if trace_memory:
+        baseline = _start_tracing()
+    token = _current.set(metrics)
+    start = time.perf_counter()
+    try:
+        with connection.execute_wrapper(metrics):
+            yield metrics
+    finally:
+        metrics.wall_time = time.perf_counter() - start
+        _current.reset(token)
+        if trace_memory:
+            metrics.peak_memory = _stop_tracing(baseline)
+
+
+def record_chunk(seconds: float, rows: int) -> None:
+    """
+    Count a committed chunk towards the metrics of the current node,
+    ignored outside of :func:`collect_metrics`.
+
+    :param seconds: duration of the chunk including its commit
+    :param rows: number of rows of the chunk
+    """
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.chunk_times.append(seconds)
+        metrics.processed_rows += rows
+
+
+def record_pause(reason: str, seconds: float) -> None:
+    """
+    Count a pause of a throttle towards the metrics of the current node.
+
+    :param reason: ``rate``, ``sleep`` or ``probe``
+    :param seconds: duration of the pause
+    """
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.throttle_pauses[reason] = \
+            metrics.throttle_pauses.get(reason, 0) + 1
+        metrics.throttled += seconds
+
+
+def record_resume() -> None:
+    """Count a chunked routine resuming after a failed run."""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.resumed += 1
+
+
+def _start_tracing() -> int:
+    global _tracing_nodes, _started_tracing
+    with _tracing_lock:
+        if not _tracing_nodes:
+            if tracemalloc.is_tracing():
+                # traced by someone else, measure the peak from now on
+                if hasattr(tracemalloc, 'reset_peak'):
+                    tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+                _started_tracing = True
+        _tracing_nodes += 1
+        return tracemalloc.get_traced_memory()[0]
+
+
+def _stop_tracing(baseline: int) -> int:
+    global _tracing_nodes, _started_tracing
+    with _tracing_lock:
+        peak = max(tracemalloc.get_traced_memory()[1] - baseline, 0)
+        _tracing_nodes -= 1
+        if not _tracing_nodes and _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+        return peak
@@ -1,3 +1,11 @@
+import json
+from typing import Dict, Iterable, List
+
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS
+from django.db.backends.signals import connection_created
+
+
 class classproperty:
     """
     Decorator that converts a method with a single cls argument into a property
@@ -25,6 +33,8 @@ class Node:
     This is literally the same as django's MigrationRecorder
     """
     _node_model = None
+    # connection aliases known to hold the data_migrations table
+    _table_exists: Dict[str, bool] = {}
 
     @classproperty
     def Node(cls):
@@ -60,6 +70,8 @@ class Node:
         self.name = name
         self.app_name = app_name
         self.created_at = kwargs.get('created_at')
+        # connection alias holding the record of the node
+        self.using = kwargs.get('using', DEFAULT_DB_ALIAS)
 
     @property
     def is_applied(self):
@@ -78,13 +90,88 @@ class Node:
             app_name=self.app_name,
             created_at=self.created_at
         )
-        obj.save()
+        obj.save(using=self.using)
         self.pk = obj.pk
         self.created_at = obj.created_at
 
+    @staticmethod
+    def group_by_alias(nodes: Iterable['Node']) -> Dict[str, List['Node']]:
+        """:return: nodes grouped by their connection alias"""
+        groups: Dict[str, List['Node']] = {}
+        for node in nodes:
+            groups.setdefault(node.using, []).append(node)
+        return groups
+
+    @classmethod
+    def bulk_apply(cls, nodes: Iterable['Node']) -> None:
+        """
+        Record many nodes as applied using a single insert.
+
+        :raises AlreadyAppliedError: when one of the nodes is applied
+        :param nodes: nodes to record
+        """
+        nodes = list(nodes)
+        if not nodes:
+            return
+
+        for node in nodes:
+            if node.pk:
+                raise AlreadyAppliedError(node)
+
+        from django.utils import timezone
+        created_at = timezone.now()
+        for using, group in cls.group_by_alias(nodes).items():
+            cls('', '', using=using).ensure_table()
+            objs = cls.Node.objects.using(using).bulk_create([
+                cls.Node(
+                    name=node.name,
+                    app_name=node.app_name,
+                    created_at=created_at
+                ) for node in group
+            ])
+            for node, obj in zip(group, objs):
+                node.pk = obj.pk
+                node.created_at = created_at
+
+        if any(node.pk is None for node in nodes):
+            # backend can't return primary keys of bulk inserts
+            cls.bulk_load(nodes)
+
+    @classmethod
+    def bulk_revert(cls, nodes: Iterable['Node']) -> None:
+        """
+        Delete the records of many nodes, using a single ``DELETE`` per app
+        (split into batches when exceeding the backend's parameter limit).
+
+        :param nodes: nodes to revert
+        """
+        nodes = [node for node in nodes if node.is_applied]
+        if not nodes:
+            return
+
+        from django.db import connections, transaction
+        for using, group in cls.group_by_alias(nodes).items():
+            batch_size = connections[using].ops.bulk_batch_size(
+                ['name'], group) or len(group)
+            names_by_app: Dict[str, list] = {}
+            for node in group:
+                names_by_app.setdefault(node.app_name, []).append(node.name)
+            qs = cls.get_qs(using)
+            with transaction.atomic(using=using):
+                for app_name, names in names_by_app.items():
+                    for index in range(0, len(names), batch_size):
+                        qs.filter(
+                            app_name=app_name,
+                            name__in=names[index:index + batch_size]
+                        ).delete()
+
+        for node in nodes:
+            node.pk = None
+            node.created_at = None
+
     @property
     def qs(self):
-        return self.Node.objects
+        return self.Node.objects.using(self.using)
 
     def exists(self):
         self.ensure_table()
@@ -94,30 +181,338 @@ class Node:
         ).exists()
 
     @classmethod
-    def flush(cls):
-        return cls.get_qs().delete()
+    def bulk_load(cls, nodes: Iterable['Node']) -> None:
+        """
+        Synchronize the state of many nodes with a single query.
+
+        Sets ``pk`` and ``created_at`` of every given node based on the
+        records of the ``data_migrations`` table, nodes without record
+        are reset to the unapplied state.
+
+        :param nodes: nodes to load the state for
+        """
+        nodes = list(nodes)
+        if not nodes:
+            return
+
+        for using, group in cls.group_by_alias(nodes).items():
+            app_names = {node.app_name for node in group}
+            records = {
+                (app_name, name): (pk, created_at)
+                for app_name, name, pk, created_at in cls.get_qs(
+                    using
+                ).filter(
+                    app_name__in=app_names
+                ).values_list('app_name', 'name', 'pk', 'created_at')
+            }
+            for node in group:
+                node.pk, node.created_at = records.get(
+                    (node.app_name, node.name), (None, None))
+
+    @classmethod
+    def flush(cls, using: str = DEFAULT_DB_ALIAS):
+        deleted = cls.get_qs(using).delete()
+        cls.clear_table_cache()
+        return deleted
+
+    @classmethod
+    def clear_table_cache(cls, using: str = None) -> None:
+        """
+        Invalidate the cached table existence check.
+
+        :param using: connection alias to invalidate, defaults to all aliases
+        """
+        if using is None:
+            cls._table_exists.clear()
+        else:
+            cls._table_exists.pop(using, None)
 
     @classmethod
-    def get_qs(cls):
-        node = cls('', '')
+    def get_qs(cls, using: str = DEFAULT_DB_ALIAS):
+        node = cls('', '', using=using)
         node.ensure_table()
         return node.qs.all()
 
     def has_table(self):
-        from django.db import connections
-        with connections['default'].cursor() as cursor:
-            tables = connections['default'].introspection.table_names(cursor)
-        return self.Node._meta.db_table in tables
+        return has_table(self.Node, self._table_exists, self.using)
 
     def ensure_table(self):
         if self.has_table():
             return
-        from django.db import connections, DatabaseError as DjDatabaseError
-        # Make the table
-        try:
-            with connections['default'].schema_editor() as editor:
-                editor.create_model(self.Node)
-        except DjDatabaseError as ex:
-            raise DatabaseError(
-                f'Table "data_migrations" not creatable ({str(ex)}'
+        create_table(self.Node, self._table_exists, self.using)
+
+
+class Checkpoint:
+    """
+    Progress of a resumable routine of a node which isn't applied yet, or
+    of a reverse routine of a node being reverted. Routines committed
+    separately, see ``Node.atomic``, are marked ``done`` once committed.
+
+    Stored in the companion table ``data_migration_checkpoints``, records
+    are removed once the node is applied, respectively reverted.
+    """
+    _checkpoint_model = None
+    # connection aliases known to hold the data_migration_checkpoints table
+    _table_exists: Dict[str, bool] = {}
+
+    @classproperty
+    def Checkpoint(cls):
+        """
+        bypass missing appconfig
+        """
+        if cls._checkpoint_model is None:
+            from django.apps.registry import Apps
+            from django.db import models
+
+            class CheckpointClass(models.Model):
+                app_name = models.CharField(max_length=255)
+                name = models.CharField(max_length=255)
+                routine = models.PositiveIntegerField()
+                last_key = models.TextField(null=True)
+                rows_done = models.BigIntegerField(default=0)
+                done = models.BooleanField(default=False)
+                updated_at = models.DateTimeField()
+
+                class Meta:
+                    apps = Apps()
+                    app_label = 'data_migration'
+                    db_table = 'data_migration_checkpoints'
+                    constraints = [
+                        models.UniqueConstraint(
+                            fields=['app_name', 'name', 'routine'],
+                            name='unique_routine_for_node'
+                        )
+                    ]
+
+            cls._checkpoint_model = CheckpointClass
+        return cls._checkpoint_model
+
+    def __init__(self, app_name: str, name: str, routine: int,
+                 using: str = DEFAULT_DB_ALIAS) -> None:
+        """
+        :param app_name: app of the node
+        :param name: name of the node
+        :param routine: index of the routine within the node's routines,
+            respectively its reverse routines
+        :param using: connection alias holding the checkpoint
+        """
+        self.app_name = app_name
+        self.name = name
+        self.routine = routine
+        self.using = using
+        self.pk = None
+        self.last_key = None
+        self.rows_done = 0
+        self.done = False
+
+    def __str__(self):
+        return f'{self.app_name}.{self.name}[{self.routine}]'
+
+    def load(self) -> 'Checkpoint':
+        """Load the persisted progress, if any."""
+        record = self.get_qs(self.using).filter(
+            app_name=self.app_name, name=self.name, routine=self.routine
+        ).values_list('pk', 'last_key', 'rows_done', 'done').first()
+        if record is not None:
+            self.pk, last_key, self.rows_done, self.done = record
+            self.last_key = (
+                None if last_key is None else json.loads(last_key))
+        return self
+
+    def save(self) -> None:
+        """Persist the progress, call within the transaction of a chunk."""
+        from django.core.serializers.json import DjangoJSONEncoder
+        from django.utils import timezone
+        values = dict(
+            last_key=(None if self.last_key is None
+                      else json.dumps(self.last_key, cls=DjangoJSONEncoder)),
+            rows_done=self.rows_done,
+            done=self.done,
+            updated_at=timezone.now(),
+        )
+        if self.pk is None:
+            self.pk = self.get_qs(self.using).create(
+                app_name=self.app_name, name=self.name,
+                routine=self.routine, **values
+            ).pk
+        else:
+            self.get_qs(self.using).filter(pk=self.pk).update(**values)
+
+    @classmethod
+    def clear(cls, app_name: str, name: str,
+              using: str = DEFAULT_DB_ALIAS) -> None:
+        """
+        Remove the checkpoints of a node.
+
+        :param app_name: app of the node
+        :param name: name of the node
+        :param using: connection alias holding the checkpoints
+        """
+        if not has_table(cls.Checkpoint, cls._table_exists, using):
+            return
+        cls.Checkpoint.objects.using(using).filter(
+            app_name=app_name, name=name).delete()
+
+    @classmethod
+    def get_qs(cls, using: str = DEFAULT_DB_ALIAS):
+        ensure_table(cls.Checkpoint, cls._table_exists, using)
+        return cls.Checkpoint.objects.using(using).all()
+
+    @classmethod
+    def flush(cls, using: str = DEFAULT_DB_ALIAS):
+        deleted = cls.get_qs(using).delete()
+        cls._table_exists.clear()
+        return deleted
+
+
+class NodeStats:
+    """
+    Execution metrics of the latest application of a node.
+
+    Stored in the companion table ``data_migration_stats`` together with
+    the record of the node, applying a node again replaces its metrics.
+    """
+    _stats_model = None
+    # connection aliases known to hold the data_migration_stats table
+    _table_exists: Dict[str, bool] = {}
+    #: metrics which can be used to order by
+    METRICS = ('wall_time', 'db_time', 'queries', 'rows', 'peak_memory')
+
+    @classproperty
+    def Stats(cls):
+        """
+        bypass missing appconfig
+        """
+        if cls._stats_model is None:
+            from django.apps.registry import Apps
+            from django.db import models
+
+            class StatsClass(models.Model):
+                app_name = models.CharField(max_length=255)
+                name = models.CharField(max_length=255)
+                wall_time = models.FloatField()
+                db_time = models.FloatField()
+                queries = models.PositiveIntegerField()
+                rows = models.BigIntegerField()
+                peak_memory = models.BigIntegerField(null=True)
+                applied_at = models.DateTimeField()
+
+                class Meta:
+                    apps = Apps()
+                    app_label = 'data_migration'
+                    db_table = 'data_migration_stats'
+                    constraints = [
+                        models.UniqueConstraint(
+                            fields=['app_name', 'name'],
+                            name='unique_stats_for_node'
+                        )
+                    ]
+
+            cls._stats_model = StatsClass
+        return cls._stats_model
+
+    @classmethod
+    def save(cls, node: Node, metrics) -> None:
+        """
+        Persist the metrics of an applied node.
+
+        :param node: applied node
+        :param metrics: metrics of the node's routines, see
+            :class:`data_migration.services.metrics.NodeMetrics`
+        """
+        from django.utils import timezone
+        cls.get_qs(node.using).update_or_create(
+            app_name=node.app_name, name=node.name,
+            defaults=dict(
+                wall_time=metrics.wall_time,
+                db_time=metrics.db_time,
+                queries=metrics.queries,
+                rows=metrics.rows,
+                peak_memory=metrics.peak_memory,
+                applied_at=timezone.now(),
             )
+        )
+
+    @classmethod
+    def slowest(cls, limit: int = 10, order_by: str = 'wall_time',
+                app_name: str = None, using: str = DEFAULT_DB_ALIAS):
+        """
+        :param limit: maximum number of nodes
+        :param order_by: metric to order by, one of :attr:`METRICS`
+        :param app_name: only nodes of this app
+        :param using: connection alias holding the metrics
+        :return: metrics of the most expensive nodes, descending
+        """
+        if order_by not in cls.METRICS:
+            raise ValueError(
+                f'Invalid metric {order_by!r}, use one of {cls.METRICS}.')
+        qs = cls.get_qs(using)
+        if app_name:
+            qs = qs.filter(app_name=app_name)
+        if order_by == 'peak_memory':
+            qs = qs.filter(peak_memory__isnull=False)
+        return list(qs.order_by(f'-{order_by}', 'app_name', 'name')[:limit])
+
+    @classmethod
+    def ensure_table(cls, using: str = DEFAULT_DB_ALIAS) -> None:
+        ensure_table(cls.Stats, cls._table_exists, using)
+
+    @classmethod
+    def get_qs(cls, using: str = DEFAULT_DB_ALIAS):
+        cls.ensure_table(using)
+        return cls.Stats.objects.using(using).all()
+
+    @classmethod
+    def flush(cls, using: str = DEFAULT_DB_ALIAS):
+        deleted = cls.get_qs(using).delete()
+        cls._table_exists.clear()
+        return deleted
+
+
+def has_table(model, cache: Dict[str, bool], using: str) -> bool:
+    if cache.get(using):
+        return True
+
+    from django.db import connections
+    with connections[using].cursor() as cursor:
+        tables = connections[using].introspection.table_names(cursor)
+    exists = model._meta.db_table in tables
+    if exists:
+        cache[using] = True
+    return exists
+
+
+def ensure_table(model, cache: Dict[str, bool], using: str) -> None:
+    if not has_table(model, cache, using):
+        create_table(model, cache, using)
+
+
+def create_table(model, cache: Dict[str, bool], using: str) -> None:
+    from django.db import connections, DatabaseError as DjDatabaseError
+    # Make the table
+    try:
+        with connections[using].schema_editor() as editor:
+            editor.create_model(model)
+    except DjDatabaseError as ex:
+        raise DatabaseError(
+            f'Table "{model._meta.db_table}" not creatable ({str(ex)}'
+        )
+    cache[using] = True
+
+
+def invalidate_table_cache(sender, connection, **kwargs):
+    Node.clear_table_cache(connection.alias)
+    Checkpoint._table_exists.pop(connection.alias, None)
+    NodeStats._table_exists.pop(connection.alias, None)
+
+
+def invalidate_table_cache_on_setting_change(sender, setting, *args,
+                                             **kwargs):
+    if setting == 'DATABASES':
+        Node.clear_table_cache()
+        Checkpoint._table_exists.clear()
+        NodeStats._table_exists.clear()
+
+
+connection_created.connect(invalidate_table_cache)
+setting_changed.connect(invalidate_table_cache_on_setting_change)
@@ -0,0 +1,353 @@
+import heapq
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, \
+    wait
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS
+from django.db.migrations.exceptions import NodeNotFoundError
+
+from data_migration.services.context import (ExecutionContext, MigrationKey,
+                                             parse_migration_dependency)
+from data_migration.services.graph import Graph, GraphNode
+
+ProgressCallback = Callable[[str, GraphNode], None]
+NodeKey = Tuple[str, str]
+
+
+class DataMigrationPlan:
+    """
+    Execution plan of the data migration graphs of many apps.
+
+    The plan is executed alongside django's schema migrations: every
+    data migration runs as soon as its parents and its
+    ``migration_dependencies`` are applied. All graphs share a single
+    execution context, hence a single migration loader and project state.
+    Django's ``migrate`` command builds its own executor internally,
+    without a hook to share it, a run loads the migration graph twice.
+
+    Nodes wait on the first requirement they miss and get re-evaluated
+    once it is fulfilled, ready nodes are applied in the order of the
+    graphs.
+    """
+
+    def __init__(self, graphs: Iterable[Graph],
+                 context: Optional[ExecutionContext] = None,
+                 progress_callback: Optional[ProgressCallback] = None
+                 ) -> None:
+        self.graphs: Dict[str, Graph] = {
+            graph.app_name: graph for graph in graphs
+        }
+        self.context = context or ExecutionContext()
+        self.progress_callback = progress_callback
+        self._position: Optional[Dict[NodeKey, int]] = None
+        self._ready: List[Tuple[int, GraphNode]] = []
+        self._waiting_on_nodes: Dict[NodeKey, List[GraphNode]] = {}
+        self._waiting_on_migrations: Dict[MigrationKey,
+                                          List[GraphNode]] = {}
+        self._write_lock = threading.Lock()
+
+    @classmethod
+    def from_apps(cls, app_labels: Optional[Iterable[str]] = None,
+                  using: str = DEFAULT_DB_ALIAS,
+                  **kwargs) -> 'DataMigrationPlan':
+        """
+        Collect the data migration graphs of installed apps.
+
+        :param app_labels: labels of apps to collect, defaults to all apps
+        :param using: connection alias to apply the data migrations to
+        :return: plan containing the graphs of all apps having a
+            ``data_migrations`` directory
+        """
+        kwargs.setdefault('context', ExecutionContext(using))
+        if app_labels is None:
+            app_configs = apps.get_app_configs()
+        else:
+            app_configs = [apps.get_app_config(label) for label in app_labels]
+
+        return cls([
+            Graph.from_dir(app_config.label, using)
+            for app_config in app_configs
+            if os.path.isdir(os.path.join(app_config.path, 'data_migrations'))
+        ], **kwargs)
+
+    @staticmethod
+    def node_key(node: GraphNode) -> NodeKey:
+        return node.node.app_name, node.node.name
+
+    def is_done(self, node: GraphNode) -> bool:
+        """:return: whether the node is applied or scheduled for recording"""
+        return node.node.is_applied or self.context.is_pending(node.node)
+
+    def pending_nodes(self) -> List[GraphNode]:
+        """:return: unapplied nodes of all graphs, in order"""
+        return [
+            node
+            for graph in self.graphs.values()
+            for node in graph.forward_plan()
+            if not self.context.is_pending(node.node)
+        ]
+
+    def _schedule(self) -> None:
+        if self._position is not None:
+            return
+
+        nodes = self.pending_nodes()
+        self._position = {
+            self.node_key(node): index for index, node in enumerate(nodes)
+        }
+        for node in nodes:
+            self._enqueue(node)
+
+    def _enqueue(self, node: GraphNode) -> None:
+        """Queue the node as ready or let it wait on a missing requirement."""
+        graph = self.graphs[node.node.app_name]
+        for name in graph.parents(node):
+            if not self.is_done(graph.nodes[name]):
+                self._waiting_on_nodes.setdefault(
+                    (graph.app_name, name), []).append(node)
+                return
+
+        applied_migrations = self.context.applied_migrations
+        for dependency in node.migration_dependencies:
+            key = parse_migration_dependency(dependency)
+            if key not in applied_migrations:
+                self._waiting_on_migrations.setdefault(key, []).append(node)
+                return
+
+        heapq.heappush(
+            self._ready, (self._position[self.node_key(node)], node))
+
+    def _release(self, waiting: List[GraphNode]) -> None:
+        for node in waiting:
+            self._enqueue(node)
+
+    def apply_ready(self) -> List[GraphNode]:
+        """
+        Apply all nodes which are ready.
+
+        :return: applied nodes
+        """
+        self._schedule()
+        applied = []
+        try:
+            while self._ready:
+                _, node = heapq.heappop(self._ready)
+                if self.is_done(node):
+                    continue
+                self._apply(node)
+                applied.append(node)
+                self._release(
+                    self._waiting_on_nodes.pop(self.node_key(node), []))
+        finally:
+            self.context.flush_records()
+        return applied
+
+    def migration_applied(self, migration) -> List[GraphNode]:
+        """
+        Advance the plan after a schema migration got applied.
+
+        :param migration: applied django migration
+        :return: data migrations applied in consequence
+        """
+        self._schedule()
+        self.context.mark_applied(migration)
+        keys = [(migration.app_label, migration.name)]
+        keys.extend(tuple(key) for key in migration.replaces or [])
+        for key in keys:
+            self._release(self._waiting_on_migrations.pop(key, []))
+        return self.apply_ready()
+
+    def apply(self, workers: int = 1) -> None:
+        """
+        Apply all remaining nodes, migrating the schema on demand.
+
+        :param workers: number of threads applying nodes of different apps
+            concurrently
+        """
+        if workers > 1:
+            self._apply_parallel(workers)
+            return
+
+        self.apply_ready()
+        while self._unblock():
+            self.apply_ready()
+
+    def _apply_parallel(self, workers: int) -> None:
+        """
+        Apply all remaining nodes using a pool of threads.
+
+        Every thread uses its own database connection. Nodes of the same
+        app never run concurrently, nodes without routines are recorded by
+        the calling thread. Schema migrations are applied by the calling
+        thread while no worker is running.
+
+        SQLite allows a single writer only, on SQLite the transactions of
+        the nodes are serialized, see :meth:`_serialize_transactions`.
+        """
+        self._schedule()
+        busy: Set[str] = set()
+        running: Dict[Future, GraphNode] = {}
+        errors: List[Exception] = []
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                while True:
+                    if not errors:
+                        self._dispatch(pool, running, busy, workers)
+                    if not running:
+                        if errors or not self._unblock():
+                            break
+                        continue
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        node = running.pop(future)
+                        busy.discard(node.node.app_name)
+                        try:
+                            future.result()
+                        except Exception as ex:
+                            errors.append(ex)
+                            continue
+                        self._completed(node)
+        finally:
+            self.context.flush_records()
+
+        if errors:
+            raise errors[0]
+
+    def _dispatch(self, pool: ThreadPoolExecutor,
+                  running: Dict[Future, GraphNode], busy: Set[str],
+                  workers: int) -> None:
+        """Start ready nodes of idle apps until all workers are busy."""
+        skipped = []
+        while self._ready and len(running) < workers:
+            item = heapq.heappop(self._ready)
+            node = item[1]
+            if self.is_done(node):
+                continue
+            if node.node.app_name in busy:
+                skipped.append(item)
+                continue
+
+            if not node.routines:
+                self._apply(node)
+                self._release(
+                    self._waiting_on_nodes.pop(self.node_key(node), []))
+                continue
+
+            if self.progress_callback:
+                self.progress_callback('apply_start', node)
+            busy.add(node.node.app_name)
+            future = pool.submit(self._execute, node, self.context.fork())
+            running[future] = node
+
+        for item in skipped:
+            heapq.heappush(self._ready, item)
+
+    def _execute(self, node: GraphNode, context: ExecutionContext) -> None:
+        try:
+            with self._serialize_transactions(context.connection):
+                node.execute(context)
+                context.flush_records()
+        finally:
+            context.connection.close()
+
+    @contextmanager
+    def _serialize_transactions(self, connection):
+        """
+        Let a single thread at a time run queries inside of a transaction
+        on SQLite.
+
+        Concurrent SQLite transactions fail with "database is locked" once
+        both try to write. The lock is acquired on the first query inside
+        of a transaction and held until the node is executed, work preceding
+        the first query runs concurrently.
+        """
+        if connection.vendor != 'sqlite':
+            yield
+            return
+
+        acquired = False
+
+        def wrapper(execute, sql, params, many, context):
+            nonlocal acquired
+            if not acquired and connection.in_atomic_block:
+                self._write_lock.acquire()
+                acquired = True
+            return execute(sql, params, many, context)
+
+        try:
+            with connection.execute_wrapper(wrapper):
+                yield
+        finally:
+            if acquired:
+                self._write_lock.release()
+
+    def _completed(self, node: GraphNode) -> None:
+        if self.progress_callback:
+            self.progress_callback('apply_success', node)
+        self._release(self._waiting_on_nodes.pop(self.node_key(node), []))
+
+    def _unblock(self) -> bool:
+        """
+        Apply the next schema migration required by the next pending node
+        and release the nodes waiting on the applied migrations.
+
+        Migrating a single step at a time lets nodes of other apps waiting
+        on intermediate migrations run before the schema moves on.
+
+        :return: whether the plan advanced
+        """
+        for node in self.pending_nodes():
+            migration = self._next_migration(node)
+            if migration is None:
+                # dependencies are applied or unknown to django, see
+                # GraphNode.prepare_migration_state
+                node.prepare_migration_state(self.context)
+                for waiting in self._waiting_on_migrations.values():
+                    if node in waiting:
+                        waiting.remove(node)
+                if not any(ready is node for _, ready in self._ready):
+                    heapq.heappush(self._ready, (
+                        self._position[self.node_key(node)], node))
+            else:
+                self.context.migrate([migration])
+
+            applied_migrations = self.context.applied_migrations
+            for key in list(self._waiting_on_migrations):
+                if key in applied_migrations:
+                    self._release(self._waiting_on_migrations.pop(key))
+            return True
+        return False
+
+    def _next_migration(self, node: GraphNode) -> Optional[MigrationKey]:
+        """
+        :return: first unapplied migration of the node's dependencies, if
+            any
+        """
+        applied_migrations = self.context.applied_migrations
+        targets = [
+            key for key in map(parse_migration_dependency,
+                               node.migration_dependencies)
+            if key not in applied_migrations
+        ]
+        if not targets:
+            return None
+        try:
+            plan = self.context.executor.migration_plan(targets)
+        except NodeNotFoundError:
+            return None
+        for migration, backwards in plan:
+            if not backwards:
+                return migration.app_label, migration.name
+        return None
+
+    def _apply(self, node: GraphNode) -> None:
+        if self.progress_callback:
+            self.progress_callback('apply_start', node)
+        node.apply(self.context)
+        if self.progress_callback:
+            self.progress_callback('apply_success', node)
@@ -0,0 +1,115 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from django.db import DEFAULT_DB_ALIAS
+
+from data_migration.services.node import Node
+
+
+class Profiler:
+    """
+    Profiles the routines of data migrations using :mod:`cProfile`.
+
+    Writes one pstats file per node to ``directory``, named
+    ``[app_name].[name].prof``, prefixed by the connection alias for
+    databases other than the default. The files can be inspected using
+    :mod:`pstats` or tools like ``snakeviz``.
+
+    A summary of the ``top`` functions by cumulative time, and optionally
+    of the ``top`` SQL statements by total time, is written to ``output``
+    after every node.
+    """
+
+    def __init__(self, directory: str, top: int = 20, sql: bool = False,
+                 output: Optional[Callable[[str], None]] = None) -> None:
+        """
+        :param directory: directory to write the pstats files to, created
+            if missing
+        :param top: number of functions and SQL statements to summarize
+        :param sql: whether to summarize the slowest SQL statements
+        :param output: writes the summaries, defaults to
+            ``sys.stdout.write``
+        """
+        self.directory = directory
+        self.top = top
+        self.sql = sql
+        self.output = output or sys.stdout.write
+        os.makedirs(directory, exist_ok=True)
+
+    def file_name(self, node: Node) -> str:
+        """:return: path of the pstats file of the node"""
+        name = f'{node.app_name}.{node.name}.prof'
+        if node.using != DEFAULT_DB_ALIAS:
+            name = f'{node.using}.{name}'
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def profile(self, node: Node, connection) -> Iterator[cProfile.Profile]:
+        """
+        Profile the code executed within the block.
+
+        The pstats file is written even if the block fails.
+
+        :param node: node whose routines are executed
+        :param connection: connection the routines are executed on
+        :return: running profile
+        """
+        statements: Dict[str, List[float]] = {}
+
+        def record_statement(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                statements.setdefault(sql, []).append(
+                    time.perf_counter() - start)
+
+        profile = cProfile.Profile()
+        recording = connection.execute_wrapper(record_statement) \
+            if self.sql else nullcontext()
+        try:
+            with recording:
+                profile.enable()
+                try:
+                    yield profile
+                finally:
+                    profile.disable()
+        finally:
+            file_name = self.file_name(node)
+            profile.dump_stats(file_name)
+            self.output(self.summary(
+                node, file_name, profile, slowest_statements(
+                    statements, self.top) if self.sql else None))
+
+    def summary(self, node: Node, file_name: str, profile: cProfile.Profile,
+                statements: List[Tuple[str, int, float]] = None) -> str:
+        """:return: summary of a profiled node"""
+        out = io.StringIO()
+        out.write(f'Profile of {node.app_name}.{node.name}: {file_name}\n')
+        pstats.Stats(profile, stream=out).sort_stats(
+            pstats.SortKey.CUMULATIVE).print_stats(self.top)
+        if statements is not None:
+            out.write(f'Slowest SQL of {node.app_name}.{node.name}:\n')
+            out.write(f'{"total":>10} {"calls":>8}  statement\n')
+            for sql, calls, total in statements:
+                out.write(f'{total:>9.3f}s {calls:>8}  {sql}\n')
+        return out.getvalue()
+
+
+def slowest_statements(statements: Dict[str, List[float]], top: int
+                       ) -> List[Tuple[str, int, float]]:
+    """
+    :param statements: durations of executed SQL statements
+    :param top: number of statements
+    :return: ``(sql, calls, total seconds)`` of the statements with the
+        highest total duration, descending
+    """
+    totals = [(sql, len(durations), sum(durations))
+              for sql, durations in statements.items()]
+    return sorted(totals, key=lambda total: total[2], reverse=True)[:top]
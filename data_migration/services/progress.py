@@ -0,0 +1,174 @@
+import datetime
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, Optional
+
+Reporter = Callable[['Progress'], None]
+
+#: seconds between reading the clock, based on the current rate
+CHECK_INTERVAL = 0.1
+
+
+class Progress:
+    """
+    Progress of the routines of a node.
+
+    ``total`` declares the amount of work that follows, ``advance`` counts
+    the work done. The reporter is called at most once per ``interval``,
+    the clock is read only about every :data:`CHECK_INTERVAL` seconds
+    based on the current rate, advancing costs an addition and a
+    comparison otherwise.
+    """
+
+    def __init__(self, name: str, reporter: Optional[Reporter] = None,
+                 interval: float = 5.0,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        :param name: name of the node, used in reports
+        :param reporter: called with the progress at most once per interval
+        :param interval: minimum seconds between two reports
+        :param clock: time source
+        """
+        self.name = name
+        self.reporter = reporter
+        self.interval = interval
+        self.clock = clock
+        self.total_count: Optional[int] = None
+        self.done = 0
+        # units done before the measurement started, e.g. by a former run
+        self.initial = 0
+        self.started_at = clock()
+        self._next_report = self.started_at + interval
+        self._next_check = 1
+
+    def total(self, count: int, done: int = 0) -> None:
+        """
+        Declare the amount of work that follows, e.g. the rows of a table.
+
+        Restarts the measurement of rate and ETA.
+
+        :param count: number of units to process
+        :param done: units processed already, e.g. by a resumed run, they
+            count towards the percentage but not the rate
+        """
+        self.total_count = count
+        self.done = done
+        self.initial = done
+        self.started_at = self.clock()
+        self._next_report = self.started_at + self.interval
+        self._next_check = done + 1
+
+    def advance(self, count: int = 1) -> None:
+        """
+        Count processed units.
+
+        :param count: number of processed units
+        """
+        self.done += count
+        if self.done >= self._next_check:
+            self._check()
+
+    def _check(self) -> None:
+        now = self.clock()
+        elapsed = now - self.started_at
+        done = self.done - self.initial
+        rate = done / elapsed if elapsed > 0 else 0.0
+        self._next_check = self.done + max(int(rate * CHECK_INTERVAL), 1)
+        if now >= self._next_report:
+            self._next_report = now + self.interval
+            if self.reporter is not None:
+                self.reporter(self)
+
+    @property
+    def elapsed(self) -> float:
+        return self.clock() - self.started_at
+
+    @property
+    def rate(self) -> float:
+        """:return: processed units per second"""
+        elapsed = self.elapsed
+        return (self.done - self.initial) / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def percent(self) -> Optional[float]:
+        """:return: percentage done, ``None`` without total"""
+        if not self.total_count:
+            return None
+        return min(100.0 * self.done / self.total_count, 100.0)
+
+    @property
+    def eta(self) -> Optional[float]:
+        """:return: estimated seconds remaining, ``None`` if unknown"""
+        rate = self.rate
+        if self.total_count is None or not rate:
+            return None
+        return max(self.total_count - self.done, 0) / rate
+
+    def __str__(self) -> str:
+        rate = f'{self.rate:.0f} rows/s'
+        percent = self.percent
+        if percent is None:
+            return f'{self.name}: {self.done} rows, {rate}'
+        eta = '-' if self.eta is None \
+            else str(datetime.timedelta(seconds=int(self.eta)))
+        return (f'{self.name}: {percent:.1f}% '
+                f'({self.done}/{self.total_count} rows), {rate}, ETA {eta}')
+
+
+# progress of the node applied within the current context
+_current = ContextVar('data_migration_progress', default=None)
+
+
+class ProgressProxy:
+    """
+    Progress of the node currently applied, available to routines.
+
+    Calls outside of tracked nodes are ignored.
+
+    .. code:: python
+
+        from data_migration.routines import progress
+
+        def backfill(apps, schema_editor):
+            qs = apps.get_model('app_label', 'Model').objects.all()
+            progress.total(qs.count())
+            for obj in qs.iterator():
+                ...
+                progress.advance()
+    """
+
+    @property
+    def active(self) -> bool:
+        """:return: whether the progress of the current node is tracked"""
+        return _current.get() is not None
+
+    def total(self, count: int, done: int = 0) -> None:
+        """See :meth:`Progress.total`."""
+        current = _current.get()
+        if current is not None:
+            current.total(count, done)
+
+    def advance(self, count: int = 1) -> None:
+        """See :meth:`Progress.advance`."""
+        current = _current.get()
+        if current is not None:
+            current.advance(count)
+
+
+progress = ProgressProxy()
+
+
+@contextmanager
+def track(current: Progress) -> Iterator[Progress]:
+    """
+    Make the progress available to the routines executed within the block.
+
+    :param current: progress of the node
+    :return: the progress
+    """
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        _current.reset(token)
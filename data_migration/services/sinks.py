@@ -0,0 +1,307 @@
+import logging
+import os
+import re
+import socket
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from data_migration.services.metrics import NodeMetrics
+from data_migration.services.node import Node
+from data_migration.settings import internal_settings
+
+log = logging.getLogger('data_migration')
+
+#: upper bounds in seconds of the buckets of the chunk latency histogram
+CHUNK_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# sinks configured by the METRICS_SINK setting, shared between contexts
+_configured_sinks: Dict[str, 'MetricsSink'] = {}
+_configured_sinks_lock = threading.Lock()
+
+
+class MetricsSink(ABC):
+    """
+    Exports the metrics of data migrations to a monitoring system.
+
+    Receives the metrics of every node whose routines ran, see
+    :class:`data_migration.services.metrics.NodeMetrics`. Sinks are shared
+    between the threads of a run, failing exports are logged and ignored.
+    """
+
+    @abstractmethod
+    def node_applied(self, node: Node, metrics: NodeMetrics) -> None:
+        """
+        :param node: applied node
+        :param metrics: metrics of the node's routines
+        """
+
+    @abstractmethod
+    def node_failed(self, node: Node, metrics: NodeMetrics) -> None:
+        """
+        :param node: node whose routines failed
+        :param metrics: metrics of the routines until the failure
+        """
+
+    @classmethod
+    def from_settings(cls) -> Optional['MetricsSink']:
+        """
+        :return: sink configured by the ``METRICS_SINK`` setting, if any.
+            The same configuration returns the same sink.
+        """
+        config = internal_settings.METRICS_SINK
+        if not config:
+            return None
+
+        key = repr(sorted(config.items()))
+        with _configured_sinks_lock:
+            if key not in _configured_sinks:
+                _configured_sinks[key] = create_sink(config)
+            return _configured_sinks[key]
+
+
+def create_sink(config: Dict) -> MetricsSink:
+    """
+    :param config: value of the ``METRICS_SINK`` setting
+    :return: sink of the configured backend
+    """
+    backend = config.get('BACKEND')
+    if backend == 'prometheus':
+        return PrometheusTextfileSink(config['PATH'])
+    if backend == 'statsd':
+        return StatsdSink(
+            host=config.get('HOST', 'localhost'),
+            port=config.get('PORT', 8125),
+            prefix=config.get('PREFIX', 'data_migration'),
+        )
+    raise ValueError(
+        f'Invalid METRICS_SINK backend {backend!r}, use "prometheus" or '
+        f'"statsd".')
+
+
+LabelKey = Tuple[str, str, str]
+
+
+class PrometheusTextfileSink(MetricsSink):
+    """
+    Writes the metrics of the current process to a file for the textfile
+    collector of the Prometheus node exporter.
+
+    The file is replaced atomically after every node. Gauges hold the
+    metrics of the latest application of a node, counters and the chunk
+    latency histogram accumulate within the process. Nodes are labeled by
+    ``database``, ``app`` and ``node``.
+    """
+
+    GAUGES = (
+        ('node_duration_seconds', 'wall_time',
+         'Seconds spent running the routines of the data migration.'),
+        ('node_db_duration_seconds', 'db_time',
+         'Seconds spent executing queries of the data migration.'),
+        ('node_queries', 'queries',
+         'Number of queries executed by the data migration.'),
+        ('node_rows', 'rows',
+         'Rows affected by writing queries of the data migration.'),
+        ('node_processed_rows', 'processed_rows',
+         'Rows processed by chunked routines of the data migration.'),
+        ('node_throttled_seconds', 'throttled',
+         'Seconds paused by throttles of the data migration.'),
+    )
+
+    def __init__(self, path: str,
+                 buckets: Sequence[float] = CHUNK_BUCKETS) -> None:
+        """
+        :param path: path of the ``.prom`` file, usually within the
+            directory of ``--collector.textfile.directory``
+        :param buckets: upper bounds in seconds of the chunk latency
+            histogram
+        """
+        self.path = path
+        self.buckets = tuple(sorted(buckets))
+        self.gauges: Dict[LabelKey, NodeMetrics] = {}
+        self.retries: Dict[LabelKey, int] = {}
+        self.failures: Dict[LabelKey, int] = {}
+        # count per bucket, including +Inf, and sum per node
+        self.chunks: Dict[LabelKey, Tuple[List[int], List[float]]] = {}
+        self.lock = threading.Lock()
+
+    def node_applied(self, node: Node, metrics: NodeMetrics) -> None:
+        with self.lock:
+            key = self.observe(node, metrics)
+            self.gauges[key] = metrics
+            self.write()
+
+    def node_failed(self, node: Node, metrics: NodeMetrics) -> None:
+        with self.lock:
+            key = self.observe(node, metrics)
+            self.failures[key] = self.failures.get(key, 0) + 1
+            self.write()
+
+    def observe(self, node: Node, metrics: NodeMetrics) -> LabelKey:
+        """Count the chunks and retries of a node."""
+        key = (node.using, node.app_name, node.name)
+        if metrics.resumed:
+            self.retries[key] = self.retries.get(key, 0) + metrics.resumed
+        if metrics.chunk_times:
+            counts, total = self.chunks.setdefault(
+                key, ([0] * (len(self.buckets) + 1), [0.0]))
+            for seconds in metrics.chunk_times:
+                counts[bisect_left(self.buckets, seconds)] += 1
+            total[0] += sum(metrics.chunk_times)
+        return key
+
+    def render(self) -> str:
+        """:return: metrics in the Prometheus text format"""
+        lines = []
+        for name, attribute, description in self.GAUGES:
+            lines.append(f'# HELP data_migration_{name} {description}')
+            lines.append(f'# TYPE data_migration_{name} gauge')
+            for key, metrics in sorted(self.gauges.items()):
+                lines.append(f'data_migration_{name}{{{labels(key)}}} '
+                             f'{getattr(metrics, attribute)}')
+
+        for name, values, description in (
+                ('node_retries_total', self.retries,
+                 'Chunked routines resumed after a failed run.'),
+                ('node_failures_total', self.failures,
+                 'Failed applications of the data migration.')):
+            lines.append(f'# HELP data_migration_{name} {description}')
+            lines.append(f'# TYPE data_migration_{name} counter')
+            for key, value in sorted(values.items()):
+                lines.append(f'data_migration_{name}{{{labels(key)}}} '
+                             f'{value}')
+
+        name = 'data_migration_chunk_duration_seconds'
+        lines.append(f'# HELP {name} Seconds per committed chunk of '
+                     f'chunked routines.')
+        lines.append(f'# TYPE {name} histogram')
+        for key, (counts, total) in sorted(self.chunks.items()):
+            node_labels = labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'), ),
+                                    counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{name}_bucket{{{node_labels},le="{le}"}} '
+                             f'{cumulative}')
+            lines.append(f'{name}_sum{{{node_labels}}} {total[0]}')
+            lines.append(f'{name}_count{{{node_labels}}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self) -> None:
+        """Replace the file atomically, failing writes are logged."""
+        dir_path = os.path.dirname(os.path.abspath(self.path))
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=dir_path, prefix='.prom')
+            with os.fdopen(fd, 'w') as file:
+                file.write(self.render())
+            # the node exporter runs as another user
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, self.path)
+        except OSError as ex:
+            log.warning('Writing metrics to %s failed: %s', self.path, ex)
+
+
+def labels(key: LabelKey) -> str:
+    """:return: label set of a node, escaped"""
+    return ','.join(
+        f'{name}="{escape_label(value)}"'
+        for name, value in zip(('database', 'app', 'node'), key)
+    )
+
+
+def escape_label(value: str) -> str:
+    return value.replace('\\', r'\\').replace('"', r'\"').replace(
+        '\n', r'\n')
+
+
+class StatsdSink(MetricsSink):
+    """
+    Sends the metrics of every node as StatsD UDP packets.
+
+    Metrics are named ``[prefix].[database].[app].[node].[metric]``:
+    ``duration``, ``db_duration``, ``chunk`` (one per committed chunk) and
+    ``throttled`` are timers in milliseconds, ``queries``, ``rows`` and
+    ``processed_rows`` gauges, ``retries`` and ``failures`` counters.
+    Lines are batched into packets of at most ``max_packet_size`` bytes.
+    """
+
+    def __init__(self, host: str = 'localhost', port: int = 8125,
+                 prefix: str = 'data_migration',
+                 max_packet_size: int = 1432) -> None:
+        """
+        :param host: host of the StatsD server
+        :param port: UDP port of the StatsD server
+        :param prefix: prefix of all metric names
+        :param max_packet_size: maximum payload per packet, the default
+            fits the MTU of most networks
+        """
+        self.address = (host, port)
+        self.prefix = prefix
+        self.max_packet_size = max_packet_size
+        self.lock = threading.Lock()
+        self._socket: Optional[socket.socket] = None
+
+    def node_applied(self, node: Node, metrics: NodeMetrics) -> None:
+        prefix = self.node_prefix(node)
+        lines = [
+            f'{prefix}.duration:{metrics.wall_time * 1000:.3f}|ms',
+            f'{prefix}.db_duration:{metrics.db_time * 1000:.3f}|ms',
+            f'{prefix}.queries:{metrics.queries}|g',
+            f'{prefix}.rows:{metrics.rows}|g',
+            f'{prefix}.processed_rows:{metrics.processed_rows}|g',
+        ]
+        self.send(lines + self.observe(prefix, metrics))
+
+    def node_failed(self, node: Node, metrics: NodeMetrics) -> None:
+        prefix = self.node_prefix(node)
+        self.send([f'{prefix}.failures:1|c']
+                  + self.observe(prefix, metrics))
+
+    @staticmethod
+    def observe(prefix: str, metrics: NodeMetrics) -> List[str]:
+        """:return: lines of the chunks and retries of a node"""
+        lines = [f'{prefix}.chunk:{seconds * 1000:.3f}|ms'
+                 for seconds in metrics.chunk_times]
+        if metrics.resumed:
+            lines.append(f'{prefix}.retries:{metrics.resumed}|c')
+        if metrics.throttled:
+            lines.append(f'{prefix}.throttled:{metrics.throttled * 1000:.3f}'
+                         f'|ms')
+        return lines
+
+    def node_prefix(self, node: Node) -> str:
+        return '.'.join([self.prefix] + [
+            re.sub(r'[^\w\-]', '_', part)
+            for part in (node.using, node.app_name, node.name)
+        ])
+
+    def packets(self, lines: List[str]) -> List[bytes]:
+        """:return: lines joined into packets of the maximum size"""
+        packets = []
+        packet = b''
+        for line in lines:
+            data = line.encode()
+            if packet and len(packet) + 1 + len(data) > \
+                    self.max_packet_size:
+                packets.append(packet)
+                packet = b''
+            packet = packet + b'\n' + data if packet else data
+        if packet:
+            packets.append(packet)
+        return packets
+
+    def send(self, lines: List[str]) -> None:
+        """Send the lines, failing sends are logged."""
+        with self.lock:
+            try:
+                if self._socket is None:
+                    self._socket = socket.socket(
+                        socket.AF_INET, socket.SOCK_DGRAM)
+                for packet in self.packets(lines):
+                    self._socket.sendto(packet, self.address)
+            except OSError as ex:
+                log.warning('Sending metrics to %s:%s failed: %s',
+                            *self.address, ex)
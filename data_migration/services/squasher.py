@@ -1,9 +1,10 @@
 import os
 import sys
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 from data_migration.services.file_generator import DataMigrationGenerator,\
     Routine
+from data_migration.services.graph import Graph
 from django.apps import apps
 from django.core.management import call_command
 from django.db.migrations import Migration
@@ -35,7 +36,9 @@ sys.stdout = log
 class MigrationFile:
     def __init__(self, fn: str, replacement_string: str, pos: int):
         self.file_name: str = fn
+        self.module: str = replacement_string
         self.replacement_string: str = replacement_string
+        self.reverse_string: Optional[str] = None
         self.position: int = pos
 
 
@@ -156,24 +159,9 @@ class MigrationManager:
 
                 found = False
                 for elem in self.migration_files_to_touch:
-                    if elem.replacement_string in line:
+                    if elem.module in line:
                         found = True
-                        index = line.find(elem.replacement_string)
-                        next_space = line.find(
-                            ' ',
-                            index + len(elem.replacement_string)
-                        )
-                        if next_space == -1:
-                            next_space = line.find(
-                                ',',
-                                index + len(elem.replacement_string)
-                            )
-                        if next_space == -1:
-                            next_space = line.find(
-                                '\n',
-                                index + len(elem.replacement_string)
-                            )
-                        elem.replacement_string = line[index:next_space]
+                        self._extract_reference(line, elem)
                         break
 
                 if stack_open or 'code=' in line or '#' in line or found:
@@ -183,13 +171,45 @@ class MigrationManager:
 
         os.remove(self.temp_file_name)
 
+    @staticmethod
+    def _extract_reference(line: str, elem: MigrationFile) -> None:
+        """
+        Store the dotted path of the forward or reverse function of a
+        ``RunPython`` operation, the first reference of each kind wins.
+        """
+        index = line.find(elem.module)
+        next_space = line.find(' ', index + len(elem.module))
+        if next_space == -1:
+            next_space = line.find(',', index + len(elem.module))
+        if next_space == -1:
+            next_space = line.find('\n', index + len(elem.module))
+        if 'reverse_code=' in line:
+            if elem.reverse_string is None:
+                elem.reverse_string = line[index:next_space]
+        elif elem.replacement_string == elem.module:
+            elem.replacement_string = line[index:next_space]
+
     def process_data_migrations(self):
         """
         Generated data_migrations based on processed files.
+
+        Generated files get marked as applied in bulk when their
+        migration dependencies are applied.
         """
+        graph = Graph(self.app_name)
         for elem in self.migration_files_to_touch:
             module_name = elem.replacement_string.split(".")[-2]
             module = '.'.join(elem.replacement_string.split('.')[:-1])
+            reverse_routines = []
+            if elem.reverse_string is not None:
+                reverse_routines.append(
+                    Routine(
+                        method=elem.reverse_string.split('.')[-1],
+                        module=module,
+                        module_name=f'mig_{module_name}',
+                        file_path=elem.file_name,
+                    )
+                )
             generator = DataMigrationGenerator(
                 self.app_name, module_name,
                 routines=[
@@ -200,10 +220,14 @@ class MigrationManager:
                         file_path=elem.file_name,
                     )
                 ],
+                reverse_routines=reverse_routines,
                 migration_dependencies=[module.replace('.migrations', '')],
                 dry_run=self.dry_run,
             )
-            generator.set_applied()
+            if not self.dry_run:
+                graph.push_back(generator.get_graph_node())
+        graph.load_state()
+        graph.set_applied()
 
 
 class MigrationSquash:
@@ -0,0 +1,155 @@
+from typing import Callable, Dict, Iterator, Optional, Set, Tuple
+
+from django.db.migrations.state import ProjectState
+
+#: ``(app_label, model_name)``, the model name in lower case
+ModelKey = Tuple[str, str]
+
+
+class LazyApps:
+    """
+    Historical apps rendering models on demand.
+
+    ``get_model`` renders the requested model together with all models
+    related to it, directly or indirectly and in both directions, as
+    required by e.g. cascading deletes. Related models share a registry,
+    unrelated models are rendered into registries of their own.
+
+    The project state is only created once a model is requested, routines
+    not touching ``apps`` render nothing. Once the whole project state is
+    rendered, e.g. by schema migrations, its registry is used. Any other
+    attribute, e.g. ``get_models()``, renders the whole project state.
+    """
+
+    def __init__(self, get_state: Callable[[], ProjectState]) -> None:
+        """
+        :param get_state: returns the project state, called on first use
+        """
+        self._get_state = get_state
+        self._state: Optional[ProjectState] = None
+        self._relations: Optional[Dict[ModelKey, Set[ModelKey]]] = None
+        self._registries: Dict[ModelKey, object] = {}
+
+    @property
+    def state(self) -> ProjectState:
+        if self._state is None:
+            self._state = self._get_state()
+        return self._state
+
+    @property
+    def rendered_models(self) -> Set[ModelKey]:
+        """Keys of the models rendered on demand so far."""
+        return set(self._registries)
+
+    def get_model(self, app_label: str, model_name: Optional[str] = None,
+                  require_ready: bool = True):
+        """
+        Like ``Apps.get_model``, renders the model on first use.
+
+        :raises LookupError: on unknown models
+        :param app_label: app label, or the model label
+            ``app_label.ModelName``
+        :param model_name: name of the model, case insensitive
+        :param require_ready: see ``Apps.get_model``
+        :return: historical model
+        """
+        if model_name is None:
+            app_label, model_name = app_label.split('.')
+        state = self.state
+        key = (app_label, model_name.lower())
+        if 'apps' in state.__dict__ or key not in state.models:
+            # rendered already, or a model of an app without migrations
+            return state.apps.get_model(
+                app_label, model_name, require_ready=require_ready)
+
+        registry = self._registries.get(key)
+        if registry is None:
+            keys = related_models(self.relations, key)
+            registry = ProjectState(
+                models={
+                    related: state.models[related].clone()
+                    for related in keys
+                },
+                real_apps=state.real_apps,
+            ).apps
+            for related in keys:
+                self._registries[related] = registry
+        return registry.get_model(
+            app_label, model_name, require_ready=require_ready)
+
+    @property
+    def relations(self) -> Dict[ModelKey, Set[ModelKey]]:
+        """Related models per model of the project state."""
+        if self._relations is None:
+            self._relations = model_relations(self.state)
+        return self._relations
+
+    def __getattr__(self, item):
+        if item.startswith('__'):
+            raise AttributeError(item)
+        return getattr(self.state.apps, item)
+
+
+def model_relations(state: ProjectState) -> Dict[ModelKey, Set[ModelKey]]:
+    """
+    :param state: project state
+    :return: models referencing or referenced by a model, per model
+    """
+    relations: Dict[ModelKey, Set[ModelKey]] = {
+        key: set() for key in state.models
+    }
+    for key, model_state in state.models.items():
+        for reference in references(model_state):
+            if reference != key and reference in relations:
+                relations[key].add(reference)
+                relations[reference].add(key)
+    return relations
+
+
+def references(model_state) -> Iterator[ModelKey]:
+    """:return: models referenced by relations and bases of a model"""
+    fields = model_state.fields
+    # dict since django 3.1, list of tuples before
+    if isinstance(fields, dict):
+        fields = fields.items()
+    for _, field in fields:
+        remote_field = getattr(field, 'remote_field', None)
+        if remote_field is None:
+            continue
+        yield resolve_reference(remote_field.model, model_state)
+        through = getattr(remote_field, 'through', None)
+        if through is not None:
+            yield resolve_reference(through, model_state)
+    for base in model_state.bases:
+        if isinstance(base, str) or hasattr(base, '_meta'):
+            yield resolve_reference(base, model_state)
+
+
+def resolve_reference(reference, model_state) -> ModelKey:
+    """
+    :param reference: model, model label or model name of the app of
+        ``model_state``
+    :param model_state: referencing model
+    :return: key of the referenced model
+    """
+    if not isinstance(reference, str):
+        return reference._meta.app_label, reference._meta.model_name
+    if reference == 'self':
+        return model_state.app_label, model_state.name_lower
+    if '.' not in reference:
+        return model_state.app_label, reference.lower()
+    app_label, model_name = reference.split('.', 1)
+    return app_label, model_name.lower()
+
+
+def related_models(relations: Dict[ModelKey, Set[ModelKey]],
+                   key: ModelKey) -> Set[ModelKey]:
+    """:return: the model and all models related to it, transitively"""
+    found = {key}
+    stack = [key]
+    while stack:
+        for related in relations[stack.pop()]:
+            if related not in found:
+                found.add(related)
+                stack.append(related)
+    return found
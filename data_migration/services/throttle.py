@@ -0,0 +1,169 @@
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+
+from django.utils.module_loading import import_string
+
+from data_migration.services.metrics import record_pause
+from data_migration.settings import internal_settings
+
+log = logging.getLogger('data_migration')
+
+#: returns the number of seconds to pause before the next chunk
+Probe = Callable[[], Optional[float]]
+
+
+class Throttle:
+    """
+    Limits the load of chunked routines.
+
+    Pauses are made between chunks, outside of their transactions:
+
+    - ``rows_per_second``: pause until the average throughput drops to the
+      target
+    - ``sleep``: fixed pause per chunk, i.e. a duty cycle
+    - ``probe``: back-pressure probe, e.g. measuring replica lag, called
+      after every chunk. Returns the number of seconds to pause, the probe
+      is called again after pausing until it returns ``0`` or ``None``
+      or ``max_probe_wait`` is exceeded
+
+    Pauses count towards the metrics of the node being applied, see
+    :attr:`data_migration.services.metrics.NodeMetrics.throttle_pauses`.
+    """
+
+    def __init__(self, rows_per_second: Optional[float] = None,
+                 sleep: float = 0.0, probe: Optional[Probe] = None,
+                 max_probe_wait: float = 300.0,
+                 clock: Callable[[], float] = time.monotonic,
+                 pause: Callable[[float], None] = time.sleep) -> None:
+        if rows_per_second is not None and rows_per_second <= 0:
+            raise ValueError('rows_per_second has to be positive.')
+        self.rows_per_second = rows_per_second
+        self.sleep = sleep
+        self.probe = probe
+        self.max_probe_wait = max_probe_wait
+        self.clock = clock
+        self.pause = pause
+
+    @classmethod
+    def from_settings(cls) -> Optional['Throttle']:
+        """
+        :return: throttle configured by the ``THROTTLE`` setting, if any
+        """
+        config = internal_settings.THROTTLE
+        if not config:
+            return None
+
+        probe = config.get('PROBE')
+        if isinstance(probe, str):
+            probe = import_string(probe)
+        kwargs = {}
+        if 'MAX_PROBE_WAIT' in config:
+            kwargs['max_probe_wait'] = config['MAX_PROBE_WAIT']
+        return cls(
+            rows_per_second=config.get('ROWS_PER_SECOND'),
+            sleep=config.get('SLEEP', 0.0),
+            probe=probe,
+            **kwargs
+        )
+
+    def start(self, name: str) -> 'ThrottleRun':
+        """
+        :param name: name of the throttled routine, used in reports
+        :return: throttle state of a single routine execution
+        """
+        return ThrottleRun(self, name)
+
+
+class ThrottleRun:
+    """Throttle decisions and throughput of a single routine execution."""
+
+    def __init__(self, throttle: Throttle, name: str) -> None:
+        self.throttle = throttle
+        self.name = name
+        self.rows = 0
+        self.chunks = 0
+        #: pauses per reason, ``rate``, ``sleep`` or ``probe``
+        self.decisions: Dict[str, List[float]] = {}
+        self.started_at = throttle.clock()
+        self.finished_at: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished_at
+        if end is None:
+            end = self.throttle.clock()
+        return end - self.started_at
+
+    @property
+    def throttled(self) -> float:
+        """:return: total seconds paused"""
+        return sum(sum(pauses) for pauses in self.decisions.values())
+
+    @property
+    def throughput(self) -> float:
+        """:return: achieved rows per second, including pauses"""
+        elapsed = self.elapsed
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+    def chunk_done(self, rows: int) -> None:
+        """
+        Pause as required after a committed chunk.
+
+        :param rows: number of rows of the chunk
+        """
+        throttle = self.throttle
+        self.rows += rows
+        self.chunks += 1
+
+        wait = 0.0
+        reason = 'sleep'
+        if throttle.rows_per_second:
+            rate_wait = (self.rows / throttle.rows_per_second
+                         - self.elapsed)
+            if rate_wait > throttle.sleep:
+                wait, reason = rate_wait, 'rate'
+        if throttle.sleep > wait:
+            wait = throttle.sleep
+        if wait > 0:
+            self._pause(reason, wait)
+
+        if throttle.probe is None:
+            return
+        waited = 0.0
+        wait = throttle.probe()
+        while wait:
+            if waited >= throttle.max_probe_wait:
+                log.warning('%s: back-pressure persists after %.1fs, '
+                            'continuing', self.name, waited)
+                return
+            wait = min(wait, throttle.max_probe_wait - waited)
+            self._pause('probe', wait)
+            waited += wait
+            wait = throttle.probe()
+
+    def _pause(self, reason: str, seconds: float) -> None:
+        log.debug('%s: pausing %.3fs (%s) after %d rows',
+                  self.name, seconds, reason, self.rows)
+        self.decisions.setdefault(reason, []).append(seconds)
+        record_pause(reason, seconds)
+        self.throttle.pause(seconds)
+
+    def finish(self) -> None:
+        """Report throughput and throttle decisions."""
+        self.finished_at = self.throttle.clock()
+        log.info('%s: %s', self.name, self.report())
+
+    def report(self) -> str:
+        """:return: human readable summary"""
+        summary = (
+            f'{self.rows} rows in {self.chunks} chunks, {self.elapsed:.2f}s '
+            f'({self.throughput:.1f} rows/s)'
+        )
+        if not self.decisions:
+            return summary
+        decisions = ', '.join(
+            f'{reason} {len(pauses)}x {sum(pauses):.2f}s'
+            for reason, pauses in sorted(self.decisions.items())
+        )
+        return f'{summary}, throttled {self.throttled:.2f}s ({decisions})'
@@ -3,7 +3,11 @@ from typing import Dict, Optional
 from django.core.signals import setting_changed
 
 DATA_MIGRATION_DEFAULTS = {
-    "SQUASHABLE_APPS": []
+    "SQUASHABLE_APPS": [],
+    "MANIFEST_CACHE": True,
+    "THROTTLE": None,
+    "TRACE_MEMORY": False,
+    "METRICS_SINK": None,
 }
 
 
@@ -21,6 +21,11 @@ setup(
     install_requires=[
         'django >= 2.2'
     ],
+    extras_require={
+        'numpy': ['numpy'],
+        # shipped with django >= 3.0
+        'async': ['asgiref'],
+    },
     long_description=read('README.rst'),
     long_description_content_type='text/x-rst',
     classifiers=[
@@ -0,0 +1,44 @@
+from io import StringIO
+
+from django.core.management import call_command, CommandError
+
+from data_migration.services.metrics import NodeMetrics
+from data_migration.services.node import Node, NodeStats
+from tests.utils import TransactionalTestCase
+
+
+class DataMigrationStatsCommandTestCase(TransactionalTestCase):
+    def setUp(self) -> None:
+        NodeStats.flush()
+        for name, wall_time, queries in (('0001_a', 1.0, 300),
+                                         ('0002_b', 3.0, 10),
+                                         ('0003_c', 2.0, 20)):
+            NodeStats.save(Node(name, 'test_app'),
+                           NodeMetrics(wall_time, 0.5, queries, 100))
+
+    def tearDown(self) -> None:
+        NodeStats.flush()
+
+    def call(self, *args, **kwargs) -> str:
+        out = StringIO()
+        call_command('data_migration_stats', *args, stdout=out, **kwargs)
+        return out.getvalue()
+
+    def test_slowest_first(self):
+        lines = self.call(limit=2).splitlines()
+
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].endswith('test_app.0002_b'))
+        self.assertTrue(lines[2].endswith('test_app.0003_c'))
+
+    def test_order_by(self):
+        lines = self.call(order_by='queries').splitlines()
+
+        self.assertTrue(lines[1].endswith('test_app.0001_a'))
+
+    def test_app_label(self):
+        self.assertEqual(self.call('test_app_2'), 'No metrics recorded.\n')
+
+    def test_invalid_limit(self):
+        with self.assertRaises(CommandError):
+            self.call(limit=0)
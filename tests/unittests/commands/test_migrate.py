@@ -1,9 +1,19 @@
 import os.path
+import tempfile
 import time
+from io import StringIO
 from unittest import mock
 
+from data_migration.management.commands.migrate import \
+    Command as MigrateCommand
+from data_migration.services.graph import Graph, GraphNode
+from data_migration.services.metrics import record_pause
 from data_migration.services.node import Node
+from data_migration.services.plan import DataMigrationPlan
 from django.core.management import call_command, CommandError
+from django.db import connections
+from django.db.migrations.executor import MigrationExecutor
+from django.db.migrations.recorder import MigrationRecorder
 from tests.unittests.test_app.helper import ResetDirectoryContext
 from tests.utils import TransactionalTestCase
 
@@ -19,6 +29,24 @@ def set_some_value(apps, schema_editor) -> None:
     some_other_value += new_value
 
 
+def pause(apps, schema_editor) -> None:
+    record_pause('rate', 0.25)
+    record_pause('rate', 0.25)
+
+
+snapshots = []
+
+
+def take_snapshot(apps, schema_editor) -> None:
+    recorder = MigrationRecorder(connections['default'])
+    customer = apps.get_model('test_app_2', 'Customer')
+    snapshots.append((
+        {name for app, name in recorder.applied_migrations()
+         if app == 'test_app_2'},
+        {field.name for field in customer._meta.get_fields()},
+    ))
+
+
 class MigrateCommandTestCase(TransactionalTestCase):
     def tearDown(self) -> None:
         self.reset_global_state()
@@ -40,15 +68,50 @@ class MigrateCommandTestCase(TransactionalTestCase):
         migrate_command.return_value = 'Ok.'
         call_command('migrate')
         migrate_command.assert_called_once()
-        self.assertEqual(some_other_value, old_value)
+        # data migrations of all apps are applied
+        self.assertEqual(some_other_value, new_value)
+        self.assertTrue(
+            Node.get_qs().filter(app_name='test_app').exists())
 
     @mock.patch('django.core.management.commands.migrate.Command.handle')
     def test_only_data(self, migrate_command):
         migrate_command.return_value = 'Ok.'
         call_command('migrate', data_migration=True)
         migrate_command.assert_not_called()
+        self.assertEqual(some_other_value, new_value)
+
+    def test_reports_throttling(self):
+        graph = Graph('app_a')
+        graph.push_back(GraphNode('app_a', '0001_a', [], [], [pause]))
+        out = StringIO()
+
+        with mock.patch(
+                'data_migration.management.commands.migrate'
+                '.DataMigrationPlan.from_apps',
+                side_effect=lambda app_labels, using, **kwargs:
+                DataMigrationPlan([graph], **kwargs)):
+            call_command('migrate', data_migration=True, stdout=out)
+
+        self.assertIn('Applying data migration app_a.0001_a... OK\n'
+                      '    app_a.0001_a: throttled 0.50s (rate 2x)',
+                      out.getvalue())
+
+    @mock.patch('django.core.management.commands.migrate.Command.handle')
+    def test_plan_skips_data_migrations(self, migrate_command):
+        migrate_command.return_value = 'Ok.'
+        call_command('migrate', plan=True)
+        migrate_command.assert_called_once()
         self.assertEqual(some_other_value, old_value)
 
+    @mock.patch('django.core.management.commands.migrate.Command.handle')
+    def test_fake_skips_data_migrations(self, migrate_command):
+        migrate_command.return_value = 'Ok.'
+        for option in ('fake', 'fake_initial'):
+            call_command('migrate', **{option: True})
+        self.assertEqual(migrate_command.call_count, 2)
+        self.assertEqual(some_other_value, old_value)
+        self.assertFalse(Node.get_qs().exists())
+
     @mock.patch('data_migration.services.graph.GraphNode.set_applied')
     @mock.patch('django.db.migrations.loader.MigrationLoader.'
                 'migrations_module',
@@ -77,6 +140,25 @@ class MigrateCommandTestCase(TransactionalTestCase):
         with self.assertRaises(CommandError):
             call_command('migrate', app_label='foobar123123')
 
+    def test_profile(self):
+        out = StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('migrate', data_migration=True, profile=directory,
+                         profile_sql=True, stdout=out)
+
+            self.assertTrue(os.path.exists(
+                os.path.join(directory, 'test_app.0001_first.prof')))
+        self.assertEqual(some_other_value, new_value)
+        self.assertIn('Profile of test_app.0001_first', out.getvalue())
+        self.assertIn('Slowest SQL of test_app.0001_first', out.getvalue())
+
+    def test_profile_requires_single_thread(self):
+        with self.assertRaises(CommandError):
+            call_command('migrate', profile='profiles')
+        with self.assertRaises(CommandError):
+            call_command('migrate', data_migration=True, parallel=2,
+                         profile='profiles')
+
 
 class ExtendedMigrateCommandTestCase(TransactionalTestCase):
     def tearDown(self) -> None:
@@ -117,3 +199,123 @@ class ExtendedMigrateCommandTestCase(TransactionalTestCase):
             call_command('migrate', app_label='test_app')
 
             self.assertEqual(self.get_val(), new_value)
+
+
+class InterleavedMigrateCommandTestCase(TransactionalTestCase):
+    def setUp(self) -> None:
+        snapshots.clear()
+        call_command('django_migrate', 'test_app_2', '0004', verbosity=0)
+
+    def tearDown(self) -> None:
+        call_command('django_migrate', 'test_app_2', verbosity=0)
+        Node.flush()
+
+    def test_runs_data_migrations_after_dependencies(self):
+        graph = Graph('test_app_2')
+        graph.push_back(GraphNode(
+            'test_app_2', '0001_a', [],
+            ['test_app_2.0005_customer_address'], [take_snapshot]))
+        graph.push_back(GraphNode(
+            'test_app_2', '0002_b', ['0001_a'],
+            ['test_app_2.0007_remove_customer_address'], [take_snapshot]))
+
+        with mock.patch(
+                'data_migration.management.commands.migrate'
+                '.DataMigrationPlan.from_apps',
+                side_effect=lambda using, **kwargs: DataMigrationPlan(
+                    [graph], **kwargs)):
+            call_command('migrate', verbosity=0)
+
+        (first_applied, first_fields), (second_applied, second_fields) = \
+            snapshots
+        self.assertIn('0005_customer_address', first_applied)
+        self.assertNotIn('0006_address_line_split', first_applied)
+        self.assertIn('address', first_fields)
+        self.assertIn('0007_remove_customer_address', second_applied)
+        self.assertNotIn('0008_customer_is_business', second_applied)
+        self.assertNotIn('address', second_fields)
+        self.assertEqual(
+            Node.get_qs().filter(app_name='test_app_2').count(), 2)
+
+    def test_loads_migrations_twice(self):
+        graphs = [Graph(f'app_{name}') for name in 'ab']
+        for graph in graphs:
+            graph.push_back(GraphNode(
+                graph.app_name, '0001_a', [],
+                ['test_app_2.0005_customer_address'], [take_snapshot]))
+
+        with mock.patch(
+                'data_migration.management.commands.migrate'
+                '.DataMigrationPlan.from_apps',
+                side_effect=lambda using, **kwargs: DataMigrationPlan(
+                    graphs, **kwargs)), \
+                mock.patch.object(
+                    MigrationExecutor, '__init__', autospec=True,
+                    side_effect=MigrationExecutor.__init__) as init_mock:
+            call_command('migrate', verbosity=0)
+
+        # django's migrate and the data migration plan, regardless of the
+        # number of apps
+        self.assertEqual(init_mock.call_count, 2)
+        self.assertEqual(len(snapshots), 2)
+
+    def test_ignores_faked_migrations(self):
+        plan = mock.Mock()
+        command = MigrateCommand()
+        command.verbosity = 0
+        command.data_migration_plan = plan
+        migration = mock.Mock(app_label='test_app_2')
+
+        command.migration_progress_callback(
+            'apply_success', migration, fake=True)
+        plan.migration_applied.assert_not_called()
+        command.migration_progress_callback('apply_success', migration)
+        plan.migration_applied.assert_called_once_with(migration)
+
+
+class MultiDatabaseMigrateCommandTestCase(TransactionalTestCase):
+    databases = {'default', 'other'}
+
+    def tearDown(self) -> None:
+        MigrateCommandTestCase.reset_global_state()
+        Node.flush()
+        Node.flush('other')
+
+    def test_database(self):
+        call_command('migrate', data_migration=True, database='other',
+                     verbosity=0)
+
+        self.assertEqual(some_other_value, new_value)
+        self.assertTrue(
+            Node.get_qs('other').filter(app_name='test_app').exists())
+        self.assertFalse(
+            Node.get_qs().filter(app_name='test_app').exists())
+
+    def test_all_databases(self):
+        out = StringIO()
+        call_command('migrate', data_migration=True, all_databases=True,
+                     database_workers=2, stdout=out)
+
+        self.assertEqual(some_other_value, 2 * new_value)
+        for database in ('default', 'other'):
+            self.assertTrue(Node.get_qs(database).filter(
+                app_name='test_app', name='0001_first').exists())
+            self.assertIn(f'{database}:test_app.0001_first', out.getvalue())
+
+    def test_all_databases_reports_failures(self):
+        def migrate_data(database, *args, **kwargs):
+            if database == 'other':
+                raise ValueError('failing database')
+
+        with mock.patch(
+                'data_migration.management.commands.migrate.Command'
+                '.migrate_data', side_effect=migrate_data):
+            with self.assertRaisesMessage(CommandError, 'other.'):
+                call_command('migrate', data_migration=True,
+                             all_databases=True, stderr=StringIO())
+
+    def test_all_databases_requires_data_only(self):
+        with self.assertRaises(CommandError):
+            call_command('migrate', all_databases=True)
+        with self.assertRaises(CommandError):
+            call_command('migrate', data_migration=True, database_workers=2)
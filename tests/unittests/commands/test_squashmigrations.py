@@ -57,6 +57,13 @@ class SquashmigrationsCommandTestCase(FileTestCase):
             self.assertTrue(self.has_file('0001_0002_split_name.py'))
             self.assertTrue(self.has_file('0002_0006_address_line_split.py'))
 
+            content = self.get_file('0001_0002_split_name.py')
+            self.assertIn('routines = [\n\t\tmig_0002_split_name.split_name,',
+                          content)
+            self.assertIn('reverse_routines = [\n'
+                          '\t\tmig_0002_split_name.combine_name,', content)
+            self.assertEqual(content.count('spec_from_file_location'), 1)
+
     def test_dry_run_doesnt_create_files(self):
         with ResetDirectory2Context():
             call_command(
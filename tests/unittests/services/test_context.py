@@ -0,0 +1,132 @@
+from unittest import mock
+
+from django.db.migrations.executor import MigrationExecutor
+
+from data_migration.services.context import (ExecutionContext,
+                                             parse_migration_dependency)
+from data_migration.services.graph import Graph, GraphNode
+from data_migration.services.node import Node
+from tests.utils import TransactionalTestCase
+
+seen_apps = []
+
+
+def collect_apps(apps, schema_editor) -> None:
+    apps.get_model('test_app', 'MModel')
+    seen_apps.append(apps)
+
+
+def ignore_apps(apps, schema_editor) -> None:
+    seen_apps.append(None)
+
+
+class ExecutionContextTestCase(TransactionalTestCase):
+    def setUp(self) -> None:
+        Node.flush()
+        seen_apps.clear()
+
+    def test_parse_migration_dependency(self):
+        self.assertEqual(
+            parse_migration_dependency('tests.test_app.0001_first'),
+            ('test_app', '0001_first')
+        )
+
+    def test_builds_state_once_per_run(self):
+        g = Graph('test')
+        g.push_back(GraphNode('test', '0001_a', [], [], [collect_apps]))
+        g.push_back(GraphNode('test', '0002_b', ['0001_a'],
+                              ['test_app.0001_first'], [collect_apps]))
+        g.push_back(GraphNode('test', '0003_c', ['0002_b'],
+                              ['test_app.0001_first'], [collect_apps]))
+
+        with mock.patch.object(
+                MigrationExecutor, '_create_project_state', autospec=True,
+                side_effect=MigrationExecutor._create_project_state
+        ) as state_mock:
+            g.apply()
+
+        state_mock.assert_called_once()
+        self.assertEqual(len(seen_apps), 3)
+        self.assertTrue(all(apps is seen_apps[0] for apps in seen_apps))
+
+    def test_routines_not_touching_apps_render_nothing(self):
+        g = Graph('test')
+        g.push_back(GraphNode('test', '0001_a', [], [], [ignore_apps]))
+        context = ExecutionContext()
+
+        with mock.patch.object(MigrationExecutor,
+                               '_create_project_state') as state_mock:
+            g.apply(context=context)
+
+        state_mock.assert_not_called()
+        self.assertEqual(seen_apps, [None])
+        self.assertTrue(g.get_node('0001_a').node.is_applied)
+
+    def test_nodes_without_routines_render_nothing(self):
+        g = Graph('test')
+        g.push_back(GraphNode('test', '0001_a', [], [], []))
+
+        with mock.patch.object(MigrationExecutor,
+                               '_create_project_state') as state_mock:
+            g.apply()
+
+        state_mock.assert_not_called()
+
+    def test_pending_records(self):
+        context = ExecutionContext()
+        node = Node('test', '0001_a')
+        context.record(node)
+
+        self.assertTrue(context.is_pending(node))
+        # pending by identity, like the nodes of a graph
+        self.assertFalse(context.is_pending(Node('test', '0001_a')))
+
+        context.flush_records()
+        self.assertFalse(context.is_pending(node))
+        self.assertTrue(node.is_applied)
+
+    def test_mark_applied(self):
+        context = ExecutionContext()
+        key = ('test_app', '0001_first')
+        migration = context.executor.loader.graph.nodes[key]
+        applied = context.applied_migrations
+        if isinstance(applied, dict):
+            applied.pop(key, None)
+        else:
+            applied.discard(key)
+
+        with mock.patch.object(context.recorder,
+                               'applied_migrations') as recorded:
+            context.mark_applied(migration)
+
+        recorded.assert_not_called()
+        self.assertIn(key, context.applied_migrations)
+
+    def test_migrate_advances_state(self):
+        context = ExecutionContext()
+        state = context.state
+        advanced_state = state.clone()
+        targets = [('test_app', '0001_first')]
+
+        with mock.patch.object(context.executor, 'migration_plan',
+                               return_value=[mock.Mock()]), \
+                mock.patch.object(context.executor, 'migrate',
+                                  return_value=advanced_state) as migrate:
+            context.migrate(targets)
+
+        migrate.assert_called_once_with(
+            targets, plan=mock.ANY, state=state)
+        self.assertIs(context.state, advanced_state)
+
+    def test_failed_migrate_resets_state(self):
+        context = ExecutionContext()
+        state = context.state
+
+        with mock.patch.object(context.executor, 'migration_plan',
+                               return_value=[mock.Mock()]), \
+                mock.patch.object(context.executor, 'migrate',
+                                  side_effect=ValueError()):
+            with self.assertRaises(ValueError):
+                context.migrate([('test_app', '0001_first')])
+
+        self.assertIsNot(context.state, state)
@@ -4,7 +4,9 @@ from unittest import mock
 from django.db import connections
 from django.db.migrations.recorder import MigrationRecorder
 
-from data_migration.services.file_generator import DataMigrationGenerator
+from data_migration.services.file_generator import (DataMigrationGenerator,
+                                                    Routine)
+from data_migration.services.node import Node
 
 from tests.utils import FileTestCase
 
@@ -109,6 +111,51 @@ class DataMigrationGeneratorTestCase(FileTestCase):
         )
         self.assertTrue(hasattr(node, 'dependencies'))
 
+    @with_test_output_directory
+    def test_with_reverse_routines(self):
+        file_path = os.path.join(
+            this_dir, '../test_app_2/migrations/0002_split_name.py')
+
+        def routine(method):
+            return Routine(method=method,
+                           module='test_app_2.migrations.0002_split_name',
+                           module_name='mig_0002_split_name',
+                           file_path=file_path)
+
+        DataMigrationGenerator('test', 'split', routines=[
+            routine('split_name')], reverse_routines=[routine('combine_name')])
+        node = self.get_data_migration_node(
+            'tests.unittests.services.out.data_migrations.0001_split'
+        )
+
+        self.assertEqual(
+            [fun.__name__ for fun in node.routines], ['split_name'])
+        self.assertEqual(
+            [fun.__name__ for fun in node.reverse_routines], ['combine_name'])
+
+    @with_test_output_directory
+    def test_without_reverse_routines(self):
+        DataMigrationGenerator('test')
+
+        self.assertNotIn('reverse_routines', self.get_file('0001_first.py'))
+
+    @with_test_output_directory
+    def test_set_applied(self):
+        recorder = MigrationRecorder(connections['default'])
+        recorder.record_applied('test', '0001_init')
+        generator = DataMigrationGenerator(
+            'test', migration_dependencies=['test.0001_init'])
+
+        with mock.patch('importlib.import_module') as import_mock:
+            generator.set_applied()
+
+        import_mock.assert_not_called()
+        self.assertTrue(
+            Node.get_qs().filter(app_name='test', name='0001_first').exists()
+        )
+        Node.flush()
+        recorder.record_unapplied('test', '0001_init')
+
     @mock.patch('django.apps.apps.get_app_config')
     @mock.patch('importlib.import_module')
     def test_set_applied_fails_gracefully(self, import_mock, app_config_mock):
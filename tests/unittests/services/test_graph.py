@@ -1,9 +1,14 @@
 import os
 from unittest import mock
 
+from django.apps import apps
+from django.db import connections
 from django.db.migrations.exceptions import NodeNotFoundError
+from django.db.migrations.recorder import MigrationRecorder
+from django.test.utils import CaptureQueriesContext, override_settings
 
-from data_migration.services.node import Node
+from data_migration.routines import chunked
+from data_migration.services.node import Checkpoint, Node, NodeStats
 from data_migration.services.graph import Graph, GraphNode
 from tests.utils import TransactionalTestCase
 
@@ -19,6 +24,10 @@ def set_some_value(apps, schema_editor) -> None:
     some_value += new_value
 
 
+def failing_routine(apps, schema_editor) -> None:
+    raise ValueError('failing routine')
+
+
 class GraphTestCase(TransactionalTestCase):
     def setUp(self):
         self.reset_global_state()
@@ -121,6 +130,207 @@ class GraphTestCase(TransactionalTestCase):
 
         self.assertEqual(new_graph_node.node.pk, node_id)
 
+    def test_load_state(self):
+        Node(app_name='test', name='0002_auto').apply()
+        g = Graph('test')
+        for name in ['0001_init', '0002_auto']:
+            g.push_back(GraphNode('test', name, [], [], [],
+                                  node=Node(app_name='test', name=name)))
+        self.assertFalse(any(n.node.is_applied for n in g.get_nodes()))
+
+        g.load_state()
+
+        first, second = g.get_nodes()
+        self.assertFalse(first.node.is_applied)
+        self.assertTrue(second.node.is_applied)
+
+    def test_load_state_query_count_is_constant(self):
+        def count_queries(graph_size):
+            Node.flush()
+            g = Graph('test')
+            for index in range(graph_size):
+                name = f'{index:04d}_auto'
+                if index % 2:
+                    Node(app_name='test', name=name).apply()
+                g.push_back(GraphNode('test', name, [], [], [],
+                                      node=Node(app_name='test', name=name)))
+            with CaptureQueriesContext(connections['default']) as ctx:
+                g.load_state()
+            self.assertEqual(
+                sum(n.node.is_applied for n in g.get_nodes()),
+                graph_size // 2
+            )
+            return len(ctx.captured_queries)
+
+        self.assertEqual(count_queries(10), count_queries(200))
+
+    @mock.patch('data_migration.services.graph.GraphNode.set_applied')
+    def test_partial_revert_includes_target(self, set_applied_mock):
+        g = Graph('test')
+        for name, dependencies in [('0001_init', []),
+                                   ('0002_auto', ['0001_init']),
+                                   ('0003_auto', ['0002_auto'])]:
+            g.push_back(GraphNode('test', name, dependencies, [], []))
+        g.apply()
+
+        g.apply('0002_auto')
+
+        self.assertEqual(
+            [n.node.name for n in g.get_nodes() if n.node.is_applied],
+            ['0001_init']
+        )
+        # the latest applied node is kept
+        g.apply('0001_init')
+        self.assertTrue(g.get_node('0001_init').node.is_applied)
+
+    def test_order_honours_dependencies(self):
+        g = Graph('test')
+        g.push_back(GraphNode('test', '0003_c', ['0002_b'], [], []))
+        g.push_back(GraphNode('test', '0002_b', ['test.0001_a'], [], []))
+        g.push_back(GraphNode('test', '0001_a', [], [], []))
+        g.push_back(GraphNode('test', '0004_d', [], [], []))
+
+        self.assertEqual(
+            [n.node.name for n in g.get_nodes()],
+            ['0001_a', '0002_b', '0003_c', '0004_d']
+        )
+        self.assertEqual(
+            [n.node.name for n in g.forward_plan(g.get_node('0002_b'))],
+            ['0001_a', '0002_b']
+        )
+
+    def test_circular_dependency(self):
+        g = Graph('test')
+        g.push_back(GraphNode('test', '0001_a', ['0002_b'], [], []))
+        g.push_back(GraphNode('test', '0002_b', ['0001_a'], [], []))
+
+        with self.assertRaises(Graph.CircularDependencyError):
+            g.get_nodes()
+
+    def test_unknown_dependency(self):
+        g = Graph('test')
+        g.push_back(GraphNode('test', '0002_b', ['0001_a'], [], []))
+
+        with self.assertRaises(Graph.MigrationNotFoundError):
+            g.get_nodes()
+
+    def test_large_graph(self):
+        g = Graph('test')
+        previous = []
+        for index in range(10000):
+            name = f'{index:05d}_auto'
+            g.push_back(GraphNode('test', name, previous, [], [],
+                                  node=Node(app_name='test', name=name)))
+            previous = [name]
+
+        nodes = g.get_nodes()
+
+        self.assertEqual(len(nodes), 10000)
+        self.assertEqual(nodes[-1].node.name, '09999_auto')
+        self.assertEqual(len(g.forward_plan(g.get_node('09999_auto'))), 10000)
+
+    def test_set_applied(self):
+        recorder = MigrationRecorder(connections['default'])
+        recorder.record_applied('test', '0001_initial')
+        Node(app_name='test', name='0001_a').apply()
+
+        g = Graph('test')
+        for name, migration_dependencies in [
+                ('0001_a', []),
+                ('0002_b', ['tests.test.0001_initial']),
+                ('0003_c', ['test.0002_missing'])]:
+            g.push_back(GraphNode('test', name, [], migration_dependencies,
+                                  [], node=Node(app_name='test', name=name)))
+        g.load_state()
+
+        recorded = g.set_applied()
+
+        self.assertEqual([n.node.name for n in recorded], ['0002_b'])
+        self.assertTrue(g.get_node('0002_b').node.is_applied)
+        self.assertFalse(g.get_node('0003_c').node.is_applied)
+        self.assertEqual(
+            set(Node.get_qs().values_list('name', flat=True)),
+            {'0001_a', '0002_b'}
+        )
+
+    def test_set_applied_query_count_is_constant(self):
+        def count_queries(graph_size):
+            Node.flush()
+            Node.get_qs()
+            g = Graph('test')
+            for index in range(graph_size):
+                name = f'{index:04d}_auto'
+                g.push_back(GraphNode('test', name, [], [], [],
+                                      node=Node(app_name='test', name=name)))
+            with CaptureQueriesContext(connections['default']) as ctx:
+                g.set_applied()
+            self.assertEqual(Node.get_qs().count(), graph_size)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(count_queries(10), count_queries(200))
+
+    @staticmethod
+    def build_chain(graph_size, routines=None):
+        g = Graph('test')
+        previous = []
+        for index in range(graph_size):
+            name = f'{index:04d}_auto'
+            g.push_back(GraphNode('test', name, previous, [],
+                                  list(routines or []),
+                                  node=Node(app_name='test', name=name)))
+            previous = [name]
+        return g
+
+    def test_forward_graph_query_count_is_constant(self):
+        def count_queries(graph_size):
+            Node.flush()
+            Node.get_qs()
+            g = self.build_chain(graph_size)
+            with CaptureQueriesContext(connections['default']) as ctx:
+                g.apply()
+            self.assertEqual(Node.get_qs().count(), graph_size)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(count_queries(10), count_queries(200))
+
+    def test_revert_graph_query_count_is_constant(self):
+        def count_queries(graph_size):
+            Node.flush()
+            g = self.build_chain(graph_size)
+            g.apply()
+            with CaptureQueriesContext(connections['default']) as ctx:
+                g.apply('zero')
+            self.assertEqual(Node.get_qs().count(), 0)
+            self.assertFalse(any(n.node.is_applied for n in g.get_nodes()))
+            return len(ctx.captured_queries)
+
+        self.assertEqual(count_queries(10), count_queries(400))
+
+    def test_record_shares_transaction_with_routines(self):
+        g = self.build_chain(2)
+        g.push_back(GraphNode('test', '0002_fail', ['0001_auto'], [],
+                              [failing_routine]))
+
+        with self.assertRaises(ValueError):
+            g.apply()
+
+        self.assertEqual(
+            list(Node.get_qs().order_by('name').values_list(
+                'name', flat=True)),
+            ['0000_auto', '0001_auto']
+        )
+        self.assertFalse(g.get_node('0002_fail').node.is_applied)
+
+    def test_stores_metrics(self):
+        NodeStats.flush()
+        node = GraphNode('test', '0001_node', [], [], [set_some_value])
+        node.apply()
+
+        stats = NodeStats.get_qs().get(app_name='test', name='0001_node')
+        self.assertEqual(stats.wall_time, node.metrics.wall_time)
+        self.assertEqual(stats.queries, 0)
+        NodeStats.flush()
+
     def test_fail_silently(self):
         g = Graph('test')
         with self.assertRaises(Graph.EmptyGraphError):
@@ -137,3 +347,271 @@ class GraphNodeTestCase(TransactionalTestCase):
 
         node.apply()
         node.revert()
+
+
+def create_customer(apps, schema_editor) -> None:
+    apps.get_model('test_app_2', 'Customer').objects.create(first_name='a')
+
+
+def create_customer_and_fail(apps, schema_editor) -> None:
+    create_customer(apps, schema_editor)
+    raise ValueError('failing routine')
+
+
+def update_chunk_and_fail(chunk, apps, schema_editor) -> None:
+    chunk.update(last_name='b')
+    if chunk.filter(first_name='c').exists():
+        raise ValueError('failing chunk')
+
+
+class TransactionStrategyTestCase(TransactionalTestCase):
+    def setUp(self) -> None:
+        Node.flush()
+        Checkpoint.flush()
+        self.model = apps.get_model('test_app_2', 'Customer')
+        self.model.objects.all().delete()
+
+    def tearDown(self) -> None:
+        self.model.objects.all().delete()
+
+    def apply(self, atomic, *routines) -> GraphNode:
+        node = GraphNode('test', '0001_node', [], [], list(routines),
+                         atomic=atomic)
+        with self.assertRaises(ValueError):
+            node.apply()
+        self.assertFalse(node.node.is_applied)
+        return node
+
+    def test_defaults(self):
+        self.assertIs(
+            GraphNode('test', '0001_node', [], [], [create_customer]).atomic,
+            True
+        )
+        self.assertEqual(
+            GraphNode('test', '0001_node', [], [], [
+                create_customer,
+                chunked('test_app_2.Customer', update_chunk_and_fail)
+            ]).atomic,
+            'per_chunk'
+        )
+
+    def test_from_struct(self):
+        class Struct:
+            name = '0001_node'
+            dependencies = migration_dependencies = routines = []
+            atomic = 'per_routine'
+
+        self.assertEqual(
+            GraphNode.from_struct('test', Struct).atomic, 'per_routine')
+
+    def test_atomic(self):
+        self.apply(True, create_customer, create_customer_and_fail)
+
+        self.assertFalse(self.model.objects.exists())
+
+    def test_per_routine(self):
+        self.apply('per_routine', create_customer, create_customer_and_fail)
+
+        self.assertEqual(self.model.objects.count(), 1)
+
+    def test_per_routine_rolls_back_chunks(self):
+        self.model.objects.bulk_create(
+            [self.model(first_name='a')] * 3 + [self.model(first_name='c')])
+
+        self.apply('per_routine', chunked(
+            'test_app_2.Customer', update_chunk_and_fail, chunk_size=2))
+
+        self.assertFalse(self.model.objects.filter(last_name='b').exists())
+
+    def test_per_chunk(self):
+        self.model.objects.bulk_create(
+            [self.model(first_name='a')] * 3 + [self.model(first_name='c')])
+
+        self.apply('per_chunk', chunked(
+            'test_app_2.Customer', update_chunk_and_fail, chunk_size=2))
+
+        self.assertEqual(
+            self.model.objects.filter(last_name='b').count(), 2)
+
+    def test_non_atomic(self):
+        self.apply(False, create_customer_and_fail)
+
+        self.assertEqual(self.model.objects.count(), 1)
+
+    def test_invalid_strategy(self):
+        with self.assertRaises(ValueError):
+            GraphNode('test', '0001_node', [], [], [create_customer],
+                      atomic='per_row').apply()
+
+        self.assertFalse(self.model.objects.exists())
+
+
+def delete_customers(apps, schema_editor) -> None:
+    apps.get_model('test_app_2', 'Customer').objects.all().delete()
+
+
+def delete_customers_and_fail(apps, schema_editor) -> None:
+    delete_customers(apps, schema_editor)
+    raise ValueError('failing reverse routine')
+
+
+def reset_chunk(chunk, apps, schema_editor) -> None:
+    chunk.update(last_name=None)
+
+
+def reset_chunk_and_fail(chunk, apps, schema_editor) -> None:
+    reset_chunk(chunk, apps, schema_editor)
+    if chunk.filter(first_name='c').exists():
+        raise ValueError('failing chunk')
+
+
+class ReverseRoutinesTestCase(TransactionalTestCase):
+    def setUp(self) -> None:
+        Node.flush()
+        Checkpoint.flush()
+        self.model = apps.get_model('test_app_2', 'Customer')
+        self.model.objects.all().delete()
+        self.reverted = []
+
+    def tearDown(self) -> None:
+        self.model.objects.all().delete()
+        Node.flush()
+        Checkpoint.flush()
+
+    def reverse(self, name):
+        def routine(apps, schema_editor):
+            self.reverted.append(name)
+        return routine
+
+    def test_revert_runs_reverse_routines(self):
+        g = Graph('test')
+        g.push_back(GraphNode('test', '0001_a', [], [], [create_customer],
+                              reverse_routines=[delete_customers]))
+        g.apply()
+        self.assertEqual(self.model.objects.count(), 1)
+
+        g.apply('zero')
+
+        self.assertFalse(self.model.objects.exists())
+        self.assertFalse(g.get_node('0001_a').node.is_applied)
+        self.assertFalse(Node.get_qs().exists())
+
+    def test_revert_order(self):
+        g = Graph('test')
+        g.push_back(GraphNode('test', '0001_a', [], [], [],
+                              reverse_routines=[self.reverse('0001_a')]))
+        g.push_back(GraphNode('test', '0002_b', ['0001_a'], [], []))
+        g.push_back(GraphNode('test', '0003_c', ['0002_b'], [], [],
+                              reverse_routines=[self.reverse('0003_c')]))
+        g.push_back(GraphNode('test', '0004_d', ['0003_c'], [], []))
+        g.apply()
+
+        g.apply('0003_c')
+        self.assertEqual(self.reverted, ['0003_c'])
+        self.assertEqual(
+            sorted(Node.get_qs().values_list('name', flat=True)),
+            ['0001_a', '0002_b'])
+
+        g.apply('zero')
+        self.assertEqual(self.reverted, ['0003_c', '0001_a'])
+        self.assertFalse(Node.get_qs().exists())
+
+    def test_failed_revert_keeps_node(self):
+        node = GraphNode('test', '0001_a', [], [], [create_customer],
+                         reverse_routines=[delete_customers_and_fail])
+        node.apply()
+
+        with self.assertRaises(ValueError):
+            node.revert()
+
+        self.assertEqual(self.model.objects.count(), 1)
+        self.assertTrue(node.node.is_applied)
+        self.assertTrue(Node.get_qs().filter(name='0001_a').exists())
+
+    def test_chunked_revert_resumes(self):
+        self.model.objects.bulk_create(
+            [self.model(first_name='a', last_name='b')] * 3
+            + [self.model(first_name='c', last_name='b')])
+        node = GraphNode('test', '0001_a', [], [], [], reverse_routines=[
+            chunked('test_app_2.Customer', reset_chunk_and_fail,
+                    chunk_size=2)])
+        node.apply()
+        self.assertEqual(node.reverse_atomic, 'per_chunk')
+
+        with self.assertRaises(ValueError):
+            node.revert()
+        self.assertEqual(
+            self.model.objects.filter(last_name__isnull=True).count(), 2)
+        self.assertTrue(node.node.is_applied)
+
+        calls = []
+
+        def reset_remaining(chunk, apps, schema_editor):
+            calls.append(chunk.count())
+            reset_chunk(chunk, apps, schema_editor)
+
+        node.reverse_routines = [
+            chunked('test_app_2.Customer', reset_remaining, chunk_size=2)]
+        node.revert()
+
+        self.assertEqual(calls, [2])
+        self.assertFalse(
+            self.model.objects.filter(last_name__isnull=False).exists())
+        self.assertFalse(node.node.is_applied)
+        self.assertFalse(Checkpoint.get_qs().exists())
+
+    def test_from_struct(self):
+        class Struct:
+            name = '0001_node'
+            dependencies = migration_dependencies = routines = []
+            reverse_routines = [delete_customers]
+
+        self.assertEqual(GraphNode.from_struct('test', Struct)
+                         .reverse_routines, [delete_customers])
+
+
+class OtherDatabaseRouter:
+    def allow_migrate(self, db, app_label, **hints):
+        return db != 'other'
+
+
+class MultiDatabaseTestCase(TransactionalTestCase):
+    databases = {'default', 'other'}
+
+    def setUp(self) -> None:
+        self.calls = []
+
+    def tearDown(self) -> None:
+        Node.flush()
+        Node.flush('other')
+
+    def routine(self, apps, schema_editor):
+        self.calls.append(schema_editor.connection.alias)
+
+    def graph(self, using) -> Graph:
+        graph = Graph('test', using)
+        graph.push_back(GraphNode('test', '0001_a', [], [], [self.routine],
+                                  using=using))
+        return graph
+
+    def test_state_per_database(self):
+        self.graph('default').apply()
+
+        graph = self.graph('other')
+        self.assertFalse(graph.nodes['0001_a'].node.is_applied)
+        graph.apply()
+
+        self.assertEqual(self.calls, ['default', 'other'])
+        self.assertEqual(Node.get_qs().count(), 1)
+        self.assertEqual(Node.get_qs('other').count(), 1)
+
+    def test_router_skips_routines(self):
+        graph = self.graph('other')
+        graph.nodes['0001_a'].reverse_routines = [self.routine]
+        with override_settings(DATABASE_ROUTERS=[OtherDatabaseRouter()]):
+            graph.apply()
+            self.assertTrue(graph.nodes['0001_a'].node.is_applied)
+            graph.apply('zero')
+
+        self.assertEqual(self.calls, [])
+        self.assertFalse(graph.nodes['0001_a'].node.is_applied)
@@ -0,0 +1,189 @@
+import os
+import sys
+import tempfile
+from unittest import TestCase, mock
+
+from data_migration.services.graph import Graph
+from data_migration.services.loader import (MANIFEST_NAME, Manifest,
+                                            NotStaticError,
+                                            list_migration_files,
+                                            load_node_specs,
+                                            parse_node_file)
+from data_migration.services.node import Node
+from tests.utils import TransactionalTestCase
+
+this_dir = os.path.dirname(__file__)
+
+
+class ParseNodeFileTestCase(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def write(self, content: str) -> str:
+        file_path = os.path.join(self.directory.name, '0001_first.py')
+        with open(file_path, 'w') as file:
+            file.write(content)
+        return file_path
+
+    def test_reads_attributes(self):
+        file_path = self.write(
+            'import foo_module_which_does_not_exist\n\n'
+            'class Node:\n'
+            '    name = "0001_first"\n'
+            '    dependencies = ("0000_zero", )\n'
+            '    migration_dependencies = ("app.0001_initial", )\n'
+            '    routines = [foo_module_which_does_not_exist.routine]\n'
+        )
+
+        spec = parse_node_file(file_path, 'app.data_migrations.0001_first')
+
+        self.assertEqual(spec.name, '0001_first')
+        self.assertEqual(spec.dependencies, ('0000_zero', ))
+        self.assertEqual(spec.migration_dependencies, ('app.0001_initial', ))
+        self.assertEqual(spec.module_name, 'app.data_migrations.0001_first')
+
+    def test_without_node(self):
+        file_path = self.write('value = 1\n')
+
+        self.assertIsNone(parse_node_file(file_path, 'app'))
+
+    def test_dynamic_attributes(self):
+        file_path = self.write(
+            'NAME = "0001_first"\n\n'
+            'class Node:\n'
+            '    name = NAME\n'
+        )
+
+        with self.assertRaises(NotStaticError):
+            parse_node_file(file_path, 'app')
+
+    def test_imported_node(self):
+        file_path = self.write('from somewhere import Node\n')
+
+        with self.assertRaises(NotStaticError):
+            parse_node_file(file_path, 'app')
+
+    def test_list_migration_files(self):
+        for name in ['0002_b.py', '0001_a.py', '__init__.py', '.manifest']:
+            open(os.path.join(self.directory.name, name), 'w').close()
+
+        self.assertEqual(
+            list_migration_files(self.directory.name),
+            ['0001_a.py', '0002_b.py']
+        )
+
+
+class ManifestTestCase(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.write('0001_first.py', '0001_first')
+        self.write('0002_auto.py', '0002_auto', "'0001_first', ")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def write(self, file_name: str, name: str, dependencies: str = ''):
+        with open(os.path.join(self.directory.name, file_name), 'w') as file:
+            file.write(
+                'class Node:\n'
+                f'    name = {name!r}\n'
+                f'    dependencies = ({dependencies})\n'
+            )
+
+    def load(self):
+        return load_node_specs(self.directory.name, 'app.data_migrations')
+
+    @mock.patch('data_migration.services.loader.parse_node_file',
+                wraps=parse_node_file)
+    def test_reuses_entries(self, parse_mock):
+        specs = self.load()
+        self.assertEqual(parse_mock.call_count, 2)
+        self.assertTrue(
+            os.path.isfile(os.path.join(self.directory.name, MANIFEST_NAME)))
+
+        parse_mock.reset_mock()
+        self.assertEqual(self.load(), specs)
+        parse_mock.assert_not_called()
+
+    @mock.patch('data_migration.services.loader.parse_node_file',
+                wraps=parse_node_file)
+    def test_parses_changed_files(self, parse_mock):
+        self.load()
+        self.write('0002_auto.py', '0002_other', "'0001_first', ")
+        self.write('0003_auto.py', '0003_auto', "'0002_other', ")
+        os.remove(os.path.join(self.directory.name, '0001_first.py'))
+        parse_mock.reset_mock()
+
+        specs = self.load()
+
+        self.assertEqual([spec.name for spec in specs],
+                         ['0002_other', '0003_auto'])
+        self.assertEqual(parse_mock.call_count, 2)
+        self.assertEqual(
+            set(Manifest(self.directory.name).entries),
+            {'0002_auto.py', '0003_auto.py'}
+        )
+
+    @mock.patch('data_migration.services.loader.parse_node_file',
+                wraps=parse_node_file)
+    def test_touched_file_uses_hash(self, parse_mock):
+        self.load()
+        file_path = os.path.join(self.directory.name, '0001_first.py')
+        stat = os.stat(file_path)
+        os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        parse_mock.reset_mock()
+
+        self.load()
+
+        parse_mock.assert_not_called()
+        entry = Manifest(self.directory.name).entries['0001_first.py']
+        self.assertEqual(entry['mtime'], stat.st_mtime_ns + 10**9)
+
+    def test_invalid_manifest(self):
+        with open(os.path.join(self.directory.name, MANIFEST_NAME), 'w') as f:
+            f.write('{invalid')
+
+        self.assertEqual(len(self.load()), 2)
+
+    @mock.patch('tempfile.mkstemp', side_effect=PermissionError())
+    def test_read_only_directory(self, mkstemp_mock):
+        self.assertEqual(len(self.load()), 2)
+        self.assertFalse(
+            os.path.isfile(os.path.join(self.directory.name, MANIFEST_NAME)))
+
+
+class LazyDiscoveryTestCase(TransactionalTestCase):
+    module_name = 'tests.unittests.services.data_migrations.0002_auto'
+
+    def setUp(self) -> None:
+        Node.flush()
+        sys.modules.pop(self.module_name, None)
+
+    @mock.patch('data_migration.services.graph.GraphNode.set_applied')
+    @mock.patch('django.db.migrations.loader.MigrationLoader'
+                '.migrations_module',
+                return_value=('django.contrib.contenttypes.migrations',
+                              '__first__'))
+    @mock.patch('django.apps.apps.get_app_config')
+    def test_imports_only_applied_nodes(self, get_app_config_mock,
+                                        migrations_module_mock,
+                                        set_applied_mock):
+        get_app_config_mock.return_value = mock.Mock(
+            module=mock.Mock(__name__='tests.unittests.services'),
+            path=this_dir
+        )
+        g = Graph.from_dir('tests.unittests.services')
+
+        self.assertEqual(
+            [n.node.name for n in g.get_nodes()], ['0001_first', '0002_auto']
+        )
+        self.assertNotIn(self.module_name, sys.modules)
+
+        g.apply('0001_first')
+        self.assertNotIn(self.module_name, sys.modules)
+
+        g.apply()
+        self.assertIn(self.module_name, sys.modules)
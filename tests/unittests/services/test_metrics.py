@@ -0,0 +1,60 @@
+import tracemalloc
+from unittest import TestCase
+
+from django.apps import apps
+from django.db import connection
+
+from data_migration.services.metrics import (NodeMetrics, collect_metrics,
+                                             format_bytes)
+from tests.utils import TransactionalTestCase
+
+
+class CollectMetricsTestCase(TransactionalTestCase):
+    def setUp(self) -> None:
+        self.model = apps.get_model('test_app_2', 'Customer')
+        self.model.objects.all().delete()
+
+    def tearDown(self) -> None:
+        self.model.objects.all().delete()
+
+    def test_queries_and_rows(self):
+        self.model.objects.bulk_create([self.model() for _ in range(5)])
+
+        with collect_metrics(connection) as metrics:
+            self.model.objects.update(first_name='a')
+            list(self.model.objects.all())
+
+        self.assertEqual(metrics.queries, 2)
+        self.assertEqual(metrics.rows, 5)
+        self.assertGreater(metrics.db_time, 0)
+        self.assertGreaterEqual(metrics.wall_time, metrics.db_time)
+        self.assertIsNone(metrics.peak_memory)
+
+    def test_trace_memory(self):
+        with collect_metrics(connection, trace_memory=True) as metrics:
+            data = [bytes(1024) for _ in range(1000)]
+
+        self.assertGreater(metrics.peak_memory, 1000 * 1024)
+        self.assertFalse(tracemalloc.is_tracing())
+        del data
+
+
+class NodeMetricsTestCase(TestCase):
+    def test_str(self):
+        self.assertEqual(
+            str(NodeMetrics(1.5, 0.5, 3, 10, 2048)),
+            '1.50s, db 0.50s, 3 queries, 10 rows, peak 2.0 KiB'
+        )
+
+    def test_throttle_summary(self):
+        metrics = NodeMetrics(2.0, processed_rows=100)
+        self.assertIsNone(metrics.throttle_summary())
+
+        metrics.throttle_pauses = {'sleep': 2, 'probe': 1}
+        metrics.throttled = 1.5
+        self.assertEqual(metrics.throttle_summary(),
+                         'throttled 1.50s (probe 1x, sleep 2x), 50.0 rows/s')
+
+    def test_format_bytes(self):
+        self.assertEqual(format_bytes(512), '512.0 B')
+        self.assertEqual(format_bytes(3 * 1024 ** 3), '3.0 GiB')
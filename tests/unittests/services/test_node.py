@@ -2,7 +2,8 @@ from unittest import TestCase, mock
 
 from data_migration.services.node import (Node, AlreadyAppliedError,
                                           DatabaseError)
-from django.db import DatabaseError as DjDatabaseError
+from django.db import DatabaseError as DjDatabaseError, connections
+from django.db.backends.signals import connection_created
 
 
 class NodeTestCase(TestCase):
@@ -28,6 +29,32 @@ class NodeTestCase(TestCase):
         node.apply()
         self.assertTrue(node.is_applied)
 
+    def test_table_per_database(self):
+        nodes = [Node(app_name='test', name='0001_initial'),
+                 Node(app_name='test', name='0001_initial', using='other')]
+        Node.bulk_apply(nodes)
+
+        self.assertTrue(all(node.is_applied for node in nodes))
+        self.assertEqual(Node.get_qs().count(), 1)
+        self.assertEqual(Node.get_qs('other').count(), 1)
+
+        Node.bulk_revert(nodes[1:])
+        self.assertEqual(Node.get_qs().count(), 1)
+        self.assertFalse(Node.get_qs('other').exists())
+
+    def test_bulk_apply(self):
+        nodes = [Node(app_name='test', name=f'000{i}_auto') for i in range(3)]
+        Node.bulk_apply(nodes)
+
+        self.assertTrue(all(node.is_applied for node in nodes))
+        self.assertEqual(
+            {node.pk for node in nodes},
+            set(Node.get_qs().values_list('pk', flat=True))
+        )
+
+        with self.assertRaises(AlreadyAppliedError):
+            Node.bulk_apply(nodes)
+
     @mock.patch('django.db.backends.base.base.BaseDatabaseWrapper'
                 '.schema_editor')
     def test_ensure_table_side_effect(self, schema_editor_mock):
@@ -39,3 +66,45 @@ class NodeTestCase(TestCase):
         with self.assertRaises(DatabaseError) as ex:
             node.ensure_table()
             self.assertEqual(str(ex), 'Table "data_migrations" not creatable.')
+
+
+class NodeTableCacheTestCase(TestCase):
+    def setUp(self) -> None:
+        Node.clear_table_cache()
+
+    def tearDown(self) -> None:
+        Node.Node.objects.all().delete()
+
+    def table_names_mock(self):
+        introspection = connections['default'].introspection
+        return mock.patch.object(
+            introspection, 'table_names', wraps=introspection.table_names
+        )
+
+    def test_introspects_once(self):
+        with self.table_names_mock() as table_names_mock:
+            for name in ['0001_initial', '0002_auto', '0003_auto']:
+                node = Node(app_name='test', name=name)
+                node.exists()
+                node.apply()
+            Node.get_qs().count()
+
+        table_names_mock.assert_called_once()
+
+    def test_flush_invalidates_cache(self):
+        Node.get_qs()
+        Node.flush()
+        with self.table_names_mock() as table_names_mock:
+            Node.get_qs()
+
+        table_names_mock.assert_called_once()
+
+    def test_new_connection_invalidates_cache(self):
+        Node.get_qs()
+        connection_created.send(
+            sender=None, connection=connections['default'])
+        with self.table_names_mock() as table_names_mock:
+            Node.get_qs()
+            Node.get_qs()
+
+        table_names_mock.assert_called_once()
@@ -0,0 +1,240 @@
+import threading
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connections
+from django.db.migrations.executor import MigrationExecutor
+from django.db.migrations.recorder import MigrationRecorder
+
+from data_migration.services.graph import Graph, GraphNode
+from data_migration.services.node import Node
+from data_migration.services.plan import DataMigrationPlan
+from tests.utils import TransactionalTestCase
+
+applied_order = []
+
+
+def record(name):
+    def routine(apps, schema_editor):
+        applied_order.append(name)
+    return routine
+
+
+def build_graph(app_name, *nodes, routine=None):
+    graph = Graph(app_name)
+    for name, dependencies, migration_dependencies in nodes:
+        graph.push_back(GraphNode(
+            app_name, name, dependencies, migration_dependencies,
+            [record(f'{app_name}.{name}')] + ([routine] if routine else []),
+            node=Node(app_name=app_name, name=name)
+        ))
+    return graph
+
+
+class ConcurrencyProbe:
+    """Tracks the nodes running at the same time, per app and in total."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = {}
+        self.max_per_app = 0
+        self.barrier = threading.Barrier(2, timeout=10)
+
+    def routine(self, app_name, wait_for_other_app=False):
+        def inner(apps, schema_editor):
+            with self.lock:
+                self.active[app_name] = self.active.get(app_name, 0) + 1
+                self.max_per_app = max(self.max_per_app,
+                                       self.active[app_name])
+            try:
+                if wait_for_other_app:
+                    # passes only when two nodes run concurrently
+                    self.barrier.wait()
+            finally:
+                with self.lock:
+                    self.active[app_name] -= 1
+        return inner
+
+
+def fail(apps, schema_editor):
+    raise ValueError('failing routine')
+
+
+migration_snapshots = {}
+
+
+def snapshot_migrations(apps, schema_editor):
+    recorder = MigrationRecorder(connections['default'])
+    migration_snapshots[threading.current_thread().name] = {
+        name for app, name in recorder.applied_migrations()
+        if app == 'test_app_2'
+    }
+
+
+def snapshot_migrations_as(name):
+    def routine(apps, schema_editor):
+        snapshot_migrations(apps, schema_editor)
+        migration_snapshots[name] = migration_snapshots.pop(
+            threading.current_thread().name)
+    return routine
+
+
+class DataMigrationPlanTestCase(TransactionalTestCase):
+    def setUp(self) -> None:
+        Node.flush()
+        applied_order.clear()
+        migration_snapshots.clear()
+
+    def test_applies_all_apps_with_single_loader(self):
+        plan = DataMigrationPlan([
+            build_graph('app_a', ('0001_a', [], ['test_app.0001_first'])),
+            build_graph('app_b', ('0001_b', [], []),
+                        ('0002_b', ['0001_b'], [])),
+        ])
+
+        with mock.patch.object(MigrationExecutor, '__init__',
+                               autospec=True,
+                               side_effect=MigrationExecutor.__init__
+                               ) as init_mock:
+            plan.apply()
+
+        init_mock.assert_called_once()
+        self.assertEqual(
+            applied_order, ['app_a.0001_a', 'app_b.0001_b', 'app_b.0002_b'])
+        self.assertEqual(Node.get_qs().count(), 3)
+
+    def test_waits_for_migration_dependencies(self):
+        plan = DataMigrationPlan([
+            build_graph('app_a',
+                        ('0001_a', [], ['test_app.0001_first']),
+                        ('0002_a', ['0001_a'], ['other.0002_second'])),
+            build_graph('app_b', ('0001_b', [], ['other.0001_first'])),
+        ])
+        applied_migrations = {('test_app', '0001_first'): None}
+        plan.context.executor.loader.applied_migrations = applied_migrations
+
+        def migration_applied(app_label, name):
+            applied_migrations[(app_label, name)] = None
+            migration = mock.Mock(app_label=app_label, replaces=[])
+            migration.name = name
+            return [n.node.name for n in plan.migration_applied(migration)]
+
+        self.assertEqual(
+            [n.node.name for n in plan.apply_ready()], ['0001_a'])
+        self.assertEqual(
+            migration_applied('other', '0001_first'), ['0001_b'])
+        self.assertEqual(
+            migration_applied('other', '0002_second'), ['0002_a'])
+        self.assertEqual(
+            applied_order, ['app_a.0001_a', 'app_b.0001_b', 'app_a.0002_a'])
+        self.assertEqual(plan.pending_nodes(), [])
+
+    def test_releases_nodes_on_intermediate_migrations(self):
+        call_command('django_migrate', 'test_app_2', '0004', verbosity=0)
+        try:
+            plan = DataMigrationPlan([
+                build_graph(
+                    'app_a',
+                    ('0001_a', [],
+                     ['test_app_2.0007_remove_customer_address']),
+                    routine=snapshot_migrations_as('app_a')),
+                build_graph(
+                    'app_b',
+                    ('0001_b', [], ['test_app_2.0005_customer_address']),
+                    routine=snapshot_migrations_as('app_b')),
+            ])
+
+            plan.apply()
+
+            self.assertEqual(
+                applied_order, ['app_b.0001_b', 'app_a.0001_a'])
+            self.assertIn('0005_customer_address',
+                          migration_snapshots['app_b'])
+            self.assertNotIn('0006_address_line_split',
+                             migration_snapshots['app_b'])
+            self.assertIn('0007_remove_customer_address',
+                          migration_snapshots['app_a'])
+            self.assertNotIn('0008_customer_is_business',
+                             migration_snapshots['app_a'])
+            self.assertEqual(plan.pending_nodes(), [])
+        finally:
+            call_command('django_migrate', 'test_app_2', verbosity=0)
+
+
+class ParallelDataMigrationPlanTestCase(TransactionalTestCase):
+    def setUp(self) -> None:
+        Node.flush()
+        applied_order.clear()
+        migration_snapshots.clear()
+
+    def test_runs_independent_apps_concurrently(self):
+        probe = ConcurrencyProbe()
+        plan = DataMigrationPlan([
+            build_graph('app_a', ('0001_a', [], []),
+                        routine=probe.routine('app_a', True)),
+            build_graph('app_b', ('0001_b', [], []),
+                        routine=probe.routine('app_b', True)),
+        ])
+
+        plan.apply(workers=2)
+
+        self.assertEqual(Node.get_qs().count(), 2)
+
+    def test_keeps_order_within_app(self):
+        probe = ConcurrencyProbe()
+        plan = DataMigrationPlan([
+            build_graph('app_a', ('0001_a', [], []), ('0002_a', [], []),
+                        ('0003_a', ['0001_a'], []),
+                        routine=probe.routine('app_a')),
+            build_graph('app_b', ('0001_b', [], []),
+                        ('0002_b', ['0001_b'], []),
+                        routine=probe.routine('app_b')),
+        ])
+
+        plan.apply(workers=4)
+
+        self.assertEqual(probe.max_per_app, 1)
+        self.assertEqual(
+            [name for name in applied_order if name.startswith('app_a')],
+            ['app_a.0001_a', 'app_a.0002_a', 'app_a.0003_a']
+        )
+        self.assertEqual(
+            [name for name in applied_order if name.startswith('app_b')],
+            ['app_b.0001_b', 'app_b.0002_b']
+        )
+        self.assertEqual(Node.get_qs().count(), 5)
+        self.assertEqual(plan.pending_nodes(), [])
+
+    def test_applies_migration_dependencies_between_batches(self):
+        call_command('django_migrate', 'test_app_2', '0006', verbosity=0)
+        try:
+            graph = Graph('test_app_2')
+            graph.push_back(GraphNode(
+                'test_app_2', '0001_a', [],
+                ['test_app_2.0007_remove_customer_address'],
+                [snapshot_migrations],
+                node=Node(app_name='test_app_2', name='0001_a')))
+            plan = DataMigrationPlan([
+                graph, build_graph('app_b', ('0001_b', [], []))])
+
+            plan.apply(workers=2)
+
+            (applied, ), = migration_snapshots.values(),
+            self.assertIn('0007_remove_customer_address', applied)
+            self.assertNotIn('0008_customer_is_business', applied)
+            self.assertEqual(Node.get_qs().count(), 2)
+        finally:
+            call_command('django_migrate', 'test_app_2', verbosity=0)
+
+    def test_failure_stops_scheduling(self):
+        plan = DataMigrationPlan([
+            build_graph('app_a', ('0001_a', [], []),
+                        ('0002_a', ['0001_a'], []), routine=fail),
+            build_graph('app_b', ('0001_b', [], [])),
+        ])
+
+        with self.assertRaises(ValueError):
+            plan.apply(workers=2)
+
+        self.assertEqual(
+            list(Node.get_qs().values_list('name', flat=True)), ['0001_b'])
@@ -0,0 +1,76 @@
+import os
+import pstats
+import tempfile
+
+from data_migration.services.context import ExecutionContext
+from data_migration.services.graph import GraphNode
+from data_migration.services.node import Node
+from data_migration.services.profiler import Profiler, slowest_statements
+from tests.utils import TransactionalTestCase
+
+
+def count_customers(apps, schema_editor):
+    customer = apps.get_model('test_app_2', 'Customer')
+    customer.objects.count()
+    customer.objects.count()
+
+
+class ProfilerTestCase(TransactionalTestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.output = []
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+        Node.flush()
+
+    def apply(self, **kwargs) -> GraphNode:
+        profiler = Profiler(self.directory.name, top=5,
+                            output=self.output.append, **kwargs)
+        node = GraphNode('test', '0001_node', [], [], [count_customers])
+        node.apply(ExecutionContext(profiler=profiler))
+        return node
+
+    def test_writes_stats_per_node(self):
+        self.apply()
+
+        file_name = os.path.join(self.directory.name, 'test.0001_node.prof')
+        stats = pstats.Stats(file_name)
+        self.assertTrue(any(function[2] == 'count_customers'
+                            for function in stats.stats))
+        self.assertEqual(len(self.output), 1)
+        self.assertIn('count_customers', self.output[0])
+        self.assertNotIn('Slowest SQL', self.output[0])
+
+    def test_sql(self):
+        self.apply(sql=True)
+
+        self.assertIn('Slowest SQL of test.0001_node', self.output[0])
+        self.assertIn('       2  SELECT COUNT(*)', self.output[0])
+
+    def test_writes_stats_on_failure(self):
+        profiler = Profiler(self.directory.name, output=self.output.append)
+        node = GraphNode('test', '0001_node', [], [], [failing_routine])
+
+        with self.assertRaises(ValueError):
+            node.apply(ExecutionContext(profiler=profiler))
+        self.assertTrue(os.path.exists(
+            os.path.join(self.directory.name, 'test.0001_node.prof')))
+
+    def test_file_name(self):
+        profiler = Profiler(self.directory.name)
+
+        self.assertEqual(
+            profiler.file_name(Node('0001_node', 'test', using='other')),
+            os.path.join(self.directory.name, 'other.test.0001_node.prof')
+        )
+
+    def test_slowest_statements(self):
+        self.assertEqual(
+            slowest_statements({'a': [1.0], 'b': [1.0, 2.0], 'c': [0.5]}, 2),
+            [('b', 2, 3.0), ('a', 1, 1.0)]
+        )
+
+
+def failing_routine(apps, schema_editor):
+    raise ValueError('failing routine')
@@ -0,0 +1,155 @@
+from unittest import TestCase
+
+from django.apps import apps
+from django.db import connection
+
+from data_migration.routines import chunked, progress
+from data_migration.services.context import ExecutionContext
+from data_migration.services.graph import GraphNode
+from data_migration.services.node import Checkpoint, Node
+from data_migration.services.progress import Progress, track
+from tests.utils import TransactionalTestCase
+
+
+class CountingClock:
+    def __init__(self):
+        self.now = 0.0
+        self.reads = 0
+
+    def __call__(self):
+        self.reads += 1
+        return self.now
+
+
+class ProgressTestCase(TestCase):
+    def setUp(self) -> None:
+        self.clock = CountingClock()
+        self.reports = []
+        self.progress = Progress('app.0001_a', self.reports.append,
+                                 interval=5, clock=self.clock)
+
+    def test_report(self):
+        self.progress.total(1000)
+        self.clock.now = 10
+        self.progress.advance(250)
+
+        self.assertEqual(self.reports, [self.progress])
+        self.assertEqual(self.progress.percent, 25)
+        self.assertEqual(self.progress.eta, 30)
+        self.assertEqual(
+            str(self.progress),
+            'app.0001_a: 25.0% (250/1000 rows), 25 rows/s, ETA 0:00:30')
+
+    def test_without_total(self):
+        self.clock.now = 2
+        self.progress.advance(10)
+
+        self.assertIsNone(self.progress.percent)
+        self.assertIsNone(self.progress.eta)
+        self.assertEqual(str(self.progress), 'app.0001_a: 10 rows, 5 rows/s')
+
+    def test_rate_limited(self):
+        self.progress.total(100000)
+        for second in range(1, 11):
+            self.clock.now = second
+            for _ in range(1000):
+                self.progress.advance()
+
+        # one report per interval
+        self.assertEqual(len(self.reports), 2)
+        # the clock is read based on the rate, not on every advance
+        self.assertLess(self.clock.reads, 300)
+        self.assertEqual(self.progress.done, 10000)
+
+    def test_resumed(self):
+        self.clock.now = 0.001
+        self.progress.total(2000000, done=1000000)
+        for second in range(1, 101):
+            self.clock.now = second
+            self.progress.advance(1000)
+
+        # rows of the former run count towards the percentage only, one
+        # report per interval
+        self.assertEqual(len(self.reports), 19)
+        self.assertEqual(round(self.progress.rate), 1000)
+        self.assertEqual(round(self.progress.eta), 900)
+        self.assertEqual(self.progress.percent, 55)
+
+    def test_total_restarts(self):
+        self.progress.advance(5)
+        self.clock.now = 3
+        self.progress.total(10)
+
+        self.assertEqual(self.progress.done, 0)
+        self.assertEqual(self.progress.started_at, 3)
+
+
+class ProgressProxyTestCase(TestCase):
+    def test_ignored_outside_of_nodes(self):
+        self.assertFalse(progress.active)
+        progress.total(10)
+        progress.advance(5)
+
+    def test_track(self):
+        current = Progress('app.0001_a')
+        with track(current):
+            self.assertTrue(progress.active)
+            progress.total(10)
+            progress.advance(5)
+
+        self.assertFalse(progress.active)
+        self.assertEqual((current.total_count, current.done), (10, 5))
+
+
+def noop(chunk, apps, schema_editor):
+    pass
+
+
+states = []
+
+
+def record_progress(apps, schema_editor):
+    states.append(progress.active)
+
+
+class ProgressFeedTestCase(TransactionalTestCase):
+    def setUp(self) -> None:
+        self.model = apps.get_model('test_app_2', 'Customer')
+        self.model.objects.all().delete()
+        self.model.objects.bulk_create([self.model() for _ in range(25)])
+        states.clear()
+
+    def tearDown(self) -> None:
+        self.model.objects.all().delete()
+        Node.flush()
+        Checkpoint.flush()
+
+    def test_chunked(self):
+        current = Progress('test_app_2.0001_a')
+        routine = chunked('test_app_2.Customer', noop, chunk_size=10)
+        with track(current), \
+                connection.schema_editor(atomic=False) as schema_editor:
+            routine(apps, schema_editor)
+
+        self.assertEqual((current.total_count, current.done), (25, 25))
+
+    def test_chunked_resumed(self):
+        current = Progress('test_app_2.0001_a')
+        checkpoint = Checkpoint('test_app_2', '0001_a', 0)
+        checkpoint.last_key = self.model.objects.order_by('pk')[9].pk
+        checkpoint.rows_done = 10
+        checkpoint.save()
+        routine = chunked('test_app_2.Customer', noop, chunk_size=10)
+        with track(current), \
+                connection.schema_editor(atomic=False) as schema_editor:
+            routine(apps, schema_editor, checkpoint=Checkpoint(
+                'test_app_2', '0001_a', 0))
+
+        self.assertEqual((current.initial, current.done), (10, 25))
+
+    def test_tracked_by_context(self):
+        GraphNode('test', '0001_a', [], [], [record_progress]).apply()
+        GraphNode('test', '0002_b', [], [], [record_progress]).apply(
+            ExecutionContext(progress_reporter=print))
+
+        self.assertEqual(states, [False, True])
@@ -0,0 +1,231 @@
+import os
+import socket
+import tempfile
+from unittest import TestCase, mock
+
+from django.apps import apps
+
+from data_migration.routines import chunked
+from data_migration.services.context import ExecutionContext
+from data_migration.services.graph import GraphNode
+from data_migration.services.metrics import NodeMetrics
+from data_migration.services.node import Checkpoint, Node
+from data_migration.services.sinks import (MetricsSink,
+                                           PrometheusTextfileSink,
+                                           StatsdSink)
+from data_migration.settings import internal_settings
+from tests.utils import TransactionalTestCase
+
+
+def node_metrics(**kwargs) -> NodeMetrics:
+    return NodeMetrics(1.5, 0.5, 3, 10, **kwargs)
+
+
+class PrometheusTextfileSinkTestCase(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'data_migration.prom')
+        self.sink = PrometheusTextfileSink(self.path, buckets=(0.1, 1.0))
+        self.node = Node(app_name='app', name='0001_a')
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def read(self) -> str:
+        with open(self.path) as file:
+            return file.read()
+
+    def test_node_applied(self):
+        self.sink.node_applied(self.node, node_metrics(
+            chunk_times=[0.05, 0.5, 2.0], processed_rows=30, resumed=1,
+            throttled=0.25))
+
+        content = self.read()
+        labels = 'database="default",app="app",node="0001_a"'
+        for line in (
+                '# TYPE data_migration_node_duration_seconds gauge',
+                f'data_migration_node_duration_seconds{{{labels}}} 1.5',
+                f'data_migration_node_db_duration_seconds{{{labels}}} 0.5',
+                f'data_migration_node_queries{{{labels}}} 3',
+                f'data_migration_node_rows{{{labels}}} 10',
+                f'data_migration_node_processed_rows{{{labels}}} 30',
+                f'data_migration_node_throttled_seconds{{{labels}}} 0.25',
+                f'data_migration_node_retries_total{{{labels}}} 1',
+                '# TYPE data_migration_chunk_duration_seconds histogram',
+                f'data_migration_chunk_duration_seconds_bucket'
+                f'{{{labels},le="0.1"}} 1',
+                f'data_migration_chunk_duration_seconds_bucket'
+                f'{{{labels},le="1.0"}} 2',
+                f'data_migration_chunk_duration_seconds_bucket'
+                f'{{{labels},le="+Inf"}} 3',
+                f'data_migration_chunk_duration_seconds_sum{{{labels}}} 2.55',
+                f'data_migration_chunk_duration_seconds_count{{{labels}}} 3',
+        ):
+            self.assertIn(line + '\n', content)
+        self.assertNotIn('data_migration_node_failures_total{', content)
+
+    def test_counters_accumulate(self):
+        self.sink.node_failed(self.node, node_metrics(chunk_times=[0.05]))
+        self.sink.node_failed(self.node, node_metrics(chunk_times=[0.05]))
+
+        content = self.read()
+        self.assertIn('data_migration_node_failures_total{database="default"'
+                      ',app="app",node="0001_a"} 2\n', content)
+        self.assertIn('_count{database="default",app="app",node="0001_a"} 2',
+                      content)
+        self.assertNotIn('data_migration_node_duration_seconds{', content)
+
+    def test_escapes_labels(self):
+        self.sink.node_applied(
+            Node(app_name='app', name='a"b\\c'), node_metrics())
+
+        self.assertIn('node="a\\"b\\\\c"', self.read())
+
+    def test_write_fails_gracefully(self):
+        sink = PrometheusTextfileSink(
+            os.path.join(self.path, 'missing', 'data_migration.prom'))
+
+        with self.assertLogs('data_migration', 'WARNING'):
+            sink.node_applied(self.node, node_metrics())
+
+
+class StatsdSinkTestCase(TestCase):
+    def setUp(self) -> None:
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.settimeout(5)
+        self.node = Node(app_name='app', name='0001_a', using='other')
+
+    def tearDown(self) -> None:
+        self.server.close()
+
+    def sink(self, **kwargs) -> StatsdSink:
+        return StatsdSink('127.0.0.1', self.server.getsockname()[1],
+                          **kwargs)
+
+    def receive(self) -> str:
+        return self.server.recv(65535).decode()
+
+    def test_node_applied(self):
+        self.sink().node_applied(self.node, node_metrics(
+            chunk_times=[0.25], processed_rows=30, resumed=1,
+            throttled=0.25))
+
+        self.assertEqual(self.receive().split('\n'), [
+            'data_migration.other.app.0001_a.duration:1500.000|ms',
+            'data_migration.other.app.0001_a.db_duration:500.000|ms',
+            'data_migration.other.app.0001_a.queries:3|g',
+            'data_migration.other.app.0001_a.rows:10|g',
+            'data_migration.other.app.0001_a.processed_rows:30|g',
+            'data_migration.other.app.0001_a.chunk:250.000|ms',
+            'data_migration.other.app.0001_a.retries:1|c',
+            'data_migration.other.app.0001_a.throttled:250.000|ms',
+        ])
+
+    def test_node_failed(self):
+        self.sink(prefix='deploy').node_failed(
+            Node(app_name='app', name='0001 a.b'), node_metrics())
+
+        self.assertEqual(self.receive(),
+                         'deploy.default.app.0001_a_b.failures:1|c')
+
+    def test_packet_size(self):
+        sink = self.sink(max_packet_size=100)
+        sink.node_applied(self.node, node_metrics(chunk_times=[0.1] * 10))
+
+        packets = []
+        lines = 0
+        while lines < 15:
+            packets.append(self.receive())
+            lines += len(packets[-1].split('\n'))
+        self.assertEqual(lines, 15)
+        self.assertTrue(all(len(packet) <= 100 for packet in packets))
+
+
+class MetricsSinkSettingsTestCase(TestCase):
+    def test_not_configured(self):
+        self.assertIsNone(MetricsSink.from_settings())
+        self.assertIsNone(ExecutionContext().metrics_sink)
+
+    def test_configured(self):
+        config = {'BACKEND': 'statsd', 'HOST': '127.0.0.1', 'PORT': 9125}
+        with mock.patch.dict(internal_settings.settings,
+                             {'METRICS_SINK': config}):
+            sink = MetricsSink.from_settings()
+            self.assertIsInstance(sink, StatsdSink)
+            self.assertEqual(sink.address, ('127.0.0.1', 9125))
+            self.assertIs(MetricsSink.from_settings(), sink)
+            self.assertIs(ExecutionContext().fork().metrics_sink, sink)
+
+    def test_incomplete_sink(self):
+        class IncompleteSink(MetricsSink):
+            def node_applied(self, node, metrics):
+                pass
+
+        with self.assertRaises(TypeError):
+            IncompleteSink()
+
+    def test_invalid_backend(self):
+        with mock.patch.dict(internal_settings.settings,
+                             {'METRICS_SINK': {'BACKEND': 'graphite'}}):
+            with self.assertRaises(ValueError):
+                MetricsSink.from_settings()
+
+
+class RecordingSink(MetricsSink):
+    def __init__(self):
+        self.events = []
+
+    def node_applied(self, node, metrics):
+        self.events.append(('applied', node.name, metrics))
+
+    def node_failed(self, node, metrics):
+        self.events.append(('failed', node.name, metrics))
+
+
+def update_chunk(chunk, apps, schema_editor) -> None:
+    chunk.update(last_name='b')
+
+
+def update_chunk_and_fail(chunk, apps, schema_editor) -> None:
+    update_chunk(chunk, apps, schema_editor)
+    if chunk.filter(first_name='c').exists():
+        raise ValueError('failing chunk')
+
+
+class GraphNodeSinkTestCase(TransactionalTestCase):
+    def setUp(self) -> None:
+        Node.flush()
+        Checkpoint.flush()
+        self.model = apps.get_model('test_app_2', 'Customer')
+        self.model.objects.all().delete()
+        self.model.objects.bulk_create(
+            [self.model(first_name='a')] * 3 + [self.model(first_name='c')])
+        self.sink = RecordingSink()
+
+    def tearDown(self) -> None:
+        self.model.objects.all().delete()
+        Node.flush()
+        Checkpoint.flush()
+
+    def apply(self, function) -> None:
+        GraphNode('test', '0001_node', [], [], [
+            chunked('test_app_2.Customer', function, chunk_size=2)
+        ]).apply(ExecutionContext(metrics_sink=self.sink))
+
+    def test_failure_and_retry(self):
+        with self.assertRaises(ValueError):
+            self.apply(update_chunk_and_fail)
+        self.apply(update_chunk)
+
+        (failed, name, failed_metrics), (applied, _, metrics) = \
+            self.sink.events
+        self.assertEqual((failed, name, applied),
+                         ('failed', '0001_node', 'applied'))
+        self.assertEqual(len(failed_metrics.chunk_times), 1)
+        self.assertEqual(failed_metrics.processed_rows, 2)
+        self.assertEqual(failed_metrics.resumed, 0)
+        self.assertEqual(len(metrics.chunk_times), 1)
+        self.assertEqual(metrics.processed_rows, 2)
+        self.assertEqual(metrics.resumed, 1)
+        self.assertGreater(metrics.wall_time, 0)
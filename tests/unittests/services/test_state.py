@@ -0,0 +1,114 @@
+from unittest import TestCase, mock
+
+from django.db import models
+from django.db.migrations.state import ModelState, ProjectState
+
+from data_migration.services.context import ExecutionContext
+from data_migration.services.state import (LazyApps, model_relations,
+                                           related_models)
+from tests.utils import TransactionalTestCase
+
+
+class LazyAppsTestCase(TransactionalTestCase):
+    def setUp(self) -> None:
+        self.context = ExecutionContext()
+        self.apps = LazyApps(lambda: self.context.state)
+
+    def test_renders_nothing_until_used(self):
+        get_state = mock.Mock()
+        LazyApps(get_state)
+
+        get_state.assert_not_called()
+
+    def test_renders_requested_model_only(self):
+        model = self.apps.get_model('test_app_2', 'Customer')
+
+        self.assertEqual(model.__name__, 'Customer')
+        self.assertEqual(self.apps.rendered_models,
+                         {('test_app_2', 'customer')})
+        self.assertEqual(
+            [m.__name__ for m in model._meta.apps.get_models()],
+            ['Customer'])
+        self.assertNotIn('apps', self.context.state.__dict__)
+
+    def test_renders_related_models(self):
+        user = self.apps.get_model('auth.User')
+
+        rendered = self.apps.rendered_models
+        self.assertIn(('auth', 'group'), rendered)
+        self.assertIn(('auth', 'permission'), rendered)
+        self.assertIn(('contenttypes', 'contenttype'), rendered)
+        # referencing the user, required to cascade deletes
+        self.assertIn(('admin', 'logentry'), rendered)
+        self.assertNotIn(('test_app_2', 'customer'), rendered)
+        self.assertIs(self.apps.get_model('auth', 'permission'),
+                      user._meta.get_field('user_permissions').related_model)
+
+    def test_models_are_cached(self):
+        self.assertIs(self.apps.get_model('test_app_2', 'Customer'),
+                      self.apps.get_model('test_app_2.customer'))
+
+    def test_queries(self):
+        model = self.apps.get_model('test_app_2', 'Customer')
+        model.objects.create(first_name='a')
+
+        self.assertEqual(model.objects.filter(first_name='a').count(), 1)
+        model.objects.all().delete()
+
+    def test_unknown_model(self):
+        with self.assertRaises(LookupError):
+            self.apps.get_model('test_app_2', 'Unknown')
+
+    def test_uses_rendered_state(self):
+        rendered = self.context.apps
+
+        self.assertIs(self.apps.get_model('test_app_2', 'Customer'),
+                      rendered.get_model('test_app_2', 'Customer'))
+        self.assertEqual(self.apps.rendered_models, set())
+
+    def test_other_attributes_render_everything(self):
+        self.assertTrue(self.apps.is_installed('test_app_2'))
+        self.assertIn('apps', self.context.state.__dict__)
+
+    def test_invalidated_on_migrate(self):
+        lazy_apps = self.context.lazy_apps
+        self.assertIs(self.context.lazy_apps, lazy_apps)
+
+        self.context._executor = mock.Mock()
+        self.context.migrate([('test_app', '0001_first')])
+
+        self.assertIsNot(self.context.lazy_apps, lazy_apps)
+
+
+class ModelRelationsTestCase(TestCase):
+    def test_relations(self):
+        state = ProjectState()
+        state.add_model(ModelState('a', 'Parent', [
+            ('id', models.AutoField(primary_key=True)),
+            ('parent', models.ForeignKey('self', models.CASCADE)),
+        ]))
+        state.add_model(ModelState('a', 'Child', [
+            ('parent_ptr', models.OneToOneField(
+                'a.Parent', models.CASCADE, parent_link=True,
+                primary_key=True)),
+        ], bases=('a.parent', )))
+        state.add_model(ModelState('b', 'Tag', [
+            ('id', models.AutoField(primary_key=True)),
+            ('children', models.ManyToManyField('a.Child', through='Link')),
+        ]))
+        state.add_model(ModelState('b', 'Link', [
+            ('id', models.AutoField(primary_key=True)),
+        ]))
+        state.add_model(ModelState('b', 'Other', [
+            ('id', models.AutoField(primary_key=True)),
+        ]))
+
+        relations = model_relations(state)
+
+        self.assertEqual(relations[('a', 'parent')], {('a', 'child')})
+        self.assertEqual(relations[('b', 'tag')],
+                         {('a', 'child'), ('b', 'link')})
+        self.assertEqual(relations[('b', 'other')], set())
+        self.assertEqual(
+            related_models(relations, ('b', 'link')),
+            {('a', 'parent'), ('a', 'child'), ('b', 'tag'), ('b', 'link')})
@@ -0,0 +1,171 @@
+from unittest import TestCase, mock
+
+from django.apps import apps
+from django.db import connection
+
+from data_migration.routines import chunked, partitioned
+from data_migration.services.graph import GraphNode
+from data_migration.services.node import Node
+from data_migration.services.throttle import Throttle
+from data_migration.settings import internal_settings
+from tests.utils import TransactionalTestCase
+
+
+class FakeClock:
+    """Stand-in for time.monotonic and time.sleep."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.pauses = []
+
+    def __call__(self):
+        return self.now
+
+    def pause(self, seconds):
+        self.pauses.append(seconds)
+        self.now += seconds
+
+
+class ThrottleTestCase(TestCase):
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+
+    def throttle(self, **kwargs) -> Throttle:
+        return Throttle(clock=self.clock, pause=self.clock.pause, **kwargs)
+
+    def test_duty_cycle(self):
+        run = self.throttle(sleep=0.5).start('app.0001_a')
+
+        run.chunk_done(10)
+        run.chunk_done(10)
+
+        self.assertEqual(self.clock.pauses, [0.5, 0.5])
+        self.assertEqual(run.decisions, {'sleep': [0.5, 0.5]})
+
+    def test_rows_per_second(self):
+        run = self.throttle(rows_per_second=100).start('app.0001_a')
+
+        # processing 100 rows took 0.25s, pause to match the target rate
+        self.clock.now += 0.25
+        run.chunk_done(100)
+        # processing took longer than the target rate allows
+        self.clock.now += 2
+        run.chunk_done(100)
+
+        self.assertEqual(run.decisions, {'rate': [0.75]})
+        self.assertEqual(run.throughput, 200 / 3)
+
+    def test_probe(self):
+        lag = [3.0, 1.0, None, 0]
+        run = self.throttle(probe=lambda: lag.pop(0)).start('app.0001_a')
+
+        run.chunk_done(10)
+        run.chunk_done(10)
+
+        self.assertEqual(run.decisions, {'probe': [3.0, 1.0]})
+        self.assertEqual(lag, [])
+
+    def test_probe_wait_is_bounded(self):
+        run = self.throttle(
+            probe=lambda: 2.0, max_probe_wait=5).start('app.0001_a')
+
+        with self.assertLogs('data_migration', 'WARNING'):
+            run.chunk_done(10)
+
+        self.assertEqual(self.clock.pauses, [2.0, 2.0, 1.0])
+
+    def test_report(self):
+        run = self.throttle(sleep=1).start('app.0001_a')
+        run.chunk_done(10)
+        run.chunk_done(10)
+
+        with self.assertLogs('data_migration', 'INFO') as logs:
+            run.finish()
+
+        self.assertEqual(logs.output, [
+            'INFO:data_migration:app.0001_a: 20 rows in 2 chunks, 2.00s '
+            '(10.0 rows/s), throttled 2.00s (sleep 2x 2.00s)'
+        ])
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            Throttle(rows_per_second=0)
+
+    def test_from_settings(self):
+        self.assertIsNone(Throttle.from_settings())
+
+        with mock.patch.dict(internal_settings.settings, {'THROTTLE': {
+            'ROWS_PER_SECOND': 500,
+            'PROBE': 'tests.unittests.services.test_throttle.no_lag',
+        }}):
+            throttle = Throttle.from_settings()
+
+        self.assertEqual(throttle.rows_per_second, 500)
+        self.assertIs(throttle.probe, no_lag)
+
+
+def no_lag():
+    return None
+
+
+def noop(chunk, apps, schema_editor):
+    pass
+
+
+class ThrottledRoutineTestCase(TransactionalTestCase):
+    def setUp(self) -> None:
+        self.model = apps.get_model('test_app_2', 'Customer')
+        self.model.objects.all().delete()
+        self.model.objects.bulk_create([self.model() for _ in range(25)])
+
+    def tearDown(self) -> None:
+        self.model.objects.all().delete()
+
+    def test_pauses_between_chunks(self):
+        clock = FakeClock()
+        routine = chunked('test_app_2.Customer', noop, chunk_size=10,
+                          throttle=Throttle(sleep=0.1, clock=clock,
+                                            pause=clock.pause))
+
+        with self.assertLogs('data_migration', 'INFO') as logs, \
+                connection.schema_editor(atomic=False) as schema_editor:
+            routine(apps, schema_editor)
+
+        self.assertEqual(clock.pauses, [0.1, 0.1, 0.1])
+        self.assertIn('25 rows in 3 chunks', logs.output[0])
+
+    def test_pauses_between_chunks_of_partitions(self):
+        clock = FakeClock()
+        routine = partitioned('test_app_2.Customer', noop, partitions=3,
+                              processes=1, chunk_size=5,
+                              throttle=Throttle(sleep=0.1, clock=clock,
+                                                pause=clock.pause))
+
+        with connection.schema_editor(atomic=False) as schema_editor:
+            routine(apps, schema_editor)
+
+        # 9, 9 and 7 rows
+        self.assertEqual(clock.pauses, [0.1] * 6)
+
+    def test_partitions_share_rate(self):
+        throttle = Throttle(rows_per_second=100)
+        routine = partitioned('test_app_2.Customer', noop,
+                              throttle=throttle)
+
+        self.assertIs(routine.partition_throttle(1), throttle)
+        self.assertEqual(routine.partition_throttle(4).rows_per_second, 25)
+        self.assertEqual(throttle.rows_per_second, 100)
+
+    def test_records_node_metrics(self):
+        clock = FakeClock()
+        node = GraphNode('test_app_2', '0001_throttled', [], [], [
+            chunked('test_app_2.Customer', noop, chunk_size=10,
+                    throttle=Throttle(sleep=0.1, clock=clock,
+                                      pause=clock.pause))
+        ])
+
+        node.apply()
+
+        self.assertEqual(node.metrics.throttle_pauses, {'sleep': 3})
+        self.assertAlmostEqual(node.metrics.throttled, 0.3)
+        Node.flush()
@@ -0,0 +1,564 @@
+import asyncio
+import os
+import threading
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+
+from django.apps import apps
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.transaction import TransactionManagementError
+from django.test.utils import CaptureQueriesContext
+
+from data_migration.routines import (ChunkedRoutine, PartitionError,
+                                     bulk_transform, chunked, gather,
+                                     is_async, partitioned, run_routine)
+from data_migration.services.graph import Graph, GraphNode
+from data_migration.services.node import Checkpoint, Node
+from data_migration.services.plan import DataMigrationPlan
+from tests.utils import TransactionalTestCase
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+processed_chunks = []
+
+
+def collect(chunk, apps, schema_editor):
+    processed_chunks.append(list(chunk.values_list('pk', flat=True)))
+
+
+def set_first_name(chunk, apps, schema_editor):
+    chunk.update(first_name='x')
+    if chunk.filter(pk__gt=20).exists():
+        raise ValueError('failing chunk')
+
+
+def fail_once(function):
+    calls = []
+
+    def inner(chunk, apps, schema_editor):
+        function(chunk, apps, schema_editor)
+        if not calls and chunk.filter(pk__gt=20).exists():
+            calls.append(chunk)
+            raise ValueError('failing chunk')
+    return inner
+
+
+class ChunkedRoutineTestCase(TransactionalTestCase):
+    def setUp(self) -> None:
+        Node.flush()
+        Checkpoint.flush()
+        processed_chunks.clear()
+        self.model = apps.get_model('test_app_2', 'Customer')
+        self.model.objects.all().delete()
+        self.model.objects.bulk_create([
+            self.model(id=i, is_business=i % 2 == 0) for i in range(1, 26)
+        ])
+
+    def tearDown(self) -> None:
+        self.model.objects.all().delete()
+
+    def run_routine(self, routine):
+        with connection.schema_editor(atomic=False) as schema_editor:
+            routine(apps, schema_editor)
+
+    def test_paginates_by_primary_key(self):
+        self.run_routine(chunked('test_app_2.Customer', collect, 10))
+
+        self.assertEqual(
+            [len(chunk) for chunk in processed_chunks], [10, 10, 5])
+        self.assertEqual(
+            [pk for chunk in processed_chunks for pk in chunk],
+            list(range(1, 26))
+        )
+
+    def test_restricts_queryset(self):
+        self.run_routine(chunked(
+            'test_app_2.Customer', collect, 5,
+            queryset=lambda qs: qs.filter(is_business=True)
+        ))
+
+        self.assertEqual(
+            [pk for chunk in processed_chunks for pk in chunk],
+            list(range(2, 26, 2))
+        )
+        self.assertEqual(
+            [len(chunk) for chunk in processed_chunks], [5, 5, 2])
+
+    def test_constant_queries_per_chunk(self):
+        routine = chunked('test_app_2.Customer',
+                          lambda chunk, apps, schema_editor: None, 5)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.run_routine(routine)
+
+        # one select per chunk and a final empty select, no data is loaded
+        selects = [q for q in ctx.captured_queries
+                   if q['sql'].startswith('SELECT')]
+        self.assertEqual(len(selects), 6)
+
+    def test_resumes_after_key(self):
+        routine = ChunkedRoutine('test_app_2.Customer', collect, 10)
+        qs = self.model.objects.all()
+
+        self.assertEqual(
+            [(last_key, count) for _, last_key, count
+             in routine.chunks(qs, last_key=12)],
+            [(22, 10), (25, 3)]
+        )
+
+    def test_invalid_chunk_size(self):
+        with self.assertRaises(ValueError):
+            chunked('test_app_2.Customer', collect, 0)
+
+    def test_commits_per_chunk(self):
+        node = GraphNode('test_app_2', '0001_chunked', [], [], [
+            chunked('test_app_2.Customer', set_first_name, 10)
+        ])
+
+        self.assertEqual(node.atomic, 'per_chunk')
+        with self.assertRaises(ValueError):
+            node.apply()
+
+        self.assertEqual(
+            list(self.model.objects.filter(first_name='x')
+                 .values_list('pk', flat=True).order_by('pk')),
+            list(range(1, 21))
+        )
+        self.assertFalse(Node.get_qs().filter(name='0001_chunked').exists())
+
+    def test_plain_routines_of_chunked_node_are_atomic(self):
+        def update_and_fail(apps, schema_editor):
+            apps.get_model('test_app_2', 'Customer').objects.update(
+                last_name='y')
+            raise ValueError('failing routine')
+
+        node = GraphNode('test_app_2', '0001_chunked', [], [], [
+            chunked('test_app_2.Customer', collect, 10), update_and_fail
+        ])
+
+        with self.assertRaises(ValueError):
+            node.apply()
+
+        self.assertEqual(len(processed_chunks), 3)
+        self.assertFalse(self.model.objects.filter(last_name='y').exists())
+
+    def test_resumes_from_checkpoint(self):
+        node = GraphNode('test_app_2', '0001_chunked', [], [], [
+            chunked('test_app_2.Customer', fail_once(collect), 10)
+        ])
+
+        with self.assertRaises(ValueError):
+            node.apply()
+
+        checkpoint = Checkpoint('test_app_2', '0001_chunked', 0).load()
+        self.assertEqual((checkpoint.last_key, checkpoint.rows_done),
+                         (20, 20))
+        self.assertFalse(node.node.is_applied)
+
+        processed_chunks.clear()
+        node.apply()
+
+        # the failed chunk got rolled back and is processed again
+        self.assertEqual(processed_chunks, [list(range(21, 26))])
+        self.assertTrue(node.node.is_applied)
+        self.assertFalse(Checkpoint.get_qs().exists())
+
+    def test_skips_completed_routines(self):
+        failures = [ValueError('failing routine')]
+
+        def fail_first_run(apps, schema_editor):
+            if failures:
+                raise failures.pop()
+
+        node = GraphNode('test_app_2', '0001_chunked', [], [], [
+            chunked('test_app_2.Customer', collect, 10), fail_first_run
+        ])
+
+        with self.assertRaises(ValueError):
+            node.apply()
+        node.apply()
+
+        self.assertEqual(len(processed_chunks), 3)
+        self.assertTrue(node.node.is_applied)
+
+    def test_skips_completed_plain_routines(self):
+        for atomic, expected_runs in (('per_chunk', 1), ('per_routine', 1),
+                                      (False, 1), (True, 2)):
+            with self.subTest(atomic=atomic):
+                Node.flush()
+                processed_chunks.clear()
+                runs = []
+                failures = [ValueError('failing routine')]
+
+                def count_runs(apps, schema_editor):
+                    runs.append(1)
+
+                def fail_first_run(apps, schema_editor):
+                    if failures:
+                        raise failures.pop()
+
+                node = GraphNode('test_app_2', '0001_mixed', [], [], [
+                    count_runs,
+                    chunked('test_app_2.Customer', collect, 10),
+                    fail_first_run,
+                ], atomic=atomic)
+
+                with self.assertRaises(ValueError):
+                    node.apply()
+                node.apply()
+
+                self.assertEqual(len(runs), expected_runs)
+                self.assertEqual(len(processed_chunks), 3 * expected_runs)
+                self.assertTrue(node.node.is_applied)
+                self.assertFalse(Checkpoint.get_qs().exists())
+
+
+class CheckpointTestCase(TransactionalTestCase):
+    def setUp(self) -> None:
+        Checkpoint.flush()
+
+    def test_save_and_load(self):
+        checkpoint = Checkpoint('app', '0001_a', 1)
+        checkpoint.last_key = 'abc'
+        checkpoint.rows_done = 3
+        checkpoint.save()
+        checkpoint.rows_done = 5
+        checkpoint.save()
+
+        loaded = Checkpoint('app', '0001_a', 1).load()
+
+        self.assertEqual((loaded.last_key, loaded.rows_done, loaded.done),
+                         ('abc', 5, False))
+        self.assertEqual(Checkpoint.get_qs().count(), 1)
+
+    def test_clear(self):
+        Checkpoint('app', '0001_a', 0).save()
+        Checkpoint('app', '0001_a', 1).save()
+        Checkpoint('app', '0002_b', 0).save()
+
+        Checkpoint.clear('app', '0001_a')
+
+        self.assertEqual(
+            list(Checkpoint.get_qs().values_list('name', flat=True)),
+            ['0002_b'])
+
+
+class BulkTransformTestCase(TransactionalTestCase):
+    def setUp(self) -> None:
+        self.model = apps.get_model('test_app_2', 'Customer')
+        self.model.objects.all().delete()
+        self.model.objects.bulk_create([
+            self.model(id=i, first_name='abcde'[i % 5], last_name='x')
+            for i in range(1, 26)
+        ])
+
+    def tearDown(self) -> None:
+        self.model.objects.all().delete()
+
+    def run_routine(self, routine):
+        with connection.schema_editor(atomic=False) as schema_editor:
+            routine(apps, schema_editor)
+
+    def names(self):
+        return list(self.model.objects.order_by('pk').values_list(
+            'first_name', 'last_name'))
+
+    def test_transforms_fields(self):
+        self.run_routine(bulk_transform(
+            'test_app_2.Customer', ['first_name'], str.upper, chunk_size=10))
+
+        self.assertEqual(
+            self.names(),
+            [('ABCDE'[i % 5], 'x') for i in range(1, 26)]
+        )
+
+    def test_transforms_into_targets(self):
+        self.run_routine(bulk_transform(
+            'test_app_2.Customer', ['first_name', 'last_name'],
+            lambda first_name, last_name: (last_name, first_name),
+            targets=['first_name', 'last_name'], chunk_size=10
+        ))
+
+        self.assertEqual(
+            self.names(),
+            [('x', 'abcde'[i % 5]) for i in range(1, 26)]
+        )
+
+    def test_query_count(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.run_routine(bulk_transform(
+                'test_app_2.Customer', ['first_name'], str.upper,
+                targets=['last_name'], chunk_size=10
+            ))
+
+        # per chunk: select and update, plus a final empty select
+        self.assertEqual(
+            [q['sql'].split(' ')[0] for q in ctx.captured_queries
+             if q['sql'].startswith(('SELECT', 'UPDATE'))],
+            ['SELECT', 'UPDATE'] * 3 + ['SELECT']
+        )
+
+    def test_skips_unchanged_rows(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.run_routine(bulk_transform(
+                'test_app_2.Customer', ['last_name'], str.lower))
+
+        self.assertFalse(any(q['sql'].startswith('UPDATE')
+                             for q in ctx.captured_queries))
+
+    @skipUnless(numpy, 'requires numpy')
+    def test_vectorized(self):
+        self.run_routine(bulk_transform(
+            'test_app_2.Customer', ['id', 'first_name'],
+            lambda ids, first_names: numpy.where(
+                ids % 2 == 0, numpy.char.upper(first_names.astype(str)),
+                first_names),
+            targets=['first_name'], vectorized=True, chunk_size=10
+        ))
+
+        self.assertEqual(
+            [first_name for first_name, _ in self.names()],
+            ['abcde'[i % 5].upper() if i % 2 == 0 else 'abcde'[i % 5]
+             for i in range(1, 26)]
+        )
+
+
+def record_pid(chunk, apps, schema_editor):
+    chunk.update(address_line_1=str(os.getpid()))
+
+
+def record_pid_and_fail(chunk, apps, schema_editor):
+    record_pid(chunk, apps, schema_editor)
+    if chunk.filter(pk__in=[3, 20]).exists():
+        raise ValueError('failing chunk')
+
+
+class PartitionedRoutineTestCase(TransactionalTestCase):
+    def setUp(self) -> None:
+        self.model = apps.get_model('test_app_2', 'Customer')
+        self.model.objects.all().delete()
+        self.model.objects.bulk_create(
+            [self.model(id=i) for i in range(1, 26)])
+
+    def tearDown(self) -> None:
+        self.model.objects.all().delete()
+
+    def run_routine(self, routine):
+        with connection.schema_editor(atomic=False) as schema_editor:
+            routine(apps, schema_editor)
+
+    def pids(self):
+        return list(self.model.objects.order_by('pk').values_list(
+            'address_line_1', flat=True))
+
+    def test_key_ranges(self):
+        routine = partitioned('test_app_2.Customer', record_pid, 4)
+
+        self.assertEqual(routine.key_ranges(self.model.objects.all()),
+                         [(None, 7), (7, 14), (14, 21), (21, None)])
+        self.assertEqual(routine.key_ranges(self.model.objects.filter(
+            pk__lte=3)), [(None, 1), (1, 2), (2, None)])
+        self.assertEqual(
+            routine.key_ranges(self.model.objects.none()), [])
+
+    def test_processes_partitions_in_processes(self):
+        self.run_routine(partitioned(
+            'test_app_2.Customer', record_pid, partitions=3, chunk_size=4))
+
+        pids = self.pids()
+        self.assertNotIn(None, pids)
+        self.assertNotIn(str(os.getpid()), pids)
+        self.assertGreater(len(set(pids)), 1)
+        # the parent's connection is still usable
+        self.assertEqual(self.model.objects.count(), 25)
+
+    def test_aggregates_failures(self):
+        with self.assertRaises(PartitionError) as ctx:
+            self.run_routine(partitioned(
+                'test_app_2.Customer', record_pid_and_fail, partitions=4,
+                chunk_size=4))
+
+        self.assertEqual(
+            [key_range for key_range, _ in ctx.exception.failures],
+            [(None, 7), (14, 21)]
+        )
+        self.assertIn('failing chunk', ctx.exception.failures[0][1])
+        # failing partitions stop at the failing chunk, which is rolled
+        # back, other partitions are completed
+        self.assertEqual(
+            [pk for pk, pid in enumerate(self.pids(), 1) if pid is None],
+            [1, 2, 3, 4, 5, 6, 7, 19, 20, 21]
+        )
+
+    def test_partition_by_field(self):
+        self.model.objects.filter(pk__lte=10).update(is_business=True)
+        routine = partitioned('test_app_2.Customer', record_pid,
+                              chunk_size=4, partition_by='is_business')
+
+        self.assertEqual(routine.get_partitions(self.model.objects.all()),
+                         [Q(is_business=False), Q(is_business=True)])
+        self.run_routine(routine)
+
+        pids = self.pids()
+        self.assertNotIn(None, pids)
+        self.assertNotIn(str(os.getpid()), pids)
+
+    def test_partition_by_function(self):
+        with self.assertRaises(PartitionError) as ctx:
+            self.run_routine(partitioned(
+                'test_app_2.Customer', record_pid_and_fail, chunk_size=4,
+                partition_by=lambda qs: [Q(pk__lte=10), Q(pk__gt=10)]))
+
+        self.assertEqual(
+            [partition for partition, _ in ctx.exception.failures],
+            [Q(pk__lte=10), Q(pk__gt=10)]
+        )
+        self.assertEqual(
+            [pk for pk, pid in enumerate(self.pids(), 1) if pid is None],
+            list(range(1, 11)) + list(range(19, 26))
+        )
+
+    def test_sequential_within_single_process(self):
+        self.run_routine(partitioned(
+            'test_app_2.Customer', record_pid, partitions=3, processes=1))
+
+        self.assertEqual(set(self.pids()), {str(os.getpid())})
+
+    def test_fails_within_transaction(self):
+        routine = partitioned('test_app_2.Customer', record_pid)
+
+        with self.assertRaises(TransactionManagementError), \
+                transaction.atomic():
+            routine(apps, mock.Mock(connection=connection))
+
+
+class StubService:
+    """Local stand-in for a remote service."""
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+
+    async def __call__(self, value):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.001)
+        self.active -= 1
+        return value.upper()
+
+
+class AsyncRoutineTestCase(TransactionalTestCase):
+    def setUp(self) -> None:
+        Node.flush()
+        self.model = apps.get_model('test_app_2', 'Customer')
+        self.model.objects.all().delete()
+        self.model.objects.bulk_create([
+            self.model(id=i, first_name='abcde'[i % 5]) for i in range(1, 26)
+        ])
+
+    def tearDown(self) -> None:
+        self.model.objects.all().delete()
+
+    def test_is_async(self):
+        async def routine(apps, schema_editor):
+            pass
+
+        self.assertTrue(is_async(routine))
+        self.assertTrue(is_async(StubService()))
+        self.assertFalse(is_async(collect))
+
+    def test_async_requires_asgiref(self):
+        async def routine():
+            pass
+
+        with mock.patch.dict('sys.modules', {'asgiref': None}):
+            with self.assertRaisesRegex(ImportError, 'async'):
+                run_routine(routine)
+        self.assertEqual(run_routine(lambda: 1), 1)
+
+    def test_gather_limits_concurrency(self):
+        service = StubService()
+
+        async def run():
+            return await gather(*(service(c) for c in 'abcdefgh'), limit=3)
+
+        self.assertEqual(asyncio.run(run()), list('ABCDEFGH'))
+        self.assertEqual(service.max_active, 3)
+
+    def test_async_routine(self):
+        service = StubService()
+
+        async def routine(apps, schema_editor):
+            model = apps.get_model('test_app_2', 'Customer')
+            customers = await sync_to_async(list)(model.objects.all())
+            names = await gather(
+                *(service(customer.first_name) for customer in customers),
+                limit=5)
+            for customer, name in zip(customers, names):
+                customer.first_name = name
+            await sync_to_async(model.objects.bulk_update)(
+                customers, ['first_name'])
+
+        node = GraphNode('test_app_2', '0001_async', [], [], [routine])
+        node.apply()
+
+        self.assertTrue(node.node.is_applied)
+        self.assertEqual(service.max_active, 5)
+        self.assertEqual(
+            set(self.model.objects.values_list('first_name', flat=True)),
+            set('ABCDE')
+        )
+
+    def test_async_routine_shares_transaction(self):
+        async def routine(apps, schema_editor):
+            model = apps.get_model('test_app_2', 'Customer')
+            await sync_to_async(model.objects.update)(first_name='z')
+            raise ValueError('failing routine')
+
+        node = GraphNode('test_app_2', '0001_async', [], [], [routine])
+        with self.assertRaises(ValueError):
+            node.apply()
+
+        self.assertFalse(self.model.objects.filter(first_name='z').exists())
+        self.assertFalse(node.node.is_applied)
+
+    def test_async_chunk_function(self):
+        service = StubService()
+
+        async def upper(chunk, apps, schema_editor):
+            customers = await sync_to_async(list)(chunk)
+            for customer in customers:
+                customer.first_name = await service(customer.first_name)
+            await sync_to_async(chunk.model.objects.bulk_update)(
+                customers, ['first_name'])
+
+        with connection.schema_editor(atomic=False) as schema_editor:
+            chunked('test_app_2.Customer', upper, 10)(apps, schema_editor)
+
+        self.assertEqual(
+            set(self.model.objects.values_list('first_name', flat=True)),
+            set('ABCDE')
+        )
+
+    def test_independent_nodes_overlap(self):
+        barrier = threading.Barrier(2, timeout=10)
+
+        async def wait_for_other_node(apps, schema_editor):
+            # passes only when both routines wait concurrently
+            await sync_to_async(barrier.wait, thread_sensitive=False)()
+
+        graphs = []
+        for app_name in ('app_a', 'app_b'):
+            graph = Graph(app_name)
+            graph.push_back(GraphNode(app_name, '0001_async', [], [],
+                                      [wait_for_other_node]))
+            graphs.append(graph)
+
+        DataMigrationPlan(graphs).apply(workers=2)
+
+        self.assertEqual(Node.get_qs().count(), 2)
@@ -11,6 +11,15 @@ import django
 
 this_dir = os.path.dirname(__file__)
 DB_NAME = os.path.join(this_dir, 'db.sqlite3')
+OTHER_DB_NAME = os.path.join(this_dir, 'db_other.sqlite3')
+
+
+def remove_databases():
+    for name in (DB_NAME, OTHER_DB_NAME):
+        try:
+            os.remove(name)
+        except FileNotFoundError:
+            pass
 
 
 class FileTestCase(TestCase):
@@ -66,10 +75,7 @@ is_django_setup = False
 
 def setup_django():
     global is_django_setup
-    try:
-        os.remove(DB_NAME)
-    except FileNotFoundError:
-        pass
+    remove_databases()
     if is_django_setup:
         return
 
@@ -79,10 +85,16 @@ def setup_django():
 
     settings.configure(
         SECRET_KEY='xxx',
-        DATABASES={'default': {
-            'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': DB_NAME,
-        }},
+        DATABASES={
+            'default': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': DB_NAME,
+            },
+            'other': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': OTHER_DB_NAME,
+            },
+        },
         INSTALLED_APPS=[
             'django.contrib.admin',
             'django.contrib.auth',
@@ -125,17 +137,18 @@ def migrate():
     from django.core.management import call_command
     from django.db import connections
     call_command('django_migrate')
+    # the other database only holds the tables required to flush it, data
+    # migrations apply their migration_dependencies on demand
+    call_command('django_migrate', 'auth', database='other')
 
-    with connections['default'].cursor() as cursor:
-        cursor.execute("PRAGMA foreign_keys = OFF;")
-        cursor.fetchone()
+    for database in ('default', 'other'):
+        with connections[database].cursor() as cursor:
+            cursor.execute("PRAGMA foreign_keys = OFF;")
+            cursor.fetchone()
 
 
 def teardown_django():
-    try:
-        os.remove(DB_NAME)
-    except FileNotFoundError:
-        pass
+    remove_databases()
     global is_django_setup
     is_django_setup = False
 